@@ -0,0 +1,381 @@
+"""Materialize the aggregate tables (cubes) served by the API's /rollups endpoints.
+
+Reads the star schema written by Star_Schema.ipynb (or, with --test-data, the
+API's prepared test parquet) and writes one agg_<cube>.parquet per cube in
+docker/API/rollups.py: the daily/item/store levels of Agg_table.ipynb plus the
+item x week, store x month and date x store x dept cubes.
+
+One-shot build straight from a fact table:
+
+    python NoteBook/Agg_table.py build --star-dir Data/Parquet/star_schema_daily
+    python NoteBook/Agg_table.py build --test-data docker/Dashboard/data/test_data.parquet
+
+Incremental pipeline over a date-partitioned warehouse: `ingest` writes one
+fact partition per day, and `update` re-aggregates only the months touched by
+partitions that are new, changed or deleted since the last run.
+
+    python NoteBook/Agg_table.py ingest --star-dir Data/Parquet/star_schema_daily
+    python NoteBook/Agg_table.py ingest --fact new_day.parquet
+    python NoteBook/Agg_table.py update
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import polars as pl
+
+REPO_DIR = Path(__file__).resolve().parents[1]
+sys.path.append(str(REPO_DIR / "docker" / "API"))
+
+from rollups import CUBES, DATE_COLUMN, DIMENSIONS, MONTH_COLUMN, WEEK_COLUMN  # noqa: E402
+
+STAR_DIR = Path("Data/Parquet/star_schema_daily")
+WAREHOUSE_DIR = Path("Data/Parquet/warehouse")
+OUTPUT_DIR = REPO_DIR / "docker" / "Dashboard" / "data" / "aggregates"
+MANIFEST_FILENAME = "manifest.json"
+PART_FILENAME = "part-0.parquet"
+FACT_COLUMNS = [
+    DATE_COLUMN, "store_id", "state_id", "item_id", "dept_id", "cat_id", "units_sold", "revenue"
+]
+
+# Cube có cột thời gian được lưu theo phân vùng tháng và tính lại theo từng tháng bị ảnh hưởng
+PERIOD_CUBES = [name for name, spec in CUBES.items() if spec.time_column]
+# Bảng trung gian theo tháng để dựng item_level/store_level mà không quét lại fact:
+# tổng cộng dồn được, còn số ngày phân biệt cộng được qua các tháng vì tháng không giao nhau
+PARTIALS: Dict[str, Tuple[List[str], Tuple[Tuple[str, str], ...]]] = {
+    "item_store_month": ([MONTH_COLUMN, "item_id", "dept_id", "cat_id", "store_id", "state_id"], ()),
+    "item_month_days": ([MONTH_COLUMN, "item_id"], (("days", DATE_COLUMN),)),
+    "store_month_days": ([MONTH_COLUMN, "store_id"], (("days", DATE_COLUMN),)),
+}
+
+
+def scan_star_schema(star_dir: Path) -> pl.LazyFrame:
+    """fact_sales nối dim_item để có dept_id/cat_id (giống Agg_table.ipynb).
+
+    Nhận cả thư mục fact_sales/ phân vùng do NoteBook/Star_Schema.py ghi
+    (cột khóa có sẵn trong từng file) lẫn một file fact_sales.parquet duy nhất.
+    """
+    partitioned = star_dir / "fact_sales"
+    if partitioned.is_dir():
+        fact = pl.scan_parquet(partitioned / "*" / "*.parquet", hive_partitioning=False)
+    else:
+        fact = pl.scan_parquet(star_dir / "fact_sales.parquet")
+    items = pl.scan_parquet(star_dir / "dim_item.parquet").select(["item_id", "dept_id", "cat_id"])
+    return fact.join(items, on="item_id", how="left")
+
+
+def scan_test_data(path: Path) -> pl.LazyFrame:
+    """Dataset test của API: doanh thu = units_sold * price, state_id lấy từ tiền tố store_id."""
+    return pl.scan_parquet(path).with_columns(
+        (pl.col("units_sold") * pl.col("price")).alias("revenue"),
+        pl.col("store_id").str.split("_").list.first().alias("state_id"),
+    )
+
+
+def normalize_fact(fact: pl.LazyFrame) -> pl.LazyFrame:
+    """Chỉ giữ các cột cần cho cube với kiểu cố định (cũng là schema của phân vùng fact)."""
+    return fact.select(FACT_COLUMNS).with_columns(
+        pl.col(DATE_COLUMN).cast(pl.Datetime("ns")),
+        pl.col(list(DIMENSIONS)).cast(pl.String),
+        pl.col("revenue").cast(pl.Float64),
+    )
+
+
+def with_periods(fact: pl.LazyFrame) -> pl.LazyFrame:
+    """Thêm đầu tuần (thứ Hai) / đầu tháng và đổi các chiều sang Categorical.
+
+    group_by trên Categorical băm mã số thay vì chuỗi (nhanh hơn khoảng 2.5 lần).
+    """
+    return fact.with_columns(
+        pl.col(list(DIMENSIONS)).cast(pl.Categorical),
+        pl.col(DATE_COLUMN).dt.truncate("1w").alias(WEEK_COLUMN),
+        pl.col(DATE_COLUMN).dt.month_start().alias(MONTH_COLUMN),
+    )
+
+
+def prepare_fact(fact: pl.LazyFrame) -> pl.LazyFrame:
+    return with_periods(normalize_fact(fact))
+
+
+def _aggregate(
+    fact: pl.LazyFrame, keys: Sequence[str], distinct: Iterable[Tuple[str, str]]
+) -> pl.LazyFrame:
+    return fact.group_by(list(keys)).agg(
+        pl.col("units_sold").sum().alias("total_units_sold"),
+        pl.col("revenue").sum().alias("total_revenue"),
+        *[pl.col(column).n_unique().alias(name) for name, column in distinct],
+    )
+
+
+def build_cubes(fact: pl.LazyFrame) -> Dict[str, pl.DataFrame]:
+    """Gộp mọi cube trong một lần collect_all để Polars quét fact một lần cho tất cả."""
+    queries = [_aggregate(fact, spec.keys, spec.distinct).sort(spec.keys) for spec in CUBES.values()]
+    return dict(zip(CUBES, pl.collect_all(queries)))
+
+
+def _write_atomic(frame: pl.DataFrame, path: Path) -> None:
+    """Ghi ra file tạm rồi đổi tên, để người đọc không bao giờ thấy file ghi dở."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    frame.write_parquet(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def write_cubes(cubes: Dict[str, pl.DataFrame], output_dir: Path) -> None:
+    for name, frame in cubes.items():
+        _write_atomic(frame, output_dir / CUBES[name].filename)
+
+
+def _report(cubes: Dict[str, pl.DataFrame]) -> None:
+    for name, frame in cubes.items():
+        print(f"  • agg_{name:<17} {frame.height:>10,} hàng | {frame.estimated_size() / 2**20:8.2f} MB")
+
+
+# --- Pipeline tăng dần trên kho dữ liệu phân vùng theo ngày ---
+
+def _partition_file(root: Path, column: str, key: str) -> Path:
+    return root / f"{column}={key}" / PART_FILENAME
+
+
+def _month_key(value: date) -> str:
+    return value.strftime("%Y-%m")
+
+
+def _month_start(key: str) -> date:
+    return datetime.strptime(key, "%Y-%m").date()
+
+
+def _next_month(start: date) -> date:
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def ingest(fact: pl.LazyFrame, warehouse: Path) -> List[str]:
+    """Tách fact theo ngày và ghi đè phân vùng warehouse/fact/date_id=YYYY-MM-DD của từng ngày."""
+    frame = normalize_fact(fact).collect()
+    written: List[str] = []
+    for (day,), part in frame.partition_by(DATE_COLUMN, as_dict=True, maintain_order=False).items():
+        key = day.strftime("%Y-%m-%d")
+        _write_atomic(part, _partition_file(warehouse / "fact", DATE_COLUMN, key))
+        written.append(key)
+    return sorted(written)
+
+
+def list_fact_partitions(warehouse: Path) -> Dict[str, List[int]]:
+    """Các phân vùng ngày hiện có cùng chữ ký (mtime_ns, kích thước) của file."""
+    partitions: Dict[str, List[int]] = {}
+    root = warehouse / "fact"
+    if not root.is_dir():
+        return partitions
+    prefix = f"{DATE_COLUMN}="
+    for entry in root.iterdir():
+        path = entry / PART_FILENAME
+        if entry.name.startswith(prefix) and path.is_file():
+            stat = path.stat()
+            partitions[entry.name[len(prefix):]] = [stat.st_mtime_ns, stat.st_size]
+    return partitions
+
+
+def load_manifest(warehouse: Path) -> Dict[str, object]:
+    path = warehouse / MANIFEST_FILENAME
+    if not path.is_file():
+        return {"partitions": {}}
+    with path.open("r", encoding="utf-8") as source:
+        return json.load(source)
+
+
+def save_manifest(warehouse: Path, manifest: Dict[str, object]) -> None:
+    path = warehouse / MANIFEST_FILENAME
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with tmp_path.open("w", encoding="utf-8") as sink:
+        json.dump(manifest, sink, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def changed_days(previous: Dict[str, List[int]], current: Dict[str, List[int]]) -> Set[str]:
+    """Ngày mới, đã bị ghi đè (chữ ký khác) hoặc đã bị xóa kể từ lần chạy trước."""
+    return {day for day in previous.keys() | current.keys() if previous.get(day) != current.get(day)}
+
+
+def affected_months(days: Iterable[str]) -> Set[str]:
+    """Phân vùng tháng cần tính lại: tháng của ngày và tháng chứa đầu tuần của ngày đó."""
+    months: Set[str] = set()
+    for key in days:
+        day = datetime.strptime(key, "%Y-%m-%d").date()
+        months.add(_month_key(day))
+        months.add(_month_key(day - timedelta(days=day.weekday())))
+    return months
+
+
+def _month_window(month: str, partitions: Dict[str, List[int]]) -> List[str]:
+    """Các ngày cần đọc để tính phân vùng tháng: cả tháng và 6 ngày sau (tuần bắt đầu cuối tháng)."""
+    start = _month_start(month)
+    stop = _next_month(start) + timedelta(days=6)
+    return sorted(
+        day for day in partitions if start <= datetime.strptime(day, "%Y-%m-%d").date() < stop
+    )
+
+
+def _month_tables(fact: pl.LazyFrame, month: str) -> Dict[Tuple[str, str], pl.DataFrame]:
+    """Các dòng của phân vùng tháng `month` cho mọi cube theo thời gian và bảng trung gian."""
+    start = datetime.combine(_month_start(month), datetime.min.time())
+    queries: Dict[Tuple[str, str], pl.LazyFrame] = {}
+    for name in PERIOD_CUBES:
+        spec = CUBES[name]
+        query = _aggregate(fact, spec.keys, spec.distinct)
+        queries[("cubes", name)] = query.filter(
+            pl.col(spec.time_column).dt.month_start() == start
+        ).sort(spec.keys)
+    for name, (keys, distinct) in PARTIALS.items():
+        query = _aggregate(fact, keys, distinct)
+        if distinct:
+            query = query.select([*keys, *[alias for alias, _ in distinct]])
+        queries[("partials", name)] = query.filter(pl.col(MONTH_COLUMN) == start).sort(keys)
+    frames = pl.collect_all(list(queries.values()))
+    # lưu chiều dạng chuỗi để các phân vùng ghép lại được mà không cần chung từ điển Categorical
+    return {
+        key: frame.with_columns(pl.col(pl.Categorical).cast(pl.String))
+        for key, frame in zip(queries, frames)
+    }
+
+
+def _scan_table(warehouse: Path, kind: str, name: str) -> Optional[pl.LazyFrame]:
+    files = sorted((warehouse / kind / name).glob(f"month=*/{PART_FILENAME}"))
+    return pl.scan_parquet(files) if files else None
+
+
+def _total_cubes(warehouse: Path) -> Dict[str, pl.DataFrame]:
+    """item_level và store_level dựng lại từ bảng trung gian theo tháng (không đọc fact)."""
+    pairs = _scan_table(warehouse, "partials", "item_store_month")
+    if pairs is None:
+        return {}
+    item_days = _scan_table(warehouse, "partials", "item_month_days")
+    store_days = _scan_table(warehouse, "partials", "store_month_days")
+
+    def _level(keys: List[str], counted: str, count_name: str, days: pl.LazyFrame) -> pl.LazyFrame:
+        totals = pairs.group_by(keys).agg(
+            pl.col("total_units_sold").sum(),
+            pl.col("total_revenue").sum(),
+            pl.col(counted).n_unique().alias(count_name),
+        )
+        day_counts = days.group_by(keys[0]).agg(pl.col("days").sum().alias("num_days_sold"))
+        return totals.join(day_counts, on=keys[0], how="left").sort(keys)
+
+    item_level, store_level = pl.collect_all(
+        [
+            _level(["item_id", "dept_id", "cat_id"], "store_id", "num_stores_sold", item_days),
+            _level(["store_id", "state_id"], "item_id", "num_items_sold", store_days),
+        ]
+    )
+    return {"item_level": item_level, "store_level": store_level}
+
+
+def update(warehouse: Path, output_dir: Path, full: bool = False) -> Dict[str, object]:
+    """Tính lại các phân vùng tháng bị ảnh hưởng, dựng lại bảng tổng và xuất agg_*.parquet."""
+    started = time.perf_counter()
+    manifest = load_manifest(warehouse)
+    partitions = list_fact_partitions(warehouse)
+    previous = {} if full else manifest.get("partitions", {})
+    days = changed_days(previous, partitions)
+    months = sorted(affected_months(days))
+
+    for month in months:
+        window = _month_window(month, partitions)
+        tables: Dict[Tuple[str, str], pl.DataFrame] = {}
+        if window:
+            paths = [_partition_file(warehouse / "fact", DATE_COLUMN, day) for day in window]
+            tables = _month_tables(with_periods(pl.scan_parquet(paths)), month)
+        for kind, names in (("cubes", PERIOD_CUBES), ("partials", list(PARTIALS))):
+            for name in names:
+                path = _partition_file(warehouse / kind / name, "month", month)
+                frame = tables.get((kind, name))
+                if frame is not None and frame.height:
+                    _write_atomic(frame, path)
+                elif path.exists():
+                    path.unlink()  # tháng không còn dữ liệu (mọi ngày đã bị xóa)
+
+    cubes: Dict[str, pl.DataFrame] = {}
+    if months or full:
+        for name in PERIOD_CUBES:
+            scanned = _scan_table(warehouse, "cubes", name)
+            if scanned is not None:
+                cubes[name] = scanned.sort(CUBES[name].keys).collect()
+        cubes.update(_total_cubes(warehouse))
+        output_dir.mkdir(parents=True, exist_ok=True)
+        write_cubes(cubes, output_dir)
+
+    stats = {
+        "changed_days": len(days),
+        "months": months,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    manifest = {
+        "partitions": partitions,
+        "updated_at": datetime.now().isoformat(timespec="seconds"),
+        "last_run": stats,
+    }
+    save_manifest(warehouse, manifest)
+    if cubes:
+        _report(cubes)
+    return stats
+
+
+def _add_source_arguments(parser: argparse.ArgumentParser) -> None:
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--star-dir", type=Path, default=STAR_DIR)
+    source.add_argument("--test-data", type=Path, help="the API test parquet (units_sold * price)")
+    source.add_argument("--fact", type=Path, nargs="+", help="fact parquet file(s) with FACT_COLUMNS")
+
+
+def _scan_source(args: argparse.Namespace) -> pl.LazyFrame:
+    if args.test_data:
+        return scan_test_data(args.test_data)
+    if args.fact:
+        return pl.scan_parquet(args.fact)
+    return scan_star_schema(args.star_dir)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = commands.add_parser("build", help="aggregate a whole fact table in one pass")
+    _add_source_arguments(build_parser)
+    build_parser.add_argument("--output-dir", type=Path, default=OUTPUT_DIR)
+
+    ingest_parser = commands.add_parser("ingest", help="write fact rows as daily partitions")
+    _add_source_arguments(ingest_parser)
+    ingest_parser.add_argument("--warehouse", type=Path, default=WAREHOUSE_DIR)
+
+    update_parser = commands.add_parser("update", help="re-aggregate changed partitions only")
+    update_parser.add_argument("--warehouse", type=Path, default=WAREHOUSE_DIR)
+    update_parser.add_argument("--output-dir", type=Path, default=OUTPUT_DIR)
+    update_parser.add_argument("--full", action="store_true", help="ignore the manifest")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.command == "build":
+        cubes = build_cubes(prepare_fact(_scan_source(args)))
+        write_cubes(cubes, args.output_dir)
+        _report(cubes)
+        print(f"Đã ghi {len(cubes)} bảng vào {args.output_dir} trong {time.perf_counter() - started:.2f}s")
+    elif args.command == "ingest":
+        days = ingest(_scan_source(args), args.warehouse)
+        span = f" ({days[0]} → {days[-1]})" if days else ""
+        print(f"Đã ghi {len(days)} phân vùng ngày{span} trong {time.perf_counter() - started:.2f}s")
+    else:
+        stats = update(args.warehouse, args.output_dir, full=args.full)
+        print(
+            f"{stats['changed_days']} ngày thay đổi → tính lại {len(stats['months'])} tháng "
+            f"trong {stats['seconds']:.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
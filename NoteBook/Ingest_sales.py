@@ -0,0 +1,199 @@
+"""Stream the wide M5 sales CSV (one column per day) into long, partitioned Parquet.
+
+Command-line replacement for the melt cells of Load_data.ipynb. The CSV is
+read in blocks of rows with pyarrow's streaming reader: ids are dictionary
+encoded and the d_* columns are int16 from the start. Each block is reshaped
+to long format with numpy (repeat/tile/ravel, no pandas melt), and its day
+columns are turned into dates through one lookup array built from the
+calendar. The block is then handed to a streaming Parquet dataset writer.
+Memory is bounded by --block-mb, not by the size of the file.
+
+    python NoteBook/Ingest_sales.py --sales Data/sales_data.csv --calendar Data/calendar.csv \
+        --output Data/Parquet/test/sales.parquet --partition-by store_id
+
+The output directory (store_id=<id>/ or month=<YYYY-MM>/ partitions) can be
+read directly by NoteBook/Star_Schema.py and pl.scan_parquet.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import resource
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from atomic_dir import replace_dir, staging_dir
+
+SALES_CSV = Path("Data/sales_data.csv")
+CALENDAR_CSV = Path("Data/calendar.csv")
+OUTPUT_DIR = Path("Data/Parquet/test/sales.parquet")
+ID_COLUMNS = ["id", "item_id", "dept_id", "cat_id", "store_id", "state_id"]
+DAY_PREFIX = "d_"
+# phân vùng theo tháng chứ không theo ngày: mỗi khối của file wide chứa mọi ngày, nên
+# ~1941 phân vùng ngày sẽ cho ~1941 mảnh nhỏ mỗi khối; 65 tháng thì mỗi tháng chỉ một file
+PARTITIONS = ("store_id", "month", "none")
+ID_TYPE = pa.dictionary(pa.int32(), pa.string())
+
+SCHEMA = pa.schema(
+    [*(pa.field(column, ID_TYPE) for column in ID_COLUMNS), ("date", pa.date32()), ("units_sold", pa.int16())]
+)
+
+
+def read_header(path: Path) -> List[str]:
+    with open(path, newline="") as handle:
+        return next(csv.reader(handle))
+
+
+def day_lookup(calendar_path: Path, day_columns: List[str]) -> pa.Array:
+    """Mảng date32 thẳng hàng với các cột d_*: phần tử j là ngày của cột day_columns[j]."""
+    if calendar_path.suffix == ".parquet":
+        calendar = pq.read_table(calendar_path, columns=["d", "date"])
+    else:
+        calendar = pa_csv.read_csv(
+            calendar_path,
+            convert_options=pa_csv.ConvertOptions(
+                include_columns=["d", "date"], column_types={"d": pa.string(), "date": pa.date32()}
+            ),
+        )
+    mapping: Dict[str, object] = dict(
+        zip(calendar["d"].to_pylist(), calendar["date"].cast(pa.date32()).to_pylist())
+    )
+    missing = [day for day in day_columns if day not in mapping]
+    if missing:
+        raise ValueError(f"{len(missing)} cột ngày không có trong calendar, vd. {', '.join(missing[:5])}")
+    return pa.array([mapping[day] for day in day_columns], type=pa.date32())
+
+
+def month_lookup(dates: np.ndarray) -> pa.DictionaryArray:
+    """Tháng (YYYY-MM) của từng cột ngày, dạng dictionary để nhân bản rẻ theo số chuỗi."""
+    months = dates.astype("datetime64[M]")
+    names, codes = np.unique(months, return_inverse=True)
+    return pa.DictionaryArray.from_arrays(
+        pa.array(codes.astype(np.int32)), pa.array(names.astype(str).tolist())
+    )
+
+
+def melt_batch(
+    batch: pa.RecordBatch,
+    day_columns: List[str],
+    dates: np.ndarray,
+    months: Optional[pa.DictionaryArray] = None,
+) -> pa.RecordBatch:
+    """Wide -> long cho một khối: mỗi chuỗi (id) giữ các ngày liền nhau, đúng thứ tự cột."""
+    rows, days = batch.num_rows, len(day_columns)
+    units = np.empty((rows, days), dtype=np.int16)
+    for index, column in enumerate(day_columns):
+        units[:, index] = batch.column(column).to_numpy(zero_copy_only=False)
+    # cột id dạng dictionary: take chỉ nhân bản chỉ số int32, không nhân bản chuỗi
+    repeat = pa.array(np.repeat(np.arange(rows, dtype=np.int32), days))
+    arrays = [
+        *(batch.column(column).take(repeat) for column in ID_COLUMNS),
+        pa.array(np.tile(dates, rows), type=pa.date32()),
+        pa.array(units.ravel()),
+    ]
+    schema = SCHEMA
+    if months is not None:
+        arrays.append(
+            pa.DictionaryArray.from_arrays(
+                pa.array(np.tile(months.indices.to_numpy(), rows)), months.dictionary
+            )
+        )
+        schema = SCHEMA.append(pa.field("month", ID_TYPE))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def iter_long_batches(
+    sales_path: Path, calendar_path: Path, block_mb: int, with_month: bool = False
+) -> Iterator[pa.RecordBatch]:
+    header = read_header(sales_path)
+    missing = [column for column in ID_COLUMNS if column not in header]
+    if missing:
+        raise ValueError(f"thiếu cột {', '.join(missing)} trong {sales_path}")
+    day_columns = [column for column in header if column.startswith(DAY_PREFIX)]
+    dates = day_lookup(calendar_path, day_columns).to_numpy(zero_copy_only=False)
+    months = month_lookup(dates) if with_month else None
+    column_types = {column: ID_TYPE for column in ID_COLUMNS}
+    column_types.update({column: pa.int16() for column in day_columns})
+    reader = pa_csv.open_csv(
+        sales_path,
+        read_options=pa_csv.ReadOptions(block_size=block_mb * 2**20),
+        convert_options=pa_csv.ConvertOptions(
+            column_types=column_types, include_columns=[*ID_COLUMNS, *day_columns]
+        ),
+    )
+    for batch in reader:
+        if batch.num_rows:
+            yield melt_batch(batch, day_columns, dates, months)
+
+
+def ingest(
+    sales_path: Path, calendar_path: Path, output_dir: Path, partition_by: str, block_mb: int
+) -> Dict[str, float]:
+    """Ghi dataset Parquet dạng dài vào thư mục tạm rồi thay thế output_dir."""
+    started = time.perf_counter()
+    counted = {"rows": 0, "batches": 0}
+
+    def batches() -> Iterator[pa.RecordBatch]:
+        for batch in iter_long_batches(sales_path, calendar_path, block_mb, partition_by == "month"):
+            counted["rows"] += batch.num_rows
+            counted["batches"] += 1
+            yield batch
+
+    schema = SCHEMA.append(pa.field("month", ID_TYPE)) if partition_by == "month" else SCHEMA
+    partitioning: Optional[ds.Partitioning] = None
+    if partition_by != "none":
+        partitioning = ds.partitioning(pa.schema([(partition_by, ID_TYPE)]), flavor="hive")
+
+    tmp_dir = staging_dir(output_dir)
+    # min_rows_per_group=0: mỗi khối được ghi ngay thành row group, writer không giữ dữ liệu
+    ds.write_dataset(
+        batches(),
+        tmp_dir,
+        schema=schema,
+        format="parquet",
+        partitioning=partitioning,
+        basename_template="part-{i}.parquet",
+        min_rows_per_group=0,
+        max_rows_per_group=1 << 20,
+    )
+    replace_dir(tmp_dir, output_dir)
+
+    elapsed = time.perf_counter() - started
+    # ru_maxrss tính bằng KB trên Linux, byte trên macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return {
+        "rows": counted["rows"],
+        "batches": counted["batches"],
+        "seconds": elapsed,
+        "rows_per_second": counted["rows"] / elapsed if elapsed else 0.0,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sales", type=Path, default=SALES_CSV)
+    parser.add_argument("--calendar", type=Path, default=CALENDAR_CSV, help="csv or parquet with d, date")
+    parser.add_argument("--output", type=Path, default=OUTPUT_DIR)
+    parser.add_argument("--partition-by", choices=PARTITIONS, default="store_id")
+    parser.add_argument("--block-mb", type=int, default=4, help="CSV bytes per batch")
+    args = parser.parse_args()
+
+    report = ingest(args.sales, args.calendar, args.output, args.partition_by, args.block_mb)
+    print(
+        f"Đã ghi {report['rows']:,} hàng ({report['batches']} khối) vào {args.output} "
+        f"trong {report['seconds']:.2f}s ({report['rows_per_second']:,.0f} hàng/s), "
+        f"RSS đỉnh {report['peak_rss_mb']:.1f} MB"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,29 @@
-import pandas as pd
-from dotenv import load_dotenv
+"""Load sales frames / Parquet files into the database with chunked COPY and staged upserts."""
+from __future__ import annotations
+
+import io
 import os
+import queue
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from psycopg2 import connect, sql
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from dotenv import load_dotenv
+
+try:
+    from psycopg2 import connect
+except ImportError:  # psycopg2 là tùy chọn: không có thì chỉ dùng được SQLite (sqlite:///...)
+    connect = None
 
 env_path = Path(__file__).resolve().parents[1] / '.env'
 load_dotenv(dotenv_path=env_path)
@@ -10,9 +31,42 @@ load_dotenv(dotenv_path=env_path)
 databaseURL = os.getenv("DATABASE_URL")
 print("Database URL:", databaseURL)
 
-def create_connection():
+CHUNK_ROWS = 50_000
+POOL_SIZE = 4
+SQLITE_PREFIX = "sqlite:///"
+
+
+class TableSpec(NamedTuple):
+    """Bảng đích: tên, các cột được nạp và khóa duy nhất dùng cho upsert."""
+
+    name: str
+    columns: Tuple[str, ...]
+    keys: Tuple[str, ...]
+
+
+# bảng sales_data dạng dài của Load_data.ipynb (một dòng cho mỗi id × ngày)
+SALES_TABLE = TableSpec(
+    "sales_data",
+    ("id", "item_id", "dept_id", "cat_id", "store_id", "state_id", "date", "units_sold"),
+    ("id", "date"),
+)
+
+Source = Union[pd.DataFrame, str, Path]
+
+
+def create_connection(url: Optional[str] = None):
+    url = url or databaseURL
     try:
-        conn = connect(databaseURL)
+        if url and url.startswith(SQLITE_PREFIX):
+            # isolation_level=None: tự quản lý giao dịch (BEGIN IMMEDIATE khi upsert)
+            conn = sqlite3.connect(
+                url[len(SQLITE_PREFIX):], timeout=60, isolation_level=None, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+        else:
+            if connect is None:
+                raise RuntimeError("cần cài psycopg2 để kết nối PostgreSQL")
+            conn = connect(url)
         print("Connection to database established.")
         return conn
     except Exception as e:
@@ -20,25 +74,276 @@ def create_connection():
         return None
 
 
+def _is_sqlite(conn) -> bool:
+    return isinstance(conn, sqlite3.Connection)
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+class ConnectionPool:
+    """Pool kết nối cố định: mở lười tối đa `size` kết nối, dùng lại theo LIFO."""
+
+    def __init__(self, url: Optional[str] = None, size: int = POOL_SIZE) -> None:
+        self.url = url or databaseURL
+        self.size = size
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        conn = None
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._opened < self.size
+                if can_open:
+                    self._opened += 1
+            if can_open:
+                conn = create_connection(self.url)
+                if conn is None:
+                    with self._lock:
+                        self._opened -= 1
+                    raise ConnectionError(f"không kết nối được tới {self.url}")
+            else:
+                conn = self._idle.get()
+        try:
+            yield conn
+        except Exception:
+            if not _is_sqlite(conn):
+                conn.rollback()
+            elif conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            self._idle.put(conn)
 
-def load_data_to_db(dataframe):
-    conn = create_connection()
-    if conn is None:
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        self._opened = 0
+
+
+def _parquet_dataset(source: Union[str, Path]) -> ds.Dataset:
+    # thư mục key=value/ (Ingest_sales, Star_Schema): cột phân vùng lấy từ đường dẫn
+    return ds.dataset(str(source), format="parquet", partitioning="hive")
+
+
+def iter_chunks(
+    source: Source,
+    columns: Sequence[str],
+    chunk_rows: int = CHUNK_ROWS,
+    partition: Optional[Tuple[str, Any]] = None,
+    rows: Optional[np.ndarray] = None,
+) -> Iterator[pd.DataFrame]:
+    """Cắt DataFrame hoặc Parquet (file/thư mục) thành các khối `chunk_rows` dòng.
+
+    Với DataFrame chỉ lấy các dòng ở vị trí `rows` (từ `plan_partitions`). Với
+    Parquet chỉ đọc các cột cần và chỉ phân vùng được hỏi, từng batch một; khi
+    `partition` là khóa hive, bộ lọc chỉ mở file của phân vùng đó.
+    """
+    if isinstance(source, pd.DataFrame):
+        # chỉ sao chép từng khối, không sao chép cả frame cho mỗi phân vùng
+        positions = source.columns.get_indexer(list(columns))
+        if rows is None:
+            rows = np.arange(len(source))
+        for start in range(0, len(rows), chunk_rows):
+            yield source.iloc[rows[start:start + chunk_rows], positions]
         return
+    condition = None if partition is None else ds.field(partition[0]) == partition[1]
+    for batch in _parquet_dataset(source).to_batches(columns=list(columns), filter=condition, batch_size=chunk_rows):
+        if batch.num_rows:
+            yield batch.to_pandas()
+
+
+def partition_values(source: Source, column: str) -> List[Any]:
+    """Các giá trị phân biệt của cột phân vùng (chỉ đọc một cột)."""
+    if isinstance(source, pd.DataFrame):
+        values = source[column].dropna().unique()
+    else:
+        values = _parquet_dataset(source).to_table(columns=[column])[column].unique()
+        values = [value for value in values.to_pylist() if value is not None]
+    return sorted(values)
+
+
+def plan_partitions(source: Source, column: str, spool_dir: Path) -> Tuple[Source, List[Dict[str, Any]]]:
+    """Chia `source` theo `column` một lần, trả về (nguồn để đọc, tham số load_partition của từng phân vùng).
+
+    DataFrame: một lần groupby, mỗi phân vùng nhận vị trí dòng của nó. Parquet
+    đã phân vùng hive theo `column`: giữ nguyên. Parquet khác: một lần quét ghi
+    lại thành thư mục hive `column=<giá trị>/` trong `spool_dir`, thay vì mỗi
+    worker quét lại toàn bộ nguồn với bộ lọc của mình.
+    """
+    if isinstance(source, pd.DataFrame):
+        groups = source.groupby(column, observed=True, sort=True).indices
+        return source, [{"rows": rows} for rows in groups.values()]
+    dataset = _parquet_dataset(source)
+    hive = dataset.partitioning
+    if hive is None or column not in hive.schema.names:
+        # giữ kiểu gốc của cột khi đọc lại giá trị từ tên thư mục
+        field = dataset.schema.field(column)
+        values = partition_values(source, column)
+        ds.write_dataset(
+            dataset,
+            str(spool_dir),
+            format="parquet",
+            partitioning=ds.partitioning(pa.schema([field]), flavor="hive"),
+            max_partitions=max(1024, len(values)),
+            existing_data_behavior="overwrite_or_ignore",
+        )
+        source = spool_dir
+    return source, [{"partition": (column, value)} for value in partition_values(source, column)]
+
 
-    cursor = conn.cursor()
+def _copy_chunk(conn, staging: str, columns: Sequence[str], chunk: pd.DataFrame) -> None:
+    """Đẩy một khối vào bảng staging: COPY ... FROM STDIN (CSV) với PostgreSQL, executemany với SQLite."""
+    column_list = ", ".join(_quote(column) for column in columns)
+    if _is_sqlite(conn):
+        values = [
+            chunk[column].astype(str).where(chunk[column].notna(), None).tolist()
+            if pd.api.types.is_datetime64_any_dtype(chunk[column])
+            else chunk[column].tolist()
+            for column in columns
+        ]
+        placeholders = ", ".join("?" * len(columns))
+        conn.executemany(
+            f"INSERT INTO {_quote(staging)} ({column_list}) VALUES ({placeholders})", zip(*values)
+        )
+        return
+    buffer = io.StringIO()
+    chunk.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    with conn.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {_quote(staging)} ({column_list}) FROM STDIN WITH (FORMAT csv, NULL '')", buffer
+        )
+
+
+def _upsert_sql(table: TableSpec, staging: str) -> str:
+    column_list = ", ".join(_quote(column) for column in table.columns)
+    updates = [column for column in table.columns if column not in table.keys]
+    action = (
+        "DO UPDATE SET " + ", ".join(f"{_quote(column)} = excluded.{_quote(column)}" for column in updates)
+        if updates
+        else "DO NOTHING"
+    )
+    # "WHERE true" tránh nhầm ON CONFLICT với cú pháp JOIN ... ON trong SQLite
+    return (
+        f"INSERT INTO {_quote(table.name)} ({column_list}) "
+        f"SELECT {column_list} FROM {_quote(staging)} WHERE true "
+        f"ON CONFLICT ({', '.join(_quote(key) for key in table.keys)}) {action}"
+    )
+
+
+def load_partition(
+    pool: ConnectionPool,
+    source: Source,
+    table: TableSpec,
+    chunk_rows: int = CHUNK_ROWS,
+    partition: Optional[Tuple[str, Any]] = None,
+    rows: Optional[np.ndarray] = None,
+) -> int:
+    """Nạp một phân vùng: COPY theo khối vào bảng tạm rồi upsert một lần vào bảng đích.
+
+    Chạy lại cùng dữ liệu không tạo dòng trùng (ON CONFLICT trên table.keys).
+    """
+    staging = f"_stage_{table.name}"
+    loaded = 0
+    with pool.connection() as conn:
+        if _is_sqlite(conn):
+            conn.execute(f"DROP TABLE IF EXISTS temp.{_quote(staging)}")
+            conn.execute(
+                f"CREATE TEMP TABLE {_quote(staging)} AS SELECT "
+                f"{', '.join(_quote(column) for column in table.columns)} "
+                f"FROM {_quote(table.name)} WHERE 0"
+            )
+            conn.execute("BEGIN")
+            for chunk in iter_chunks(source, table.columns, chunk_rows, partition, rows):
+                _copy_chunk(conn, staging, table.columns, chunk)
+                loaded += len(chunk)
+            conn.execute("COMMIT")
+            # SQLite chỉ cho một writer: khóa ghi chỉ được giữ trong lúc upsert
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(_upsert_sql(table, staging))
+            conn.execute("COMMIT")
+            conn.execute(f"DROP TABLE temp.{_quote(staging)}")
+        else:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    f"CREATE TEMP TABLE {_quote(staging)} "
+                    f"(LIKE {_quote(table.name)} INCLUDING DEFAULTS) ON COMMIT DROP"
+                )
+            for chunk in iter_chunks(source, table.columns, chunk_rows, partition, rows):
+                _copy_chunk(conn, staging, table.columns, chunk)
+                loaded += len(chunk)
+            with conn.cursor() as cursor:
+                cursor.execute(_upsert_sql(table, staging))
+            conn.commit()
+    return loaded
+
+
+def bulk_load(
+    source: Source,
+    table: TableSpec = SALES_TABLE,
+    url: Optional[str] = None,
+    chunk_rows: int = CHUNK_ROWS,
+    partition_by: Optional[str] = "store_id",
+    workers: int = POOL_SIZE,
+    pool: Optional[ConnectionPool] = None,
+) -> Dict[str, Any]:
+    """Nạp `source` vào `table`, mỗi phân vùng (vd. mỗi cửa hàng) một giao dịch, song song trên pool.
+
+    Trả về số dòng, thời gian và số dòng/giây.
+    """
+    own_pool = pool is None
+    pool = pool or ConnectionPool(url, size=workers)
+    started = time.perf_counter()
+    spool_dir: Optional[Path] = None
+    try:
+        if partition_by is None:
+            rows = load_partition(pool, source, table, chunk_rows)
+            partitions = 1
+        else:
+            if not isinstance(source, pd.DataFrame):
+                # bản chia tạm nằm cạnh nguồn: cùng ổ đĩa, không đầy /tmp
+                spool_dir = Path(tempfile.mkdtemp(prefix=".load-partitions-", dir=Path(source).resolve().parent))
+            source, plans = plan_partitions(source, partition_by, spool_dir)
+            partitions = len(plans)
+            with ThreadPoolExecutor(max_workers=max(1, min(workers, pool.size))) as executor:
+                rows = sum(
+                    executor.map(
+                        lambda plan: load_partition(pool, source, table, chunk_rows, **plan),
+                        plans,
+                    )
+                )
+    finally:
+        if own_pool:
+            pool.close()
+        if spool_dir is not None:
+            shutil.rmtree(spool_dir, ignore_errors=True)
+    elapsed = time.perf_counter() - started
+    return {
+        "rows": rows,
+        "partitions": partitions,
+        "seconds": elapsed,
+        "rows_per_second": rows / elapsed if elapsed else 0.0,
+    }
 
-    for index, row in dataframe.iterrows():
-        insert_query = sql.SQL("""
-            INSERT INTO your_table_name (column1, column2)
-            VALUES (%s, %s)
-        """)
-        cursor.execute(insert_query, (row['column1'], row['column2']))
 
-    conn.commit()
-    cursor.close()
-    conn.close()
-    print("Data loaded to database successfully.")
+def load_data_to_db(dataframe, table: TableSpec = SALES_TABLE, **options):
+    """Giữ tên hàm cũ cho notebook; nay dùng bulk_load thay cho INSERT từng dòng qua iterrows."""
+    report = bulk_load(dataframe, table, **options)
+    print(
+        f"Data loaded to database successfully: {report['rows']:,} rows "
+        f"in {report['seconds']:.2f}s ({report['rows_per_second']:,.0f} rows/s)."
+    )
+    return report
 
 def downcast_int(df):
     for col in df.select_dtypes(include=['int64']).columns:
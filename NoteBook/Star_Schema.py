@@ -0,0 +1,362 @@
+"""Build the M5 star schema out of core: lazy scans, streaming joins, parallel partitions.
+
+Command-line version of Star_Schema.ipynb. The dimensions are tiny and are
+collected from lazy scans. fact_sales is written by one worker process per
+store (or state). Each worker streams sales ⋈ calendar ⋈ sell_prices for its
+partition straight into Parquet, so only one partition's price table is ever
+held in memory. The number of concurrent workers is derived from
+--memory-budget-mb.
+
+    python NoteBook/Star_Schema.py --input-dir Data/Parquet/test \
+        --output-dir Data/Parquet/star_schema_daily --memory-budget-mb 4096
+
+Writes dim_item/dim_store/dim_state/dim_calendar.parquet and
+fact_sales/<key>=<value>/part-0.parquet, then prints rows/sec and peak RSS.
+Everything is built in a sibling temporary directory that replaces the output
+directory only once every partition is written, so a rebuild never leaves
+partitions of an earlier run (another --partition-by, a store that is gone).
+"""
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import polars as pl
+
+from atomic_dir import replace_dir, staging_dir
+
+INPUT_DIR = Path("Data/Parquet/test")
+OUTPUT_DIR = Path("Data/Parquet/star_schema_daily")
+FACT_DIRNAME = "fact_sales"
+FACT_COLUMNS = [
+    "sales_id", "date_id", "item_id", "store_id", "state_id", "units_sold", "sell_price", "revenue"
+]
+STATE_NAMES = {"CA": ("California", "West"), "TX": ("Texas", "South"), "WI": ("Wisconsin", "Midwest")}
+WEEKDAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# Ước lượng bộ nhớ của một worker: nền của process Polars + bảng băm giá của phân vùng
+WORKER_BASE_MB = 160
+PRICE_ROW_BYTES = 96
+
+
+def _peak_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    """RSS đỉnh (MB) của process này hoặc của các process con đã kết thúc (RUSAGE_CHILDREN)."""
+    if who == resource.RUSAGE_SELF:
+        # VmHWM được đặt lại sau exec; ru_maxrss thì giữ giá trị của process cha khi spawn
+        try:
+            with open("/proc/self/status") as status:
+                for line in status:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            pass
+    # ru_maxrss tính bằng KB trên Linux, byte trên macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(who).ru_maxrss * scale / 2**20
+
+
+def _as_date(column: str, schema: pl.Schema) -> pl.Expr:
+    expr = pl.col(column)
+    return expr.str.to_date() if schema[column] == pl.String else expr.cast(pl.Date)
+
+
+def scan_inputs(input_dir: Path) -> Tuple[pl.LazyFrame, pl.LazyFrame, pl.LazyFrame]:
+    """sales (dạng dài), calendar và sell_prices dưới dạng LazyFrame, đã bỏ dòng thiếu khóa.
+
+    sales.parquet có thể là một file hoặc thư mục phân vùng do NoteBook/Ingest_sales.py ghi
+    (id dạng dictionary -> đổi về String để join với sell_prices).
+    """
+    sales_path = input_dir / "sales.parquet"
+    sales = pl.scan_parquet(sales_path, hive_partitioning=sales_path.is_dir())
+    calendar = pl.scan_parquet(input_dir / "calendar.parquet")
+    prices = pl.scan_parquet(input_dir / "sell_prices.parquet")
+    sales = sales.with_columns(
+        _as_date("date", sales.collect_schema()),
+        pl.col(["item_id", "dept_id", "cat_id", "store_id", "state_id"]).cast(pl.String),
+    ).drop_nulls(["item_id", "store_id", "state_id", "date"])
+    calendar = calendar.with_columns(_as_date("date", calendar.collect_schema())).drop_nulls(["date"])
+    prices = prices.drop_nulls(["store_id", "item_id", "wm_yr_wk"])
+    return sales, calendar, prices
+
+
+def summarize_keys(sales: pl.LazyFrame, prices: pl.LazyFrame) -> Tuple[pl.DataFrame, pl.DataFrame]:
+    """Một lần quét streaming cho mỗi nguồn, kết quả chỉ cỡ số item × số cửa hàng.
+
+    Mỗi truy vấn được collect riêng: collect_all sẽ cache phần quét chung
+    (cả cột sales) trong bộ nhớ và làm mất ý nghĩa của streaming.
+    """
+    combos = (
+        sales.group_by(["store_id", "state_id", "item_id", "dept_id", "cat_id"])
+        .agg(pl.len().alias("rows"))
+        .collect(engine="streaming")
+    )
+    price_stats = (
+        prices.group_by(["store_id", "item_id"])
+        .agg(
+            pl.col("sell_price").sum().alias("price_sum"),
+            pl.col("sell_price").count().alias("price_count"),
+            pl.len().alias("rows"),
+        )
+        .collect(engine="streaming")
+    )
+    return combos, price_stats
+
+
+def build_dimensions(
+    combos: pl.DataFrame, price_stats: pl.DataFrame, calendar: pl.LazyFrame
+) -> Dict[str, pl.DataFrame]:
+    """Các bảng dim giống notebook, suy ra từ bản tóm tắt khóa và calendar."""
+    item_prices = price_stats.group_by("item_id").agg(
+        (pl.col("price_sum").sum() / pl.col("price_count").sum()).round(2).alias("price")
+    )
+    dim_item = (
+        combos.select(["item_id", "dept_id", "cat_id"])
+        .unique()
+        .join(item_prices, on="item_id", how="left")
+        .with_columns(pl.col("item_id").alias("item_name"), pl.lit("USD").alias("currency"))
+        .select(["item_id", "dept_id", "cat_id", "item_name", "price", "currency"])
+        .sort("item_id")
+    )
+    dim_store = (
+        combos.select(["store_id", "state_id"])
+        .unique()
+        .sort("store_id")
+        .with_columns(
+            pl.col("store_id").alias("store_name"),
+            pl.lit("regular").alias("type"),
+            pl.int_range(10000, 10000 + pl.len()).alias("size"),
+        )
+        .select(["store_id", "store_name", "state_id", "type", "size"])
+    )
+    dim_state = (
+        combos.select("state_id")
+        .unique()
+        .sort("state_id")
+        .with_columns(
+            pl.col("state_id")
+            .replace_strict({key: name for key, (name, _) in STATE_NAMES.items()}, default=pl.col("state_id"))
+            .alias("state_name"),
+            pl.col("state_id")
+            .replace_strict({key: region for key, (_, region) in STATE_NAMES.items()}, default="Unknown")
+            .alias("region"),
+        )
+    )
+    dim_calendar = calendar.select(
+        pl.col("date").alias("date_id"),
+        pl.col("d").alias("day_of_month"),
+        pl.col("wday")
+        .replace_strict({index + 1: name for index, name in enumerate(WEEKDAY_NAMES)}, default="Unknown")
+        .alias("day_name"),
+        "weekday",
+        "month",
+        "year",
+        pl.col("wm_yr_wk").alias("week_id"),
+        pl.coalesce(pl.col("event_name_1"), pl.lit("No Event")).alias("event_name"),
+        pl.coalesce(pl.col("event_type_1"), pl.lit("No Event")).alias("event_type"),
+        "snap_CA",
+        "snap_TX",
+        "snap_WI",
+    ).sort("date_id")
+    return {
+        "dim_item": dim_item,
+        "dim_store": dim_store,
+        "dim_state": dim_state,
+        "dim_calendar": dim_calendar.collect(),
+    }
+
+
+def partition_sizes(
+    combos: pl.DataFrame, price_stats: pl.DataFrame, dim_store: pl.DataFrame, key: str
+) -> Dict[str, Tuple[int, int]]:
+    """Số dòng sales và sell_prices của từng phân vùng."""
+    sales_counts = combos.group_by(key).agg(pl.col("rows").sum())
+    price_counts = (
+        price_stats.join(dim_store.select(["store_id", "state_id"]), on="store_id")
+        .group_by(key)
+        .agg(pl.col("rows").sum())
+    )
+    prices_by_key = dict(zip(price_counts[key].to_list(), price_counts["rows"].to_list()))
+    return {
+        value: (rows, prices_by_key.get(value, 0))
+        for value, rows in zip(sales_counts[key].to_list(), sales_counts["rows"].to_list())
+    }
+
+
+def fact_query(
+    input_dir: Path, key: str, value: str, stores: List[str], offset: int
+) -> pl.LazyFrame:
+    """sales ⋈ calendar ⋈ sell_prices của một phân vùng (gồm các cửa hàng `stores`).
+
+    sales_id bắt đầu từ offset + 1 để toàn bảng vẫn là một dãy liên tục.
+    """
+    sales, calendar, prices = scan_inputs(input_dir)
+    weeks = calendar.select(["date", pl.col("wm_yr_wk").alias("week_id")])
+    part_sales = sales.filter(pl.col(key) == value)
+    part_prices = prices.filter(pl.col("store_id").is_in(stores)).select(["store_id", "item_id", "wm_yr_wk", pl.col("sell_price").cast(pl.Float32)])
+    return (
+        part_sales.join(weeks, on="date", how="left")
+        .join(
+            part_prices,
+            left_on=["store_id", "item_id", "week_id"],
+            right_on=["store_id", "item_id", "wm_yr_wk"],
+            how="left",
+        )
+        .with_row_index("sales_id", offset=offset + 1)
+        .with_columns(
+            pl.col("sales_id").cast(pl.Int64),
+            pl.col("date").alias("date_id"),
+            pl.col("units_sold").cast(pl.Int16),
+            (pl.col("units_sold") * pl.col("sell_price")).cast(pl.Float32).alias("revenue"),
+        )
+        .select(FACT_COLUMNS)
+    )
+
+
+def _write_partition(
+    input_dir: str, output_dir: str, key: str, value: str, stores: List[str], offset: int
+) -> Dict[str, Any]:
+    """Chạy trong process con: stream một phân vùng fact thẳng vào Parquet."""
+    started = time.perf_counter()
+    path = Path(output_dir) / FACT_DIRNAME / f"{key}={value}" / "part-0.parquet"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    fact_query(Path(input_dir), key, value, stores, offset).sink_parquet(tmp_path)
+    os.replace(tmp_path, path)
+    rows = pl.scan_parquet(path).select(pl.len()).collect().item()
+    return {
+        "partition": value,
+        "rows": rows,
+        "seconds": time.perf_counter() - started,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def plan_workers(
+    sizes: Dict[str, Tuple[int, int]], memory_budget_mb: int, max_workers: int
+) -> Tuple[int, float]:
+    """Số worker chạy đồng thời sao cho (số worker × ước lượng của phân vùng lớn nhất) ≤ ngân sách."""
+    largest_prices = max((prices for _, prices in sizes.values()), default=0)
+    per_worker_mb = WORKER_BASE_MB + largest_prices * PRICE_ROW_BYTES / 2**20
+    workers = max(1, min(max_workers, len(sizes), int(memory_budget_mb // per_worker_mb)))
+    return workers, per_worker_mb
+
+
+def _build_into(
+    input_dir: Path, output_dir: Path, key: str, memory_budget_mb: int, max_workers: int
+) -> Dict[str, Any]:
+    """Ghi các bảng dim và mọi phân vùng fact_sales vào `output_dir` (thư mục tạm của build)."""
+    sales, calendar, prices = scan_inputs(input_dir)
+    combos, price_stats = summarize_keys(sales, prices)
+    dimensions = build_dimensions(combos, price_stats, calendar)
+    for name, frame in dimensions.items():
+        frame.write_parquet(output_dir / f"{name}.parquet")
+    dim_store = dimensions["dim_store"]
+    sizes = partition_sizes(combos, price_stats, dim_store, key)
+    workers, per_worker_mb = plan_workers(sizes, memory_budget_mb, max_workers)
+
+    offsets: Dict[str, int] = {}
+    total = 0
+    for value, (rows, _) in sorted(sizes.items()):
+        offsets[value] = total
+        total += rows
+
+    # mỗi worker dùng một phần số luồng Polars để tổng số luồng không vượt số core
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    previous_threads = os.environ.get("POLARS_MAX_THREADS")
+    os.environ["POLARS_MAX_THREADS"] = str(threads)
+    partitions: List[Dict[str, Any]] = []
+    try:
+        context = multiprocessing.get_context("spawn")  # fork sau khi Polars đã tạo luồng không an toàn
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            futures = [
+                pool.submit(
+                    _write_partition,
+                    str(input_dir),
+                    str(output_dir),
+                    key,
+                    value,
+                    dim_store.filter(pl.col(key) == value)["store_id"].to_list(),
+                    offsets[value],
+                )
+                for value in sorted(sizes, key=lambda item: -sizes[item][0])  # phân vùng lớn chạy trước
+            ]
+            for future in as_completed(futures):
+                result = future.result()
+                partitions.append(result)
+                print(
+                    f"  • {key}={result['partition']:<8} {result['rows']:>12,} hàng | "
+                    f"{result['rows'] / result['seconds']:>12,.0f} hàng/s | "
+                    f"RSS đỉnh {result['peak_rss_mb']:8.1f} MB"
+                )
+    finally:
+        if previous_threads is None:
+            os.environ.pop("POLARS_MAX_THREADS", None)
+        else:
+            os.environ["POLARS_MAX_THREADS"] = previous_threads
+
+    return {
+        "rows": sum(item["rows"] for item in partitions),
+        "workers": workers,
+        "threads_per_worker": threads,
+        "estimated_worker_mb": per_worker_mb,
+        "peak_worker_rss_mb": max((item["peak_rss_mb"] for item in partitions), default=0.0),
+        "dimensions": {name: frame.height for name, frame in dimensions.items()},
+    }
+
+
+def build(
+    input_dir: Path, output_dir: Path, key: str, memory_budget_mb: int, max_workers: int
+) -> Dict[str, Any]:
+    started = time.perf_counter()
+    # mọi bảng được ghi vào thư mục tạm rồi thay cả thư mục: không còn phân vùng fact của lần chạy trước
+    tmp_dir = staging_dir(output_dir)
+    tmp_dir.mkdir(parents=True)
+    try:
+        report = _build_into(input_dir, tmp_dir, key, memory_budget_mb, max_workers)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    replace_dir(tmp_dir, output_dir)
+
+    elapsed = time.perf_counter() - started
+    return {
+        **report,
+        "seconds": elapsed,
+        "rows_per_second": report["rows"] / elapsed if elapsed else 0.0,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--input-dir", type=Path, default=INPUT_DIR)
+    parser.add_argument("--output-dir", type=Path, default=OUTPUT_DIR)
+    parser.add_argument("--partition-by", choices=("store_id", "state_id"), default="store_id")
+    parser.add_argument("--memory-budget-mb", type=int, default=2048)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="upper bound")
+    args = parser.parse_args()
+
+    report = build(args.input_dir, args.output_dir, args.partition_by, args.memory_budget_mb, args.workers)
+    dimensions = ", ".join(f"{k} {v:,}" for k, v in report["dimensions"].items())
+    print(f"\n Dimension Tables: {dimensions}")
+    print(
+        f" Fact Table: {report['rows']:,} hàng trong {report['seconds']:.2f}s "
+        f"({report['rows_per_second']:,.0f} hàng/s) với {report['workers']} worker × "
+        f"{report['threads_per_worker']} luồng (ước lượng {report['estimated_worker_mb']:.0f} MB/worker)"
+    )
+    print(
+        f" RSS đỉnh: process chính {report['peak_rss_mb']:.1f} MB, "
+        f"worker lớn nhất {report['peak_worker_rss_mb']:.1f} MB"
+    )
+
+
+if __name__ == "__main__":
+    main()
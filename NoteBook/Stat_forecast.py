@@ -0,0 +1,643 @@
+"""Fit ARIMA/SARIMA, ETS and seasonal-naive forecasts for every item × store series in a process pool.
+
+Batch replacement for ARIMA_SARIMA.ipynb, which ran one `pm.auto_arima` plus
+`ARIMA(order).fit()` on a single store. The long sales table is read in
+Arrow batches straight into a dense (series × day) float32 matrix. Series
+are then sent in chunks to spawned workers, with BLAS threads pinned to one
+per worker. Each worker cleans outliers like the notebook did (values above
+rolling-7 mean + 3·std) and fits the requested methods:
+
+* snaive  - the value from one season ago (numpy, always available)
+* ets     - additive Holt-Winters, fitted over a small (alpha, gamma) grid, vectorised across series (numpy)
+* arima   - statsmodels ARIMA; orders come from pmdarima.auto_arima (or a small AIC grid)
+* sarima  - the same on log1p with a weekly season (m=7), as in the notebook
+
+Chosen orders and fitted parameters are cached per series in
+<output>/orders.parquet. A refit reuses the cached order and warm-starts
+from the cached parameters, so the order search is skipped. Forecasts are
+streamed to <output>/forecasts.parquet one row group per chunk.
+
+To pick a method, every method is first fitted without the last --holdout
+days, and its forecast for those days is scored by MAE. The order search
+runs on this shorter fit. The method is then refitted on the full series,
+reusing the order and warm-starting from the parameters. For each series,
+the forecast of the method with the lowest holdout MAE is published as a
+versioned `arima` model for the API (MODEL_DIR/arima/<version>/model.joblib,
+see docker/API/forecasts.py).
+
+    python NoteBook/Stat_forecast.py --sales Data/Parquet/test/sales.parquet --output Data/Forecasts
+    python NoteBook/Stat_forecast.py --methods snaive,ets,sarima --horizon 28 --workers 8 --activate
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+REPO_DIR = Path(__file__).resolve().parents[1]
+sys.path.append(str(REPO_DIR / "docker" / "API"))
+
+from encoding import code_router  # noqa: E402
+from features import FEATURE_COLUMNS  # noqa: E402
+from forecasts import ForecastTable  # noqa: E402
+from Train_model import ENCODING_PATH, MODEL_DIR, publish  # noqa: E402
+
+SALES_PATH = REPO_DIR / "Data" / "Parquet" / "test" / "sales.parquet"
+OUTPUT_DIR = REPO_DIR / "Data" / "Forecasts"
+VARIANT = "arima"
+METHODS = ("snaive", "ets", "arima", "sarima")
+SEASON = 7
+HORIZON = 28
+HOLDOUT = 28
+CHUNK_SERIES = 256
+# lưới tham số làm mượt của ETS cộng tính (level alpha, mùa gamma)
+ETS_ALPHAS = (0.05, 0.1, 0.2, 0.4)
+ETS_GAMMAS = (0.05, 0.2)
+# chuỗi ngắn hơn / toàn hằng số không fit ARIMA được: dùng seasonal naive
+MIN_ARIMA_DAYS = 8 * SEASON
+ORDERS_FILENAME = "orders.parquet"
+FORECASTS_FILENAME = "forecasts.parquet"
+ID_TYPE = pa.dictionary(pa.int32(), pa.string())
+FORECAST_SCHEMA = pa.schema(
+    [
+        ("store_id", ID_TYPE),
+        ("item_id", ID_TYPE),
+        ("date", pa.date32()),
+        ("method", ID_TYPE),
+        ("forecast", pa.float32()),
+        ("selected", pa.bool_()),
+    ]
+)
+ORDER_SCHEMA = pa.schema(
+    [
+        ("store_id", pa.string()),
+        ("item_id", pa.string()),
+        ("method", pa.string()),
+        ("order", pa.list_(pa.int16())),
+        ("seasonal_order", pa.list_(pa.int16())),
+        ("params", pa.list_(pa.float64())),
+        ("aic", pa.float64()),
+        ("fitted_through", pa.date32()),
+    ]
+)
+
+Key = Tuple[str, str]
+
+
+# ----------------------------------------------------------------------------- đọc dữ liệu
+
+
+def _date_column(schema: pa.Schema) -> str:
+    for name in ("date", "date_id"):
+        if name in schema.names:
+            return name
+    raise KeyError("bảng bán hàng cần cột date hoặc date_id")
+
+
+def _batches(path: Path, columns: List[str]) -> Iterator[pa.RecordBatch]:
+    dataset = ds.dataset(str(path), format="parquet", partitioning="hive")
+    for batch in dataset.to_batches(columns=columns, batch_size=1 << 20):
+        if batch.num_rows:
+            yield batch
+
+
+def _codes(column: pa.Array, lookup: Dict[str, int]) -> np.ndarray:
+    """Mã số toàn cục của một cột id (chuỗi hoặc dictionary) qua từ điển dùng chung giữa các batch."""
+    if not pa.types.is_dictionary(column.type):
+        column = pc.dictionary_encode(column.cast(pa.string()))
+    names = column.dictionary.cast(pa.string()).to_pylist()
+    table = np.array([lookup.setdefault(name, len(lookup)) for name in names], dtype=np.int64)
+    return table[column.indices.to_numpy(zero_copy_only=False)]
+
+
+def _days(column: pa.Array) -> np.ndarray:
+    if not pa.types.is_date32(column.type):
+        column = column.cast(pa.date32())
+    return column.to_numpy(zero_copy_only=False).astype("datetime64[D]").astype(np.int64)
+
+
+def load_series(path: Path) -> Tuple[List[Key], np.ndarray, int]:
+    """Bảng dài (store_id, item_id, ngày, units_sold) -> ma trận dày (chuỗi × ngày) float32.
+
+    Hai lượt đọc theo batch: lượt đầu gom các cặp (store, item) và khoảng ngày,
+    lượt sau ghi thẳng units_sold vào ma trận. Ngày không có dòng nhận 0.
+    """
+    date_name = _date_column(ds.dataset(str(path), format="parquet", partitioning="hive").schema)
+    stores: Dict[str, int] = {}
+    items: Dict[str, int] = {}
+    # mã cặp = store * SPAN + item; 2**32 dư cho số sản phẩm của M5
+    span = 1 << 32
+    pairs: List[np.ndarray] = []
+    first, last = None, None
+    for batch in _batches(path, ["store_id", "item_id", date_name]):
+        code = _codes(batch.column("store_id"), stores) * span + _codes(batch.column("item_id"), items)
+        pairs.append(np.unique(code))
+        days = _days(batch.column(date_name))
+        first = int(days.min()) if first is None else min(first, int(days.min()))
+        last = int(days.max()) if last is None else max(last, int(days.max()))
+    if first is None:
+        raise ValueError(f"không có dòng nào trong {path}")
+    keys = np.unique(np.concatenate(pairs))
+    matrix = np.zeros((keys.size, last - first + 1), dtype=np.float32)
+    for batch in _batches(path, ["store_id", "item_id", date_name, "units_sold"]):
+        code = _codes(batch.column("store_id"), stores) * span + _codes(batch.column("item_id"), items)
+        rows = np.searchsorted(keys, code)
+        days = _days(batch.column(date_name)) - first
+        matrix[rows, days] = batch.column("units_sold").to_numpy(zero_copy_only=False)
+    store_names = {code: name for name, code in stores.items()}
+    item_names = {code: name for name, code in items.items()}
+    series = [(store_names[int(code // span)], item_names[int(code % span)]) for code in keys]
+    return series, matrix, first
+
+
+# ----------------------------------------------------------------------------- mô hình
+
+
+def clip_outliers(matrix: np.ndarray, window: int = SEASON, sigmas: float = 3.0) -> np.ndarray:
+    """Như notebook: giá trị > mean + 3·std của các ngày lân cận (cửa sổ 7 ngày ở giữa) -> mean đó.
+
+    Khác notebook, cửa sổ không gồm chính điểm đang xét: với 7 điểm, một giá trị
+    không bao giờ vượt quá 3·std của cửa sổ chứa nó, nên quy tắc cũ không bắt được gì.
+    """
+    values = matrix.astype(np.float64)
+    half = window // 2
+    if values.shape[1] < window:
+        return matrix.astype(np.float32)
+    pad = np.zeros((values.shape[0], 1))
+    total = np.concatenate([pad, np.cumsum(values, axis=1)], axis=1)
+    squares = np.concatenate([pad, np.cumsum(values**2, axis=1)], axis=1)
+    centre = values[:, half:values.shape[1] - half]
+    count = window - 1
+    neighbour_sum = total[:, window:] - total[:, :-window] - centre
+    neighbour_sq = squares[:, window:] - squares[:, :-window] - centre**2
+    mean = neighbour_sum / count
+    std = np.sqrt(np.maximum((neighbour_sq - neighbour_sum**2 / count) / (count - 1), 0.0))
+    cleaned = values.copy()
+    cleaned[:, half:values.shape[1] - half] = np.where(centre > mean + sigmas * std, mean, centre)
+    return cleaned.astype(np.float32)
+
+
+def seasonal_naive(values: np.ndarray, horizon: int, season: int = SEASON) -> Tuple[np.ndarray, np.ndarray]:
+    """Dự báo = giá trị cùng thứ của mùa cuối; fitted một bước = giá trị cách một mùa."""
+    last = values[:, -season:]
+    forecast = last[:, np.arange(horizon) % season]
+    fitted = np.full(values.shape, np.nan, dtype=np.float64)
+    fitted[:, season:] = values[:, :-season]
+    return forecast, fitted
+
+
+def ets_additive(
+    values: np.ndarray, horizon: int, season: int = SEASON
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ETS(A,N,A) cho cả khối chuỗi cùng lúc trên lưới (alpha, gamma); mỗi chuỗi giữ cặp có SSE nhỏ nhất.
+
+    Trả về (forecast, fitted một bước, chỉ số cặp được chọn).
+    """
+    grid = np.array([(a, g) for a in ETS_ALPHAS for g in ETS_GAMMAS])
+    alpha, gamma = grid[:, 0:1], grid[:, 1:2]
+    y = values.astype(np.float64)
+    series, days = y.shape
+    start = y[:, :season]
+    level = np.broadcast_to(start.mean(axis=1), (len(grid), series)).copy()
+    seasonal = np.broadcast_to(start - start.mean(axis=1, keepdims=True), (len(grid), series, season)).copy()
+    fitted = np.full((len(grid), series, days), np.nan)
+    sse = np.zeros((len(grid), series))
+    for t in range(season, days):
+        slot = t % season
+        prediction = level + seasonal[:, :, slot]
+        fitted[:, :, t] = prediction
+        error = y[:, t] - prediction
+        sse += error**2
+        level = level + alpha * error
+        seasonal[:, :, slot] += gamma * error
+    best = sse.argmin(axis=0)
+    pick = np.arange(series)
+    steps = (days + np.arange(horizon)) % season
+    forecast = level[best, pick][:, None] + seasonal[best, pick][:, steps]
+    return forecast, fitted[best, pick], best
+
+
+def _search_order(y: np.ndarray, seasonal: bool) -> Tuple[Tuple[int, ...], Tuple[int, ...]]:
+    """Chọn bậc như notebook (pmdarima.auto_arima stepwise); thiếu pmdarima thì dò lưới AIC nhỏ."""
+    try:
+        import pmdarima as pm
+    except ImportError:  # pmdarima là tùy chọn: dò lưới p, q ≤ 2 bằng statsmodels
+        pm = None
+    if pm is not None:
+        fitted = pm.auto_arima(
+            y,
+            seasonal=seasonal,
+            m=SEASON if seasonal else 1,
+            test="adf",
+            stepwise=True,
+            suppress_warnings=True,
+            error_action="ignore",
+        )
+        return tuple(fitted.order), tuple(fitted.seasonal_order)
+    from statsmodels.tsa.arima.model import ARIMA
+    from statsmodels.tsa.stattools import adfuller
+
+    with warnings.catch_warnings():
+        # cảnh báo hội tụ của từng bậc thử không giúp gì: bậc tồi đã bị loại qua AIC
+        warnings.simplefilter("ignore")
+        d = 0 if adfuller(y, autolag="AIC")[1] < 0.05 else 1
+        seasonal_order = (1, 0, 1, SEASON) if seasonal else (0, 0, 0, 0)
+        best, best_aic = ((1, d, 1), seasonal_order), np.inf
+        for p in range(3):
+            for q in range(3):
+                try:
+                    aic = ARIMA(y, order=(p, d, q), seasonal_order=seasonal_order).fit().aic
+                except Exception:
+                    continue
+                if aic < best_aic:
+                    best, best_aic = ((p, d, q), seasonal_order), aic
+    return best
+
+
+def fit_arima(
+    y: np.ndarray, horizon: int, seasonal: bool, cached: Optional[Dict[str, Any]]
+) -> Tuple[np.ndarray, np.ndarray, Dict[str, Any], bool]:
+    """Fit một chuỗi; có bậc trong cache thì bỏ qua bước dò và khởi động từ tham số cũ.
+
+    SARIMA fit trên log1p rồi đảo lại bằng expm1 như notebook. Trả về
+    (forecast, fitted, mục cache mới, có phải dò bậc hay không).
+    """
+    from statsmodels.tsa.arima.model import ARIMA
+
+    target = np.log1p(y) if seasonal else y
+    searched = cached is None
+    if searched:
+        order, seasonal_order = _search_order(target, seasonal)
+        start_params = None
+    else:
+        order, seasonal_order = tuple(cached["order"]), tuple(cached["seasonal_order"])
+        start_params = np.asarray(cached["params"], dtype=np.float64)
+    model = ARIMA(target, order=order, seasonal_order=seasonal_order)
+    if start_params is not None and start_params.size != len(model.param_names):
+        start_params = None
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        result = model.fit(start_params=start_params)
+    forecast = np.asarray(result.forecast(horizon), dtype=np.float64)
+    fitted = np.asarray(result.fittedvalues, dtype=np.float64)
+    if seasonal:
+        forecast, fitted = np.expm1(forecast), np.expm1(fitted)
+    entry = {
+        "order": list(order),
+        "seasonal_order": list(seasonal_order),
+        "params": np.asarray(result.params, dtype=np.float64).tolist(),
+        "aic": float(result.aic),
+    }
+    return forecast, fitted, entry, searched
+
+
+def _holdout_mae(forecast: np.ndarray, actual: np.ndarray) -> np.ndarray:
+    # chuỗi không có dự báo (NaN) trong khoảng holdout không được chọn
+    error = np.abs(np.asarray(forecast, dtype=np.float64) - actual).mean(axis=1)
+    return np.nan_to_num(error, nan=np.inf)
+
+
+def _fit_chunk(
+    keys: List[Key],
+    values: np.ndarray,
+    methods: Sequence[str],
+    horizon: int,
+    holdout: int,
+    cache: Dict[Key, Dict[str, Dict[str, Any]]],
+    clean: bool,
+) -> Dict[str, Any]:
+    """Chạy trong process con: mọi phương pháp cho một khối chuỗi.
+
+    Mỗi phương pháp được fit hai lần: trên chuỗi bỏ `holdout` ngày cuối để
+    chấm MAE dự báo ngoài mẫu trên các ngày đó (dùng để chọn phương pháp), rồi
+    trên cả chuỗi để dự báo. ARIMA/SARIMA chỉ dò bậc ở lần đầu; lần fit cả
+    chuỗi dùng lại bậc và khởi động từ tham số vừa tìm được. Trả về forecast
+    (phương pháp × chuỗi × horizon), MAE holdout, các mục cache bậc mới và số
+    lần dò bậc / khởi động ấm / thất bại.
+    """
+    started = time.perf_counter()
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    cpu_started = usage.ru_utime + usage.ru_stime
+    actual = values[:, -holdout:].astype(np.float64)
+    # làm sạch phần train riêng: cửa sổ của clip_outliers không nhìn sang ngày holdout
+    train = clip_outliers(values[:, :-holdout]) if clean else values[:, :-holdout].astype(np.float32)
+    values = clip_outliers(values) if clean else values.astype(np.float32)
+    forecasts = np.zeros((len(methods), len(keys), horizon), dtype=np.float32)
+    mae = np.full((len(methods), len(keys)), np.inf)
+    naive, _ = seasonal_naive(values, horizon)
+    counts = {"searched": 0, "warm": 0, "failed": 0}
+    orders: Dict[Key, Dict[str, Dict[str, Any]]] = {}
+    for index, method in enumerate(methods):
+        if method == "snaive":
+            forecasts[index] = naive
+            mae[index] = _holdout_mae(seasonal_naive(train, holdout)[0], actual)
+            continue
+        if method == "ets":
+            forecasts[index] = ets_additive(values, horizon)[0]
+            mae[index] = _holdout_mae(ets_additive(train, holdout)[0], actual)
+            continue
+        for row, key in enumerate(keys):
+            forecasts[index, row] = naive[row]
+            # bỏ chuỗi 0 đầu kỳ (sản phẩm chưa bán) trước khi fit ARIMA
+            active = np.flatnonzero(train[row])
+            if not active.size:
+                continue
+            y_train = train[row, active[0]:]
+            if y_train.size < MIN_ARIMA_DAYS or np.ptp(y_train) == 0:
+                continue
+            try:
+                scored, _, entry, searched = fit_arima(
+                    y_train.astype(np.float64), holdout, method == "sarima", cache.get(key, {}).get(method)
+                )
+                forecast, _, entry, _ = fit_arima(
+                    values[row, active[0]:].astype(np.float64), horizon, method == "sarima", entry
+                )
+            except Exception:
+                counts["failed"] += 1
+                continue
+            counts["searched" if searched else "warm"] += 1
+            orders.setdefault(key, {})[method] = entry
+            forecasts[index, row] = forecast
+            mae[index, row] = _holdout_mae(scored[None, :], actual[row:row + 1])[0]
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return {
+        "keys": keys,
+        "forecasts": np.maximum(forecasts, 0.0),
+        "mae": mae,
+        "orders": orders,
+        **counts,
+        "seconds": time.perf_counter() - started,
+        "cpu_seconds": usage.ru_utime + usage.ru_stime - cpu_started,
+    }
+
+
+# ----------------------------------------------------------------------------- cache bậc và đầu ra
+
+
+def load_orders(path: Path) -> Dict[Key, Dict[str, Dict[str, Any]]]:
+    """orders.parquet -> {(store, item): {phương pháp: {order, seasonal_order, params, aic}}}."""
+    if not path.is_file():
+        return {}
+    cache: Dict[Key, Dict[str, Dict[str, Any]]] = {}
+    for row in pq.read_table(path).to_pylist():
+        cache.setdefault((row["store_id"], row["item_id"]), {})[row["method"]] = row
+    return cache
+
+
+def save_orders(path: Path, cache: Dict[Key, Dict[str, Dict[str, Any]]], fitted_through: Any) -> None:
+    rows = [
+        {
+            "store_id": store,
+            "item_id": item,
+            "method": method,
+            "order": entry["order"],
+            "seasonal_order": entry["seasonal_order"],
+            "params": entry["params"],
+            "aic": entry.get("aic"),
+            "fitted_through": entry.get("fitted_through", fitted_through),
+        }
+        for (store, item), methods in sorted(cache.items())
+        for method, entry in sorted(methods.items())
+    ]
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    pq.write_table(pa.Table.from_pylist(rows, schema=ORDER_SCHEMA), tmp)
+    os.replace(tmp, path)
+
+
+def _forecast_batch(
+    keys: List[Key], forecasts: np.ndarray, best: np.ndarray, methods: Sequence[str], start_day: int
+) -> pa.Table:
+    """Khối kết quả dạng dài: một dòng cho mỗi chuỗi × phương pháp × ngày."""
+    count, series, horizon = forecasts.shape
+    store, item = zip(*keys)
+    series_index = np.tile(np.repeat(np.arange(series, dtype=np.int32), horizon), count)
+    stores = pa.array(store).dictionary_encode()
+    items = pa.array(item).dictionary_encode()
+    method_index = np.repeat(np.arange(count, dtype=np.int32), series * horizon)
+    return pa.Table.from_arrays(
+        [
+            pa.DictionaryArray.from_arrays(
+                stores.indices.take(pa.array(series_index)), stores.dictionary
+            ),
+            pa.DictionaryArray.from_arrays(items.indices.take(pa.array(series_index)), items.dictionary),
+            pa.array(np.tile(start_day + np.arange(horizon), series * count).astype(np.int32), pa.date32()),
+            pa.DictionaryArray.from_arrays(pa.array(method_index), pa.array(list(methods))),
+            pa.array(forecasts.ravel()),
+            pa.array(method_index == best[series_index]),
+        ],
+        schema=FORECAST_SCHEMA,
+    )
+
+
+def _unroutable(table: ForecastTable, encoding_path: Path) -> Dict[str, List[str]]:
+    """Id mà API sẽ không tra được theo encoding hiện tại (trùng giá trị hoặc thiếu trong mapping)."""
+    with open(encoding_path, "r", encoding="utf-8") as source:
+        mapping = json.load(source)
+    return table.bind_routes(
+        {column: code_router(mapping, column, names) for column, names in table.encoded_ids().items()}
+    )
+
+
+def forecast(
+    sales_path: Path,
+    output_dir: Path,
+    methods: Sequence[str],
+    horizon: int = HORIZON,
+    holdout: int = HOLDOUT,
+    chunk_series: int = CHUNK_SERIES,
+    workers: Optional[int] = None,
+    clean: bool = True,
+    refresh_orders: bool = False,
+    model_dir: Optional[Path] = None,
+    encoding_path: Path = ENCODING_PATH,
+    version: Optional[str] = None,
+    activate: bool = False,
+) -> Dict[str, Any]:
+    if {"arima", "sarima"} & set(methods):
+        try:
+            import statsmodels  # noqa: F401
+        except ImportError as exc:
+            raise ImportError("arima/sarima cần statsmodels (pmdarima tùy chọn, để dò bậc)") from exc
+    started = time.perf_counter()
+    cores = os.cpu_count() or 1
+    keys, matrix, first_day = load_series(sales_path)
+    if not 1 <= holdout <= matrix.shape[1] - MIN_ARIMA_DAYS:
+        raise ValueError(f"holdout phải trong khoảng 1..{matrix.shape[1] - MIN_ARIMA_DAYS} ngày")
+    load_seconds = time.perf_counter() - started
+    start_day = first_day + matrix.shape[1]
+    output_dir.mkdir(parents=True, exist_ok=True)
+    orders_path = output_dir / ORDERS_FILENAME
+    cache = {} if refresh_orders else load_orders(orders_path)
+    fitted_through = np.datetime64(start_day - 1, "D").item()
+
+    chunks = [(start, min(start + chunk_series, len(keys))) for start in range(0, len(keys), chunk_series)]
+    workers = max(1, min(workers or cores, len(chunks)))
+    best_values = np.zeros((len(keys), horizon), dtype=np.float32)
+    best_methods = np.zeros(len(keys), dtype=np.int32)
+    totals = {"searched": 0, "warm": 0, "failed": 0}
+    target = output_dir / FORECASTS_FILENAME
+    tmp = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+    # statsmodels dùng BLAS: mỗi worker một luồng để các process không tranh core
+    previous = {name: os.environ.get(name) for name in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS")}
+    os.environ.update({name: "1" for name in previous})
+    try:
+        context = multiprocessing.get_context("spawn")
+        with pq.ParquetWriter(tmp, FORECAST_SCHEMA) as writer, ProcessPoolExecutor(
+            max_workers=workers, mp_context=context
+        ) as pool:
+            futures = {
+                pool.submit(
+                    _fit_chunk,
+                    keys[start:stop],
+                    matrix[start:stop],
+                    list(methods),
+                    horizon,
+                    holdout,
+                    {key: cache[key] for key in keys[start:stop] if key in cache},
+                    clean,
+                ): start
+                for start, stop in chunks
+            }
+            for future in as_completed(futures):
+                start = futures.pop(future)
+                result = future.result()
+                stop = start + len(result["keys"])
+                best = result["mae"].argmin(axis=0)
+                best_methods[start:stop] = best
+                best_values[start:stop] = result["forecasts"][best, np.arange(len(best))]
+                writer.write_table(
+                    _forecast_batch(result["keys"], result["forecasts"], best, methods, start_day)
+                )
+                for key, entries in result["orders"].items():
+                    for entry in entries.values():
+                        entry["fitted_through"] = fitted_through
+                    cache.setdefault(key, {}).update(entries)
+                for name in totals:
+                    totals[name] += result[name]
+                print(
+                    f"  • chuỗi {start:>6,}-{stop - 1:<6,} | {result['seconds']:7.1f}s | "
+                    f"CPU {result['cpu_seconds']:7.1f}s | dò bậc {result['searched']} | "
+                    f"khởi động ấm {result['warm']} | lỗi {result['failed']}"
+                )
+        os.replace(tmp, target)
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        tmp.unlink(missing_ok=True)
+        if cache:
+            save_orders(orders_path, cache, fitted_through)
+
+    selected = {method: int((best_methods == index).sum()) for index, method in enumerate(methods)}
+    published = None
+    if model_dir is not None:
+        version = version or time.strftime("%Y%m%d-%H%M%S")
+        metadata = {
+            "variant": VARIANT,
+            "version": version,
+            "methods": list(methods),
+            "selected": selected,
+            "horizon": horizon,
+            "first_date": str(np.datetime64(start_day, "D")),
+            "series": len(keys),
+        }
+        stores, items = zip(*keys)
+        table = ForecastTable(FEATURE_COLUMNS, stores, items, start_day, best_values, metadata)
+        for column, names in _unroutable(table, encoding_path).items():
+            print(
+                f"Lưu ý: {len(names)} {column} trùng giá trị encoding hoặc không có trong mapping, "
+                f"API trả seasonal naive cho chúng: {', '.join(names[:10])}"
+            )
+        model_dir.mkdir(parents=True, exist_ok=True)
+        published = publish(table.to_artifact(), metadata, model_dir, VARIANT, version, activate)
+
+    wall = time.perf_counter() - started
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = children.ru_utime + children.ru_stime
+    return {
+        "series": len(keys),
+        "days": int(matrix.shape[1]),
+        "chunks": len(chunks),
+        "workers": workers,
+        "load_seconds": load_seconds,
+        "seconds": wall,
+        "cpu_seconds": cpu,
+        "core_utilisation": cpu / (wall * cores) if wall else 0.0,
+        "selected": selected,
+        "forecasts": target,
+        "published": published,
+        **totals,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sales", type=Path, default=SALES_PATH, help="long parquet file or directory")
+    parser.add_argument("--output", type=Path, default=OUTPUT_DIR)
+    parser.add_argument("--methods", default="snaive,ets,arima,sarima", help=f"subset of {','.join(METHODS)}")
+    parser.add_argument("--horizon", type=int, default=HORIZON)
+    parser.add_argument("--holdout", type=int, default=HOLDOUT, help="last days held out to score forecasts and pick the best method")
+    parser.add_argument("--chunk-series", type=int, default=CHUNK_SERIES)
+    parser.add_argument("--workers", type=int, help="default: one per core")
+    parser.add_argument("--no-clean", action="store_true", help="keep outliers")
+    parser.add_argument("--refresh-orders", action="store_true", help="ignore orders.parquet and re-search")
+    parser.add_argument("--model-dir", type=Path, default=MODEL_DIR)
+    parser.add_argument("--no-publish", action="store_true", help="only write Parquet")
+    parser.add_argument("--encoding", type=Path, default=ENCODING_PATH)
+    parser.add_argument("--version")
+    parser.add_argument("--activate", action="store_true", help=f"point {VARIANT}/CURRENT at this version")
+    args = parser.parse_args()
+
+    methods = [name.strip() for name in args.methods.split(",") if name.strip()]
+    unknown = sorted(set(methods) - set(METHODS))
+    if unknown or not methods:
+        parser.error(f"phương pháp không hỗ trợ: {', '.join(unknown) or '(trống)'}")
+    report = forecast(
+        args.sales,
+        args.output,
+        methods,
+        args.horizon,
+        args.holdout,
+        args.chunk_series,
+        args.workers,
+        not args.no_clean,
+        args.refresh_orders,
+        None if args.no_publish else args.model_dir,
+        args.encoding,
+        args.version,
+        args.activate,
+    )
+    print(
+        f"\nĐã dự báo {report['series']:,} chuỗi × {args.horizon} ngày ({report['days']:,} ngày lịch sử, "
+        f"đọc {report['load_seconds']:.1f}s) trong {report['seconds']:.1f}s với {report['workers']} worker"
+    )
+    print(
+        f"ARIMA: dò bậc {report['searched']:,}, khởi động ấm từ cache {report['warm']:,}, lỗi {report['failed']:,}"
+    )
+    print("Phương pháp được chọn: " + ", ".join(f"{k}={v:,}" for k, v in report["selected"].items()))
+    print(
+        f"CPU {report['cpu_seconds']:.1f}s: sử dụng {report['core_utilisation']:.0%}; "
+        f"forecast -> {report['forecasts']}"
+    )
+    if report["published"] is not None:
+        print(f"Mô hình {VARIANT} -> {report['published']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+"""Train per-store (or per-dept) LightGBM/XGBoost models in a process pool and publish them.
+
+Replaces the Data_storage.ipynb split loop (one boolean mask per store) and
+the store-at-a-time training in the LightGBM/XGBoost notebooks. The model
+table is read once and split into one Parquet file per partition with a
+single groupby pass. Each partition is trained in a worker process, with
+OMP and model threads capped at cores // workers. The models are
+published as one versioned artifact, MODEL_DIR/<variant>/<version>/model.joblib,
+which the API's model registry picks up (see docker/API/partitioned.py).
+
+    python NoteBook/Train_model.py --table Data/Parquet/Model_data.parquet --variant lightgbm
+    python NoteBook/Train_model.py --variant xgboost --partition-by dept_id --workers 4 --activate
+    python NoteBook/Train_model.py --variant lightgbm --params tuning.json   # best_params of Tune_model.py
+
+Features are built with docker/API/features.py and encoded with the API's
+target-encoding JSON, so training and serving see identical matrices.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import joblib
+import numpy as np
+import pandas as pd
+
+REPO_DIR = Path(__file__).resolve().parents[1]
+sys.path.append(str(REPO_DIR / "docker" / "API"))
+
+from features import (  # noqa: E402
+    DATE_COLUMN,
+    FEATURE_COLUMNS,
+    HISTORY_FEATURES,
+    TARGET_COLUMN,
+    build_training_frame,
+    encode_categoricals,
+)
+from partitioned import PartitionedModel  # noqa: E402
+from registry import CURRENT_FILENAME, MODEL_FILENAME  # noqa: E402
+
+MODEL_TABLE = REPO_DIR / "Data" / "Parquet" / "Model_data.parquet"
+MODEL_DIR = REPO_DIR / "docker" / "model"
+ENCODING_PATH = REPO_DIR / "docker" / "Dashboard" / "data" / "target_encoding_mapping.json"
+VALID_FROM = "2016-04-01"
+PARTITIONS = ("store_id", "dept_id", "none")
+
+# tham số của LightGBM.ipynb / XGBoost.ipynb, chạy trên CPU
+PARAMS: Dict[str, Dict[str, Any]] = {
+    "lightgbm": {
+        "objective": "tweedie",
+        "tweedie_variance_power": 1.5,
+        "num_leaves": 128,
+        "learning_rate": 0.05,
+        "n_estimators": 1500,
+        "max_depth": -1,
+        "feature_fraction": 0.8,
+        "bagging_fraction": 0.8,
+        "bagging_freq": 5,
+        "min_data_in_leaf": 200,
+        "reg_alpha": 1.0,
+        "reg_lambda": 2.0,
+        "max_bin": 255,
+        "verbose": -1,
+    },
+    "xgboost": {
+        "objective": "reg:tweedie",
+        "eval_metric": "mae",
+        "tree_method": "hist",
+        "n_estimators": 10000,
+        "learning_rate": 0.01,
+        "max_depth": 8,
+        "min_child_weight": 20,
+        "subsample": 0.7,
+        "colsample_bytree": 0.8,
+        "tweedie_variance_power": 1.5,
+        "reg_alpha": 0.1,
+        "random_state": 42,
+    },
+}
+
+
+def split_partitions(table: Path, column: str, spool_dir: Path) -> Dict[str, Dict[str, Any]]:
+    """Một lần groupby -> một file Parquet cho mỗi phân vùng (thay cho df[df[col] == v] trong vòng lặp)."""
+    frame = pd.read_parquet(table)
+    if column == "none":
+        return {"all": {"path": table, "rows": len(frame)}}
+    spool_dir.mkdir(parents=True, exist_ok=True)
+    partitions: Dict[str, Dict[str, Any]] = {}
+    for value, index in frame.groupby(column, observed=True, sort=True).indices.items():
+        path = spool_dir / f"{column}={value}.parquet"
+        frame.take(index).to_parquet(path, index=False)
+        partitions[str(value)] = {"path": path, "rows": int(index.size)}
+    return partitions
+
+
+def _make_model(variant: str, params: Dict[str, Any], threads: int) -> Any:
+    if variant == "lightgbm":
+        import lightgbm as lgb
+
+        return lgb.LGBMRegressor(**params, n_jobs=threads)
+    import xgboost as xgb
+
+    return xgb.XGBRegressor(**params, n_jobs=threads)
+
+
+def _train_partition(
+    variant: str,
+    value: str,
+    path: str,
+    encoding_path: str,
+    valid_from: str,
+    params: Dict[str, Any],
+    threads: int,
+) -> Dict[str, Any]:
+    """Chạy trong process con: đặc trưng + mã hóa + fit cho một phân vùng, kèm MAE/RMSE trên tập valid."""
+    started = time.perf_counter()
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    cpu_started = usage.ru_utime + usage.ru_stime
+    data = pd.read_parquet(path)
+    if any(column not in data.columns for column in HISTORY_FEATURES):
+        data = build_training_frame(data)
+    else:
+        data = data.dropna(subset=HISTORY_FEATURES).reset_index(drop=True)
+    with open(encoding_path, "r", encoding="utf-8") as source:
+        mapping = json.load(source)
+    dates = pd.to_datetime(data[DATE_COLUMN])
+    valid = (dates >= pd.Timestamp(valid_from)).to_numpy()
+    features = encode_categoricals(data[FEATURE_COLUMNS].copy(), mapping).astype(np.float32)
+    target = data[TARGET_COLUMN].to_numpy(dtype=np.float32)
+    if not (~valid).any():
+        raise ValueError(f"{value}: không có dòng huấn luyện trước {valid_from}")
+
+    model = _make_model(variant, params, threads)
+    model.fit(features[~valid], target[~valid])
+    result: Dict[str, Any] = {
+        "partition": value,
+        "model": model,
+        "train_rows": int((~valid).sum()),
+        "valid_rows": int(valid.sum()),
+        "mae": None,
+        "rmse": None,
+    }
+    if valid.any():
+        error = model.predict(features[valid]) - target[valid]
+        result["mae"] = float(np.abs(error).mean())
+        result["rmse"] = float(np.sqrt(np.mean(error**2)))
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    result["seconds"] = time.perf_counter() - started
+    result["cpu_seconds"] = usage.ru_utime + usage.ru_stime - cpu_started
+    return result
+
+
+def publish(
+    model: Any, metadata: Dict[str, Any], model_dir: Path, variant: str, version: str, activate: bool
+) -> Path:
+    """Ghi model.joblib + metadata.json vào thư mục tạm rồi đổi tên thành <variant>/<version>."""
+    target = model_dir / variant / version
+    if target.exists():
+        raise FileExistsError(f"phiên bản đã tồn tại: {target}")
+    # thư mục tạm nằm ngoài <variant>/ để registry không thấy phiên bản đang ghi dở
+    staging = Path(tempfile.mkdtemp(prefix=f".{variant}-{version}-", dir=model_dir))
+    try:
+        joblib.dump(model, staging / MODEL_FILENAME)
+        (staging / "metadata.json").write_text(json.dumps(metadata, indent=2), encoding="utf-8")
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(staging, target)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    if activate:
+        pointer = target.parent / CURRENT_FILENAME
+        tmp_pointer = pointer.with_name(f"{CURRENT_FILENAME}.{os.getpid()}.tmp")
+        tmp_pointer.write_text(version, encoding="utf-8")
+        os.replace(tmp_pointer, pointer)
+    return target
+
+
+def train(
+    table: Path,
+    variant: str,
+    partition_by: str,
+    model_dir: Path,
+    encoding_path: Path,
+    version: str,
+    valid_from: str = VALID_FROM,
+    workers: Optional[int] = None,
+    n_estimators: Optional[int] = None,
+    activate: bool = False,
+    overrides: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    target = model_dir / variant / version
+    if target.exists():  # publish() cũng kiểm tra, nhưng chỉ sau khi đã huấn luyện mọi phân vùng
+        raise FileExistsError(f"phiên bản đã tồn tại: {target}")
+    started = time.perf_counter()
+    cores = os.cpu_count() or 1
+    params = {**PARAMS[variant], **(overrides or {})}
+    if n_estimators is not None:
+        params["n_estimators"] = n_estimators
+    model_dir.mkdir(parents=True, exist_ok=True)
+    spool_dir = Path(tempfile.mkdtemp(prefix=".partitions-", dir=model_dir))
+    results: List[Dict[str, Any]] = []
+    try:
+        partitions = split_partitions(table, partition_by, spool_dir)
+        split_seconds = time.perf_counter() - started
+        workers = max(1, min(workers or cores, len(partitions)))
+        threads = max(1, cores // workers)
+        # process con (spawn) kế thừa biến môi trường: OpenMP của LightGBM/XGBoost không vượt số core
+        previous = {name: os.environ.get(name) for name in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS")}
+        os.environ.update({name: str(threads) for name in previous})
+        try:
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                futures = [
+                    pool.submit(
+                        _train_partition,
+                        variant,
+                        value,
+                        str(info["path"]),
+                        str(encoding_path),
+                        valid_from,
+                        params,
+                        threads,
+                    )
+                    # phân vùng lớn chạy trước để các worker kết thúc gần nhau
+                    for value, info in sorted(partitions.items(), key=lambda item: -item[1]["rows"])
+                ]
+                for future in as_completed(futures):
+                    result = future.result()
+                    results.append(result)
+                    mae = "-" if result["mae"] is None else f"{result['mae']:.4f}"
+                    print(
+                        f"  • {partition_by}={result['partition']:<10} {result['train_rows']:>10,} hàng | "
+                        f"{result['seconds']:7.1f}s | CPU {result['cpu_seconds']:7.1f}s | MAE valid {mae}"
+                    )
+        finally:
+            for name, value in previous.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+    finally:
+        shutil.rmtree(spool_dir, ignore_errors=True)
+
+    results.sort(key=lambda item: item["partition"])
+    metadata: Dict[str, Any] = {
+        "variant": variant,
+        "version": version,
+        "partition_by": partition_by,
+        "valid_from": valid_from,
+        "params": params,
+        "feature_columns": FEATURE_COLUMNS,
+        "partitions": {
+            item["partition"]: {key: item[key] for key in ("train_rows", "valid_rows", "mae", "rmse")}
+            for item in results
+        },
+    }
+    if partition_by == "none":
+        model = results[0]["model"]
+    else:
+        with open(encoding_path, "r", encoding="utf-8") as source:
+            # bỏ giá trị null như CompiledEncoding.from_mapping / code_router: phân vùng
+            # không có mã thì PartitionedModel báo "không có giá trị mã hóa"
+            codes = {
+                name: value for name, value in json.load(source).get(partition_by, {}).items() if value is not None
+            }
+        model = PartitionedModel(
+            partition_by,
+            FEATURE_COLUMNS,
+            {item["partition"]: item["model"] for item in results},
+            codes,
+            metadata={key: metadata[key] for key in ("version", "partition_by", "valid_from")},
+        ).to_artifact()
+    path = publish(model, metadata, model_dir, variant, version, activate)
+
+    wall = time.perf_counter() - started
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = children.ru_utime + children.ru_stime
+    return {
+        "path": path,
+        "partitions": len(results),
+        "workers": workers,
+        "threads_per_worker": threads,
+        "split_seconds": split_seconds,
+        "seconds": wall,
+        "cpu_seconds": cpu,
+        "core_utilisation": cpu / (wall * cores) if wall else 0.0,
+        "cores": cores,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--table", type=Path, default=MODEL_TABLE, help="model table parquet")
+    parser.add_argument("--variant", choices=sorted(PARAMS), default="lightgbm")
+    parser.add_argument("--partition-by", choices=PARTITIONS, default="store_id")
+    parser.add_argument("--model-dir", type=Path, default=MODEL_DIR)
+    parser.add_argument("--encoding", type=Path, default=ENCODING_PATH)
+    parser.add_argument("--version", default=time.strftime("%Y%m%d-%H%M%S"))
+    parser.add_argument("--valid-from", default=VALID_FROM)
+    parser.add_argument("--workers", type=int, help="default: one per core")
+    parser.add_argument("--n-estimators", type=int, help="override the notebook value")
+    parser.add_argument("--activate", action="store_true", help="point <variant>/CURRENT at this version")
+    parser.add_argument("--params", type=Path, help="JSON parameter overrides, or a Tune_model.py report")
+    args = parser.parse_args()
+    if (args.model_dir / args.variant / args.version).exists():
+        parser.error(f"phiên bản đã tồn tại: {args.model_dir / args.variant / args.version} (đổi --version)")
+    overrides = None
+    if args.params:
+        overrides = json.loads(args.params.read_text(encoding="utf-8"))
+        if "best_params" in overrides:
+            if overrides.get("variant") != args.variant:
+                parser.error(f"{args.params} được tune cho {overrides.get('variant')}, không phải {args.variant}")
+            overrides = overrides["best_params"]
+
+    report = train(
+        args.table,
+        args.variant,
+        args.partition_by,
+        args.model_dir,
+        args.encoding,
+        args.version,
+        args.valid_from,
+        args.workers,
+        args.n_estimators,
+        args.activate,
+        overrides,
+    )
+    print(
+        f"\nĐã ghi {report['partitions']} mô hình vào {report['path']} trong {report['seconds']:.1f}s "
+        f"(chia phân vùng {report['split_seconds']:.1f}s) với {report['workers']} worker × "
+        f"{report['threads_per_worker']} luồng"
+    )
+    print(
+        f"CPU {report['cpu_seconds']:.1f}s trên {report['cores']} core: "
+        f"sử dụng {report['core_utilisation']:.0%}"
+    )
+    if not args.activate and (args.model_dir / args.variant / CURRENT_FILENAME).is_file():
+        print(f"Lưu ý: {args.variant}/{CURRENT_FILENAME} vẫn trỏ tới phiên bản cũ (dùng --activate).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,575 @@
+"""Tune LightGBM/XGBoost with rolling-origin cross-validation over cached binary training sets.
+
+The LightGBM/XGBoost notebooks rebuild features, re-encode categoricals and
+construct training matrices on every run. They score one fixed split at
+2016-04-01 and use hand-picked parameters. This script builds the feature
+matrix once. It is stored as .npy files sorted by date, with categorical
+columns kept as integer codes, under a key that hashes the table file, the
+feature code and the feature list. Each fold fits its own target encoding
+(smoothed mean target per category, the same formula and prior as the
+published mapping) on the rows before its origin, so validation
+targets never leak into the features of their fold; the published
+target_encoding_mapping.json is not used. For every fold it then writes
+the encoding and binary lightgbm.Dataset or xgboost.DMatrix files, keyed
+by origin, horizon and encoding fit range. A repeated run with the same
+key reads those binaries directly: features are not rebuilt, and LightGBM
+does not bin the data again.
+
+Folds are rolling origins (expanding window): fold k trains on every day
+before its origin and validates on the next --horizon days. Origins are
+--step days apart, and the last one ends on the last day of the table.
+Every (candidate, fold) pair runs as a task in a spawned process pool,
+with OpenMP threads capped at cores // workers. Tasks use early stopping
+on the fold's validation set. Candidates are ranked by mean RMSE over the
+folds. The report records, for each candidate, the fold metrics and the
+best iteration. It also records the winning parameters, which
+NoteBook/Train_model.py accepts through --params.
+
+    python NoteBook/Tune_model.py --table Data/Parquet/Model_data.parquet --variant lightgbm --output tuning.json
+    python NoteBook/Tune_model.py --partition-by store_id --partition CA_1 --folds 4 --grid '{"num_leaves": [63, 255]}'
+    python NoteBook/Train_model.py --variant lightgbm --params tuning.json --activate
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+REPO_DIR = Path(__file__).resolve().parents[1]
+sys.path.append(str(REPO_DIR / "docker" / "API"))
+
+import features as feature_module  # noqa: E402
+from features import (  # noqa: E402
+    CATEGORICAL_COLUMNS,
+    DATE_COLUMN,
+    FEATURE_COLUMNS,
+    HISTORY_FEATURES,
+    TARGET_COLUMN,
+    build_training_frame,
+    smoothed_target_mean,
+)
+from registry import file_digest  # noqa: E402
+from Train_model import MODEL_TABLE, PARAMS  # noqa: E402
+
+CACHE_DIR = REPO_DIR / "Data" / "Cache" / "tuning"
+CACHE_VERSION = 3  # tăng khi bố cục file cache thay đổi
+# cột phân loại của ma trận: lưu dưới dạng mã số, mỗi fold target-encode bằng các dòng trước origin
+ENCODED_COLUMNS = [column for column in FEATURE_COLUMNS if column in CATEGORICAL_COLUMNS]
+FOLDS = 3
+HORIZON = 28
+EARLY_STOPPING = 50
+METRIC = "rmse"
+_NS_PER_DAY = 86_400_000_000_000
+
+# lưới mặc định quanh tham số của notebook; learning rate của XGBoost lớn hơn 0.01 để CV đủ nhanh
+GRID: Dict[str, Dict[str, List[Any]]] = {
+    "lightgbm": {
+        "num_leaves": [31, 128],
+        "learning_rate": [0.05, 0.1],
+        "min_data_in_leaf": [50, 200],
+    },
+    "xgboost": {
+        "max_depth": [6, 8],
+        "learning_rate": [0.05, 0.1],
+        "min_child_weight": [5, 20],
+    },
+}
+# tham số quyết định cách lightgbm.Dataset chia bin: nằm trong khoá file nhị phân, không truyền lại lúc train
+DATASET_PARAMS = ("max_bin", "min_data_in_bin", "bin_construct_sample_cnt")
+# tên tham số sklearn -> tên của API xgboost.train
+XGB_NATIVE = {"random_state": "seed", "n_jobs": "nthread"}
+
+
+def feature_key(table: Path, partition_by: str = "none", partition: Optional[str] = None) -> str:
+    """Khoá của ma trận đặc trưng: bảng (đường dẫn, kích thước, mtime), mã features.py và danh sách cột."""
+    stat = table.stat()
+    payload = {
+        "version": CACHE_VERSION,
+        "table": [str(table.resolve()), stat.st_size, stat.st_mtime_ns],
+        "features_code": file_digest(Path(feature_module.__file__)),
+        "feature_columns": FEATURE_COLUMNS,
+        "partition": [partition_by, partition],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def build_matrix(
+    table: Path, directory: Path, partition_by: str = "none", partition: Optional[str] = None
+) -> Dict[str, Any]:
+    """Đặc trưng một lần, ghi features/categories/target/days .npy đã sắp theo ngày.
+
+    Cột phân loại của features.npy để NaN; mã của chúng (-1 = thiếu) nằm trong
+    categories.npy và được thay bằng target encoding của từng fold (`encode_rows`).
+    """
+    started = time.perf_counter()
+    filters = None if partition_by == "none" else [(partition_by, "==", partition)]
+    data = pd.read_parquet(table, filters=filters)
+    if data.empty:
+        raise ValueError(f"không có dòng nào cho {partition_by}={partition} trong {table}")
+    if any(column not in data.columns for column in HISTORY_FEATURES):
+        data = build_training_frame(data)
+    else:
+        data = data.dropna(subset=HISTORY_FEATURES).reset_index(drop=True)
+    dates = pd.to_datetime(data[DATE_COLUMN])
+    order = np.argsort(dates.to_numpy(dtype="datetime64[ns]"), kind="stable")
+    data = data.take(order).reset_index(drop=True)
+    days = np.floor_divide(dates.to_numpy(dtype="datetime64[ns]")[order].view("int64"), _NS_PER_DAY)
+    matrix = np.empty((len(data), len(FEATURE_COLUMNS)), dtype=np.float32)
+    categories = np.empty((len(data), len(ENCODED_COLUMNS)), dtype=np.int32)
+    vocabulary: Dict[str, int] = {}
+    for position, column in enumerate(FEATURE_COLUMNS):
+        if column in ENCODED_COLUMNS:
+            # cùng khoá chuỗi với features.encode_categoricals
+            codes, uniques = pd.factorize(data[column].astype("string"), use_na_sentinel=True)
+            categories[:, ENCODED_COLUMNS.index(column)] = codes
+            vocabulary[column] = len(uniques)
+            matrix[:, position] = np.nan
+        else:
+            matrix[:, position] = data[column].to_numpy(dtype=np.float32)
+    target = data[TARGET_COLUMN].to_numpy(dtype=np.float32)
+
+    # ghi vào thư mục tạm rồi đổi tên: lần chạy song song khác chỉ thấy cache hoàn chỉnh
+    directory.parent.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=f".{directory.name}-", dir=directory.parent))
+    meta = {
+        "rows": int(matrix.shape[0]),
+        "feature_columns": FEATURE_COLUMNS,
+        "encoded_columns": ENCODED_COLUMNS,
+        "categories": vocabulary,
+        "first_day": str(np.datetime64(int(days[0]), "D")),
+        "last_day": str(np.datetime64(int(days[-1]), "D")),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    try:
+        np.save(staging / "features.npy", matrix)
+        np.save(staging / "categories.npy", categories)
+        np.save(staging / "target.npy", target)
+        np.save(staging / "days.npy", days.astype(np.int32))
+        (staging / "meta.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+        try:
+            os.replace(staging, directory)
+        except OSError:
+            if not (directory / "meta.json").is_file():
+                raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    return meta
+
+
+def rolling_origins(days: np.ndarray, folds: int, horizon: int, step: int) -> List[Dict[str, Any]]:
+    """Các fold (train = mọi dòng trước origin, valid = `horizon` ngày từ origin) dưới dạng chỉ số dòng.
+
+    Target encoding của fold được fit trên đúng các dòng train: [ngày đầu, origin).
+    """
+    first = str(np.datetime64(int(days[0]), "D"))
+    end = int(days[-1]) + 1
+    splits = []
+    for fold in range(folds):
+        origin = end - horizon - (folds - 1 - fold) * step
+        lo = int(np.searchsorted(days, origin, side="left"))
+        hi = int(np.searchsorted(days, origin + horizon, side="left"))
+        if lo == 0 or hi == lo:
+            raise ValueError(
+                f"fold {fold}: origin {np.datetime64(origin, 'D')} không để lại dòng train/valid; giảm --folds/--step"
+            )
+        splits.append(
+            {
+                "fold": fold,
+                "origin": str(np.datetime64(origin, "D")),
+                "horizon": horizon,
+                "encoding_fit": [first, str(np.datetime64(origin, "D"))],
+                "train_rows": lo,
+                "valid_end": hi,
+            }
+        )
+    return splits
+
+
+def _fold_file(directory: Path, split: Dict[str, Any], part: str, suffix: str = ".bin") -> Path:
+    # tên theo origin + horizon + khoảng fit encoding (không theo số thứ tự fold): đổi --folds/--step
+    # hay phạm vi dữ liệu không đọc nhầm file cũ
+    fit_from, fit_to = split["encoding_fit"]
+    return directory / f"{split['origin']}-{split['horizon']}d-te{fit_from}_{fit_to}-{part}{suffix}"
+
+
+def fit_encoding(matrix_dir: Path, split: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """Target encoding của fold từ các dòng trước origin, cache cạnh file fold.
+
+    Cùng làm mượt với mapping đã publish (features.smoothed_target_mean, prior =
+    trung bình target của các dòng train). Mã không có dòng train nào và giá trị
+    thiếu nhận trung bình các giá trị đã mã hóa, như features._fallback_value.
+    """
+    path = _fold_file(matrix_dir, split, "encoding", ".npz")
+    if path.is_file():
+        with np.load(path) as cached:
+            return {column: cached[column] for column in cached.files}
+    meta = json.loads((matrix_dir / "meta.json").read_text(encoding="utf-8"))
+    lo = split["train_rows"]
+    categories = np.load(matrix_dir / "categories.npy", mmap_mode="r")[:lo]
+    target = np.asarray(np.load(matrix_dir / "target.npy", mmap_mode="r")[:lo], dtype=np.float64)
+    prior = float(target.mean()) if lo else np.nan
+    encoding: Dict[str, np.ndarray] = {}
+    for index, column in enumerate(ENCODED_COLUMNS):
+        codes = np.asarray(categories[:, index])
+        known = codes >= 0
+        size = meta["categories"][column]
+        counts = np.bincount(codes[known], minlength=size)
+        sums = np.bincount(codes[known], weights=target[known], minlength=size)
+        seen = counts > 0
+        means = np.full(size + 1, np.nan)
+        means[:size][seen] = smoothed_target_mean(counts[seen], sums[seen], prior)
+        means[~np.isfinite(means)] = means[:size][seen].mean() if seen.any() else np.nan
+        encoding[column] = means.astype(np.float32)  # phần tử cuối: mã -1 (thiếu)
+    tmp = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npz")
+    np.savez(tmp, **encoding)
+    os.replace(tmp, path)
+    return encoding
+
+
+def encode_rows(matrix_dir: Path, encoding: Dict[str, np.ndarray], lo: int, hi: int) -> np.ndarray:
+    """Các dòng [lo, hi) của ma trận với cột phân loại thay bằng target encoding của fold."""
+    rows = np.array(np.load(matrix_dir / "features.npy", mmap_mode="r")[lo:hi])
+    categories = np.load(matrix_dir / "categories.npy", mmap_mode="r")[lo:hi]
+    for index, column in enumerate(ENCODED_COLUMNS):
+        rows[:, FEATURE_COLUMNS.index(column)] = encoding[column][categories[:, index]]
+    return rows
+
+
+def _dataset_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    # feature_pre_filter=False: cùng một file nhị phân dùng được cho mọi giá trị min_data_in_leaf của lưới
+    return {
+        **{name: params[name] for name in DATASET_PARAMS if name in params},
+        "feature_pre_filter": False,
+        "verbose": -1,
+    }
+
+
+def build_datasets(
+    variant: str, matrix_dir: Path, splits: List[Dict[str, Any]], params: Dict[str, Any]
+) -> Tuple[Path, bool]:
+    """Ghi file Dataset/DMatrix nhị phân cho từng fold (bỏ qua file đã có); trả về thư mục và cờ cache hit."""
+    if variant == "lightgbm":
+        dataset_params = _dataset_params(params)
+        tag = hashlib.sha256(json.dumps(dataset_params, sort_keys=True).encode("utf-8")).hexdigest()[:8]
+        directory = matrix_dir / f"lightgbm-{tag}"
+    else:
+        directory = matrix_dir / "xgboost"
+    directory.mkdir(parents=True, exist_ok=True)
+    missing = [
+        split
+        for split in splits
+        if not all(_fold_file(directory, split, part).is_file() for part in ("train", "valid"))
+    ]
+    if not missing:
+        return directory, True
+    target = np.load(matrix_dir / "target.npy", mmap_mode="r")
+    for split in missing:
+        lo, hi = split["train_rows"], split["valid_end"]
+        encoding = fit_encoding(matrix_dir, split)
+        train_rows, valid_rows = encode_rows(matrix_dir, encoding, 0, lo), encode_rows(matrix_dir, encoding, lo, hi)
+        paths = {part: _fold_file(directory, split, part) for part in ("train", "valid")}
+        tmp = {part: path.with_name(f"{path.name}.{os.getpid()}.tmp") for part, path in paths.items()}
+        if variant == "lightgbm":
+            import lightgbm as lgb
+
+            train = lgb.Dataset(train_rows, target[:lo], params=dataset_params, free_raw_data=True)
+            train.save_binary(str(tmp["train"]))
+            # valid dùng bin của tập train (reference) như khi lgb.train tự dựng
+            lgb.Dataset(valid_rows, target[lo:hi], params=dataset_params, reference=train).save_binary(str(tmp["valid"]))
+        else:
+            import xgboost as xgb
+
+            xgb.DMatrix(train_rows, label=target[:lo]).save_binary(str(tmp["train"]))
+            xgb.DMatrix(valid_rows, label=target[lo:hi]).save_binary(str(tmp["valid"]))
+        for part in ("train", "valid"):
+            os.replace(tmp[part], paths[part])
+    return directory, False
+
+
+def candidates(variant: str, grid: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """Tích Descartes của lưới, mỗi ứng viên = tham số notebook ghi đè bởi một tổ hợp."""
+    names = sorted(grid)
+    return [
+        {**PARAMS[variant], **dict(zip(names, values))}
+        for values in itertools.product(*(grid[name] for name in names))
+    ]
+
+
+def _run_fold(
+    variant: str,
+    candidate: int,
+    params: Dict[str, Any],
+    dataset_dir: str,
+    matrix_dir: str,
+    split: Dict[str, Any],
+    max_rounds: int,
+    early_stopping: int,
+    threads: int,
+) -> Dict[str, Any]:
+    """Chạy trong process con: nạp file nhị phân của fold, train có early stopping, chấm trên tập valid."""
+    started = time.perf_counter()
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    cpu_started = usage.ru_utime + usage.ru_stime
+    fold = split["fold"]
+    train_path = str(_fold_file(Path(dataset_dir), split, "train"))
+    valid_path = str(_fold_file(Path(dataset_dir), split, "valid"))
+    target = np.load(os.path.join(matrix_dir, "target.npy"), mmap_mode="r")[split["train_rows"] : split["valid_end"]]
+    if variant == "lightgbm":
+        import lightgbm as lgb
+
+        booster_params = {
+            key: value
+            for key, value in params.items()
+            if key not in DATASET_PARAMS and key not in ("n_estimators", "n_jobs")
+        }
+        booster_params.update(metric=METRIC, num_threads=threads)
+        # cùng bộ tham số cho cả hai tập: lgb.train gộp booster_params vào tập train trước khi dựng tập valid
+        dataset_params = {**booster_params, **_dataset_params(params)}
+        train = lgb.Dataset(train_path, params=dataset_params)
+        valid = lgb.Dataset(valid_path, params=dataset_params, reference=train)
+        booster = lgb.train(
+            booster_params,
+            train,
+            num_boost_round=max_rounds,
+            valid_sets=[valid],
+            callbacks=[lgb.early_stopping(early_stopping, verbose=False)],
+        )
+        best_iteration = booster.best_iteration or booster.current_iteration()
+        # Dataset nhị phân không giữ giá trị gốc: dự đoán trên các dòng valid mã hóa bằng encoding của fold
+        rows = encode_rows(
+            Path(matrix_dir), fit_encoding(Path(matrix_dir), split), split["train_rows"], split["valid_end"]
+        )
+        prediction = booster.predict(rows, num_iteration=best_iteration, num_threads=threads)
+    else:
+        import xgboost as xgb
+
+        booster_params = {
+            XGB_NATIVE.get(key, key): value for key, value in params.items() if key != "n_estimators"
+        }
+        booster_params.update(eval_metric=METRIC, nthread=threads)
+        train = xgb.DMatrix(train_path)
+        valid = xgb.DMatrix(valid_path)
+        booster = xgb.train(
+            booster_params,
+            train,
+            num_boost_round=max_rounds,
+            evals=[(valid, "valid")],
+            early_stopping_rounds=early_stopping,
+            verbose_eval=False,
+        )
+        best_iteration = booster.best_iteration + 1
+        prediction = booster.predict(valid, iteration_range=(0, best_iteration))
+    error = prediction - target
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return {
+        "candidate": candidate,
+        "fold": fold,
+        "best_iteration": int(best_iteration),
+        "mae": float(np.abs(error).mean()),
+        "rmse": float(np.sqrt(np.mean(error**2))),
+        "seconds": time.perf_counter() - started,
+        "cpu_seconds": usage.ru_utime + usage.ru_stime - cpu_started,
+    }
+
+
+def tune(
+    table: Path,
+    variant: str,
+    cache_dir: Path = CACHE_DIR,
+    grid: Optional[Dict[str, List[Any]]] = None,
+    folds: int = FOLDS,
+    horizon: int = HORIZON,
+    step: Optional[int] = None,
+    early_stopping: int = EARLY_STOPPING,
+    max_rounds: Optional[int] = None,
+    workers: Optional[int] = None,
+    partition_by: str = "none",
+    partition: Optional[str] = None,
+    refresh: bool = False,
+) -> Dict[str, Any]:
+    started = time.perf_counter()
+    cores = os.cpu_count() or 1
+    key = feature_key(table, partition_by, partition)
+    matrix_dir = cache_dir / key
+    if refresh:
+        shutil.rmtree(matrix_dir, ignore_errors=True)
+    matrix_hit = (matrix_dir / "meta.json").is_file()
+    if matrix_hit:
+        meta = json.loads((matrix_dir / "meta.json").read_text(encoding="utf-8"))
+    else:
+        meta = build_matrix(table, matrix_dir, partition_by, partition)
+    matrix_seconds = time.perf_counter() - started
+
+    splits = rolling_origins(np.load(matrix_dir / "days.npy", mmap_mode="r"), folds, horizon, step or horizon)
+    grid = GRID[variant] if grid is None else grid
+    pool_params = candidates(variant, grid)
+    dataset_dirs: Dict[int, Path] = {}
+    dataset_hits: List[bool] = []
+    dataset_started = time.perf_counter()
+    for index, params in enumerate(pool_params):
+        directory, hit = build_datasets(variant, matrix_dir, splits, params)
+        dataset_dirs[index] = directory
+        dataset_hits.append(hit)
+    dataset_seconds = time.perf_counter() - dataset_started
+
+    tasks = [(index, split) for index in range(len(pool_params)) for split in splits]
+    workers = max(1, min(workers or cores, len(tasks)))
+    threads = max(1, cores // workers)
+    results: List[Dict[str, Any]] = []
+    # process con (spawn) kế thừa biến môi trường: OpenMP của LightGBM/XGBoost không vượt số core
+    previous = {name: os.environ.get(name) for name in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS")}
+    os.environ.update({name: str(threads) for name in previous})
+    try:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            futures = [
+                pool.submit(
+                    _run_fold,
+                    variant,
+                    index,
+                    pool_params[index],
+                    str(dataset_dirs[index]),
+                    str(matrix_dir),
+                    split,
+                    max_rounds or int(pool_params[index]["n_estimators"]),
+                    early_stopping,
+                    threads,
+                )
+                # fold có tập train lớn nhất chạy trước để các worker kết thúc gần nhau
+                for index, split in sorted(tasks, key=lambda task: -task[1]["train_rows"])
+            ]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                print(
+                    f"  • ứng viên {result['candidate']:>3} fold {result['fold']} | vòng {result['best_iteration']:>5} | "
+                    f"RMSE {result['rmse']:.4f} MAE {result['mae']:.4f} | {result['seconds']:6.1f}s"
+                )
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+    ranking = []
+    for index, params in enumerate(pool_params):
+        scores = sorted((item for item in results if item["candidate"] == index), key=lambda item: item["fold"])
+        ranking.append(
+            {
+                "candidate": index,
+                "overrides": {name: params[name] for name in sorted(grid)},
+                "rmse": float(np.mean([item["rmse"] for item in scores])),
+                "mae": float(np.mean([item["mae"] for item in scores])),
+                "best_iteration": int(round(np.mean([item["best_iteration"] for item in scores]))),
+                "folds": [{key: item[key] for key in ("fold", "best_iteration", "rmse", "mae")} for item in scores],
+            }
+        )
+    ranking.sort(key=lambda item: item["rmse"])
+    best = ranking[0]
+    # mô hình cuối được train trên toàn bộ dữ liệu với số vòng trung bình mà early stopping tìm được
+    best_params = {**pool_params[best["candidate"]], "n_estimators": best["best_iteration"]}
+
+    wall = time.perf_counter() - started
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = children.ru_utime + children.ru_stime
+    return {
+        "variant": variant,
+        "table": str(table),
+        "partition": {"by": partition_by, "value": partition},
+        "cache": {
+            "key": key,
+            "path": str(matrix_dir),
+            "matrix_hit": matrix_hit,
+            "dataset_hit": all(dataset_hits),
+        },
+        "rows": meta["rows"],
+        "folds": splits,
+        "horizon": horizon,
+        "early_stopping": early_stopping,
+        "metric": METRIC,
+        "ranking": ranking,
+        "best_params": best_params,
+        "workers": workers,
+        "threads_per_worker": threads,
+        "matrix_seconds": matrix_seconds,
+        "dataset_seconds": dataset_seconds,
+        "seconds": wall,
+        "cpu_seconds": cpu,
+        "core_utilisation": cpu / (wall * cores) if wall else 0.0,
+        "cores": cores,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--table", type=Path, default=MODEL_TABLE, help="model table parquet")
+    parser.add_argument("--variant", choices=sorted(PARAMS), default="lightgbm")
+    parser.add_argument("--cache-dir", type=Path, default=CACHE_DIR)
+    parser.add_argument("--grid", help='JSON object of parameter lists, e.g. \'{"num_leaves": [63, 255]}\'')
+    parser.add_argument("--folds", type=int, default=FOLDS)
+    parser.add_argument("--horizon", type=int, default=HORIZON, help="validation days per fold")
+    parser.add_argument("--step", type=int, help="days between origins (default: --horizon)")
+    parser.add_argument("--early-stopping", type=int, default=EARLY_STOPPING)
+    parser.add_argument("--max-rounds", type=int, help="default: n_estimators of the notebook parameters")
+    parser.add_argument("--workers", type=int, help="default: one per core")
+    parser.add_argument("--partition-by", choices=("store_id", "dept_id", "none"), default="none")
+    parser.add_argument("--partition", help="tune on this store/dept only (with --partition-by)")
+    parser.add_argument("--refresh", action="store_true", help="rebuild the cached matrix and binaries")
+    parser.add_argument("--output", type=Path, help="write the report (JSON) to this file")
+    args = parser.parse_args()
+    if (args.partition_by == "none") != (args.partition is None):
+        parser.error("--partition-by và --partition phải dùng cùng nhau")
+
+    report = tune(
+        args.table,
+        args.variant,
+        args.cache_dir,
+        json.loads(args.grid) if args.grid else None,
+        args.folds,
+        args.horizon,
+        args.step,
+        args.early_stopping,
+        args.max_rounds,
+        args.workers,
+        args.partition_by,
+        args.partition,
+        args.refresh,
+    )
+    cache = report["cache"]
+    print(
+        f"\nMa trận {report['rows']:,} dòng ({'cache' if cache['matrix_hit'] else 'dựng mới'} "
+        f"{report['matrix_seconds']:.1f}s), file nhị phân ({'cache' if cache['dataset_hit'] else 'dựng mới'} "
+        f"{report['dataset_seconds']:.1f}s) tại {cache['path']}"
+    )
+    for item in report["ranking"]:
+        print(
+            f"  ứng viên {item['candidate']:>3} RMSE {item['rmse']:.4f} MAE {item['mae']:.4f} "
+            f"vòng {item['best_iteration']:>5} {json.dumps(item['overrides'])}"
+        )
+    print(
+        f"{len(report['ranking'])} ứng viên × {len(report['folds'])} fold trong {report['seconds']:.1f}s với "
+        f"{report['workers']} worker × {report['threads_per_worker']} luồng; CPU {report['cpu_seconds']:.1f}s "
+        f"trên {report['cores']} core: sử dụng {report['core_utilisation']:.0%}"
+    )
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2, default=str), encoding="utf-8")
+        print(f"Tham số tốt nhất ghi trong {args.output} (best_params): NoteBook/Train_model.py --params {args.output}")
+
+
+if __name__ == "__main__":
+    main()
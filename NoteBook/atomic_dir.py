@@ -0,0 +1,32 @@
+"""Write a whole output directory beside its target, then swap it in."""
+from __future__ import annotations
+
+import os
+import shutil
+from pathlib import Path
+
+
+def staging_dir(output_dir: Path) -> Path:
+    """Thư mục tạm cạnh `output_dir` (cùng ổ đĩa để os.replace là đổi tên), đã dọn bản sót của lần chạy trước."""
+    tmp_dir = output_dir.with_name(f"{output_dir.name}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    return tmp_dir
+
+
+def replace_dir(tmp_dir: Path, output_dir: Path) -> None:
+    """Thay `output_dir` (thư mục hoặc file) bằng `tmp_dir` đã ghi xong rồi xóa bản cũ.
+
+    Người đọc chỉ thấy bản cũ hoặc bản mới đầy đủ, không bao giờ thấy phân vùng
+    của hai lần chạy lẫn nhau.
+    """
+    output_dir.parent.mkdir(parents=True, exist_ok=True)
+    if not output_dir.exists():
+        os.replace(tmp_dir, output_dir)
+        return
+    old_dir = output_dir.with_name(f"{output_dir.name}.{os.getpid()}.old")
+    os.replace(output_dir, old_dir)
+    os.replace(tmp_dir, output_dir)
+    if old_dir.is_dir():
+        shutil.rmtree(old_dir)
+    else:
+        old_dir.unlink()
@@ -1,30 +1,186 @@
 from __future__ import annotations
 
 """Lightweight HTTP client for the forecasting API."""
-from typing import Any, Dict, Optional
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Iterator, Mapping, Optional, Sequence, Tuple
 
+import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from helpers import dataframe_to_records
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow là tùy chọn, thiếu thì quay về JSON
+    pa = None
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+
+def _arrow_to_frame(content: bytes) -> pd.DataFrame:
+    """Đọc body Arrow IPC stream thành dataframe."""
+    table = pa.ipc.open_stream(pa.py_buffer(content)).read_all()
+    return table.to_pandas(split_blocks=True)
+
+
+def _frame_to_arrow(df: pd.DataFrame) -> bytes:
+    """Tuần tự hóa dataframe thành Arrow IPC stream."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+class ResponseCache:
+    """Cache LRU giới hạn số mục, mỗi mục có TTL và ETag để xác thực lại khi hết hạn."""
+
+    def __init__(self, max_entries: int = 128, ttl_seconds: float = 30.0) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = max(0.0, float(ttl_seconds))
+        self._entries: "OrderedDict[Hashable, Tuple[Any, Optional[str], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Tuple[Optional[Any], Optional[str], bool]:
+        """Trả về (giá trị, etag, còn hạn); (None, None, False) nếu chưa có."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, None, False
+            self._entries.move_to_end(key)
+            value, etag, stored_at = entry
+            return value, etag, time.monotonic() - stored_at < self.ttl
+
+    def put(self, key: Hashable, value: Any, etag: Optional[str]) -> None:
+        with self._lock:
+            self._entries[key] = (value, etag, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
 
 
 class ApiClient:
-    def __init__(self, base_url: str, timeout: float = 10.0) -> None:
+    """Client dùng chung một Session keep-alive, retry có backoff và cache TTL + ETag."""
+
+    def __init__(
+        self,
+        base_url: str,
+        timeout: float = 10.0,
+        *,
+        retries: int = 3,
+        backoff: float = 0.3,
+        pool_size: int = 8,
+        cache_ttl: float = 30.0,
+        cache_max_entries: int = 128,
+    ) -> None:
         self.base_url = base_url.rstrip("/")
         self.timeout = timeout
+        self._binary: Optional[bool] = None
+        self.session = requests.Session()
+        # GET được retry khi lỗi mạng/502/503/504; POST chỉ retry khi chưa kết nối được
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"GET", "HEAD"}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.cache = ResponseCache(cache_max_entries, cache_ttl)
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="api")
 
-    def _request(self, method: str, path: str, **kwargs: Any) -> Dict[str, Any]:
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+    def _send(self, method: str, path: str, **kwargs: Any) -> requests.Response:
         url = f"{self.base_url}{path}"
-        response = requests.request(method=method, url=url, timeout=self.timeout, **kwargs)
+        response = self.session.request(
+            method=method.upper(), url=url, timeout=self.timeout, **kwargs
+        )
         response.raise_for_status()
-        return response.json()
+        return response
+
+    def _request(self, method: str, path: str, **kwargs: Any) -> Dict[str, Any]:
+        return self._send(method, path, **kwargs).json()
+
+    def _cached_get(
+        self,
+        path: str,
+        parse: Callable[[requests.Response], Any],
+        params: Optional[Mapping[str, Any]] = None,
+        headers: Optional[Mapping[str, str]] = None,
+    ) -> Any:
+        """GET có cache: trả ngay khi còn hạn, hết hạn thì gửi If-None-Match và dùng lại nếu 304."""
+        params = dict(params or {})
+        headers = dict(headers or {})
+        key = (path, tuple(sorted(params.items())), headers.get("Accept"))
+        value, etag, fresh = self.cache.get(key)
+        if fresh:
+            return value
+        if etag is not None:
+            headers["If-None-Match"] = etag
+        response = self._send("get", path, params=params, headers=headers)
+        if response.status_code == 304 and etag is not None:
+            self.cache.put(key, value, etag)
+            return value
+        value = parse(response)
+        self.cache.put(key, value, response.headers.get("ETag"))
+        return value
+
+    def fetch_many(
+        self, calls: Mapping[str, Tuple[str, Dict[str, Any]]], return_exceptions: bool = False
+    ) -> Dict[str, Any]:
+        """Gọi song song nhiều phương thức độc lập: {tên: (phương thức, kwargs)} -> {tên: kết quả}.
+
+        Thời gian chờ bằng lời gọi chậm nhất thay vì tổng các lời gọi. Với
+        `return_exceptions`, lỗi của từng lời gọi được trả về thay cho kết quả
+        của nó thay vì làm hỏng cả nhóm.
+        """
+        futures = {
+            name: self._executor.submit(getattr(self, method), **kwargs)
+            for name, (method, kwargs) in calls.items()
+        }
+        if not return_exceptions:
+            return {name: future.result() for name, future in futures.items()}
+        return {name: future.exception() or future.result() for name, future in futures.items()}
+
+    def supports_binary(self) -> bool:
+        """Kiểm tra (một lần) server có nhận/trả Arrow IPC hay không."""
+        if self._binary is None:
+            if pa is None:
+                self._binary = False
+            else:
+                try:
+                    formats = self.root().get("formats", [])
+                except requests.RequestException:
+                    return False
+                self._binary = ARROW_STREAM_MEDIA_TYPE in formats
+        return self._binary
 
     def root(self) -> Dict[str, Any]:
-        return self._request("get", "/")
+        return self._cached_get("/", requests.Response.json)
 
     def health(self) -> Dict[str, Any]:
         return self._request("get", "/health")
 
     def summary(self) -> Dict[str, Any]:
-        return self._request("get", "/data/summary")
+        return self._cached_get("/data/summary", requests.Response.json)
 
     def sample(
         self,
@@ -38,7 +194,114 @@ class ApiClient:
             params["start_date"] = start_date
         if end_date:
             params["end_date"] = end_date
-        return self._request("get", "/data/sample", params=params)
+        return self._cached_get("/data/sample", requests.Response.json, params=params)
+
+    def sample_frame(
+        self,
+        *,
+        limit: int = 100,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+    ) -> pd.DataFrame:
+        """Lấy mẫu dữ liệu dưới dạng dataframe, ưu tiên Arrow IPC."""
+        if not self.supports_binary():
+            sample = self.sample(limit=limit, start_date=start_date, end_date=end_date)
+            return pd.DataFrame(sample.get("data", []))
+        params = {"limit": limit}
+        if start_date:
+            params["start_date"] = start_date
+        if end_date:
+            params["end_date"] = end_date
+        return self._cached_get(
+            "/data/sample",
+            lambda response: _arrow_to_frame(response.content),
+            params=params,
+            headers={"Accept": ARROW_STREAM_MEDIA_TYPE},
+        )
+
+    def rows_page(
+        self,
+        *,
+        page_size: int = 1000,
+        cursor: Optional[str] = None,
+        columns: Optional[Sequence[str]] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Một trang của /data/rows: {"rows", "columns", "data", "next_cursor"}."""
+        params: Dict[str, Any] = {"page_size": page_size}
+        if cursor:
+            params["cursor"] = cursor
+        if columns:
+            params["columns"] = ",".join(columns)
+        if start_date:
+            params["start_date"] = start_date
+        if end_date:
+            params["end_date"] = end_date
+        return self._cached_get("/data/rows", requests.Response.json, params=params)
+
+    def iter_rows(self, **kwargs: Any) -> Iterator[pd.DataFrame]:
+        """Duyệt toàn bộ khoảng ngày theo từng trang, dừng khi server không trả cursor."""
+        cursor = None
+        while True:
+            page = self.rows_page(cursor=cursor, **kwargs)
+            yield pd.DataFrame(page.get("data", []), columns=page.get("columns"))
+            cursor = page.get("next_cursor")
+            if not cursor:
+                return
+
+    def series(
+        self,
+        *,
+        value: str = "units_sold",
+        agg: str = "sum",
+        by: Optional[str] = None,
+        points: int = 500,
+        method: str = "lttb",
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        **filters: Optional[str],
+    ) -> Dict[str, Any]:
+        """Chuỗi thời gian đã gộp theo ngày và giảm mẫu ở server (/data/series)."""
+        params: Dict[str, Any] = {"value": value, "agg": agg, "points": points, "method": method}
+        if by:
+            params["by"] = by
+        if start_date:
+            params["start_date"] = start_date
+        if end_date:
+            params["end_date"] = end_date
+        params.update({name: item for name, item in filters.items() if item})
+        return self._cached_get("/data/series", requests.Response.json, params=params)
+
+    def rollup(self, name: str, **params: Any) -> Dict[str, Any]:
+        """Tổng hợp đã materialize ở server (/rollups/<name>), lọc theo ngày/store/dept/cat."""
+        params = {key: value for key, value in params.items() if value is not None}
+        return self._cached_get(f"/rollups/{name}", requests.Response.json, params=params)
 
     def predict(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         return self._request("post", "/predict", json=payload)
+
+    def predict_frame(self, df: pd.DataFrame) -> Dict[str, Any]:
+        """Dự đoán trên dataframe, gửi/nhận Arrow IPC khi server hỗ trợ."""
+        if self.supports_binary():
+            try:
+                body = _frame_to_arrow(df)
+            except (pa.ArrowException, TypeError, ValueError):
+                body = None  # cột hỗn hợp kiểu không chuyển được sang Arrow
+            if body is not None:
+                response = self._send(
+                    "post",
+                    "/predict",
+                    data=body,
+                    headers={
+                        "Content-Type": ARROW_STREAM_MEDIA_TYPE,
+                        "Accept": ARROW_STREAM_MEDIA_TYPE,
+                    },
+                )
+                predictions = _arrow_to_frame(response.content)["prediction"]
+                return {
+                    "rows": int(response.headers.get("X-Rows", len(predictions))),
+                    "model": response.headers.get("X-Model", "?"),
+                    "predictions": predictions.tolist(),
+                }
+        return self.predict({"records": dataframe_to_records(df)})
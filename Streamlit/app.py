@@ -1,23 +1,26 @@
 from __future__ import annotations
 
 import pandas as pd
+import requests
 import streamlit as st
 
 import config
 from api_client import ApiClient
-from helpers import coerce_date, dataframe_to_records
-from service import _prepare_template_df, _fetch_api_data, _merge_predictions, _init_session_state
+from helpers import coerce_date
+from service import _prepare_template_df, _fetch_api_data, _fetch_many, _merge_predictions, _init_session_state
 from components import _render_connection_settings, _render_sampling_controls, _display_prediction_result
 
 
 # --- PAGE RENDERERS ---
 def _render_overview(client: ApiClient) -> None:
     st.subheader("Tổng quan API")
-    try:
-        root_info = _fetch_api_data("root", client.base_url, client.timeout)
-        summary = _fetch_api_data("summary", client.base_url, client.timeout)
-    except Exception as exc:
-        st.error(f"Không tải được thông tin: {exc}")
+    # rollup đi cùng nhóm: trang chỉ chờ lời gọi chậm nhất
+    results = _fetch_many(client.base_url, client.timeout, return_exceptions=True,
+                          root=("root", {}), summary=("summary", {}), stores=("rollup", {"name": "store"}))
+    root_info, summary, stores = results["root"], results["summary"], results["stores"]
+    failed = next((exc for exc in (root_info, summary) if isinstance(exc, Exception)), None)
+    if failed is not None:
+        st.error(f"Không tải được thông tin: {failed}")
         return
 
     # Metrics
@@ -26,6 +29,17 @@ def _render_overview(client: ApiClient) -> None:
     c2.metric("Số cột", len(summary.get("columns", [])))
     c3.metric("Số dòng", summary.get("rows", 0))
 
+    if isinstance(stores, requests.HTTPError) and stores.response is not None and stores.response.status_code == 404:
+        st.info("Server chưa có bảng tổng hợp (chạy NoteBook/Agg_table.py) nên chưa có doanh số theo cửa hàng.")
+    elif isinstance(stores, Exception):
+        st.error(f"Không tải được doanh số theo cửa hàng: {stores}")
+    else:
+        try:
+            st.markdown("**Doanh số theo cửa hàng**")
+            st.dataframe(pd.DataFrame(stores.get("data", [])), use_container_width=True)
+        except Exception as exc:
+            st.error(f"Không hiển thị được doanh số theo cửa hàng: {exc}")
+
     st.markdown("**Feature columns**")
     st.code(", ".join(summary.get("feature_columns", [])) or "(trống)")
 
@@ -39,9 +53,8 @@ def _render_quick_predict(client: ApiClient) -> None:
 
     # 1. Fetch Sample
     try:
-        sample = _fetch_api_data("sample", client.base_url, client.timeout,
-                                limit=limit, start_date=start_date, end_date=end_date)
-        sample_df = pd.DataFrame(sample.get("data", []))
+        sample_df = _fetch_api_data("sample_frame", client.base_url, client.timeout,
+                                    limit=limit, start_date=start_date, end_date=end_date)
         st.caption(f"Hiển thị {len(sample_df)} dòng mẫu")
         st.dataframe(sample_df, use_container_width=True)
     except Exception as exc:
@@ -65,8 +78,10 @@ def _render_custom_predict(client: ApiClient) -> None:
 
     # 1. Prepare Schema
     try:
-        summary = _fetch_api_data("summary", client.base_url, client.timeout)
-        seed = _fetch_api_data("sample", client.base_url, client.timeout, limit=5, start_date=None, end_date=None)
+        results = _fetch_many(client.base_url, client.timeout,
+                              summary=("summary", {}),
+                              seed=("sample", {"limit": 5, "start_date": None, "end_date": None}))
+        summary, seed = results["summary"], results["seed"]
 
         feature_cols = summary.get("feature_columns", [])
         input_df = _prepare_template_df(feature_cols, seed)
@@ -79,13 +94,12 @@ def _render_custom_predict(client: ApiClient) -> None:
 
     # 3. Run Prediction
     if st.button("Dự đoán dữ liệu nhập"):
-        records = dataframe_to_records(editor_df)
-        if not records:
+        if editor_df is None or editor_df.empty:
             st.warning("Vui lòng nhập dữ liệu")
             return
 
         try:
-            result = client.predict({"records": records})
+            result = client.predict_frame(editor_df)
             preds = result.get("predictions", [])
 
             merged_df = _merge_predictions(editor_df, preds)
@@ -93,6 +107,50 @@ def _render_custom_predict(client: ApiClient) -> None:
         except Exception as exc:
             st.error(f"Lỗi dự đoán: {exc}")
 
+def _render_series_chart(client: ApiClient) -> None:
+    st.subheader("Biểu đồ chuỗi thời gian")
+    st.caption("Server gộp theo ngày và giảm mẫu (LTTB/trung bình) nên cả khoảng ngày dài chỉ tốn vài KB")
+
+    c1, c2, c3, c4 = st.columns(4)
+    value = c1.selectbox("Giá trị", ("units_sold", "price"))
+    agg = c2.selectbox("Gộp theo ngày", ("sum", "mean", "max", "min"))
+    by = c3.selectbox("Tách chuỗi theo", ("(không)", "store_id", "cat_id", "dept_id"))
+    method = c4.selectbox("Giảm mẫu", ("lttb", "mean", "none"))
+
+    c5, c6, c7, c8 = st.columns(4)
+    store_id = c5.text_input("store_id", "")
+    item_id = c6.text_input("item_id", "")
+    start_date = coerce_date(c7.date_input("Từ ngày", value=None, key="series_start"))
+    end_date = coerce_date(c8.date_input("Đến ngày", value=None, key="series_end"))
+    points = st.slider("Số điểm tối đa mỗi chuỗi", 50, 2000, 500, 50)
+
+    try:
+        result = _fetch_api_data(
+            "series", client.base_url, client.timeout,
+            value=value, agg=agg, by=None if by == "(không)" else by, points=points, method=method,
+            start_date=start_date, end_date=end_date,
+            store_id=store_id.strip() or None, item_id=item_id.strip() or None,
+        )
+    except Exception as exc:
+        st.error(f"Lỗi tải chuỗi: {exc}")
+        return
+
+    series = result.get("series", [])
+    if not series or not any(item["points"] for item in series):
+        st.info("Không có dữ liệu cho bộ lọc này")
+        return
+    chart_df = pd.concat(
+        [
+            pd.Series(item["y"], index=pd.to_datetime(item["x"]), name=item["key"] or value)
+            for item in series
+        ],
+        axis=1,
+    )
+    st.line_chart(chart_df)
+    shown = sum(item["points"] for item in series)
+    source = sum(item["source_points"] for item in series)
+    st.caption(f"{len(series)} chuỗi · {shown} / {source} điểm")
+
 # --- MAIN APP FLOW ---
 def main() -> None:
     _init_session_state()
@@ -100,13 +158,17 @@ def main() -> None:
     # Sidebar Setup
     client = _render_connection_settings()
     st.sidebar.markdown("---")
-    page = st.sidebar.radio("Chức năng", ("Tổng quan", "Mẫu & dự đoán nhanh", "Tự nhập dữ liệu"))
+    page = st.sidebar.radio(
+        "Chức năng", ("Tổng quan", "Mẫu & dự đoán nhanh", "Tự nhập dữ liệu", "Biểu đồ chuỗi")
+    )
 
     # Page Routing
     if page == "Tổng quan":
         _render_overview(client)
     elif page == "Mẫu & dự đoán nhanh":
         _render_quick_predict(client)
+    elif page == "Biểu đồ chuỗi":
+        _render_series_chart(client)
     else:
         _render_custom_predict(client)
 
@@ -1,6 +1,7 @@
 import streamlit as st
 import config
 from api_client import ApiClient
+from service import get_client
 from helpers import coerce_date
 import pandas as pd
 
@@ -17,7 +18,7 @@ def _render_connection_settings() -> ApiClient:
     st.session_state["base_url"] = base_url
     st.session_state["timeout"] = float(timeout)
 
-    client = ApiClient(base_url, float(timeout))
+    client = get_client(base_url, float(timeout))
 
     if st.sidebar.button("Kiểm tra kết nối"):
         try:
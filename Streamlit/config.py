@@ -6,3 +6,10 @@ import os
 DEFAULT_API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8080")
 REQUEST_TIMEOUT = float(os.getenv("API_TIMEOUT", "10"))
 MAX_SAMPLE_ROWS = 500
+
+# HTTP client: keep-alive pool, retry có backoff và cache phản hồi GET
+HTTP_POOL_SIZE = int(os.getenv("API_POOL_SIZE", "8"))
+HTTP_RETRIES = int(os.getenv("API_RETRIES", "3"))
+HTTP_BACKOFF = float(os.getenv("API_BACKOFF", "0.3"))
+CACHE_TTL_SECONDS = float(os.getenv("API_CACHE_TTL", "30"))
+CACHE_MAX_ENTRIES = int(os.getenv("API_CACHE_MAX_ENTRIES", "128"))
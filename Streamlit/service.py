@@ -15,14 +15,32 @@ def _init_session_state() -> None:
     st.session_state.setdefault("timeout", config.REQUEST_TIMEOUT)
 
 
-@st.cache_data(show_spinner=False)
+@st.cache_resource(show_spinner=False)
+def get_client(base_url: str, timeout: float) -> ApiClient:
+    """Một ApiClient dùng chung cho mọi phiên/rerun: giữ kết nối keep-alive và cache phản hồi."""
+    return ApiClient(
+        base_url,
+        timeout,
+        retries=config.HTTP_RETRIES,
+        backoff=config.HTTP_BACKOFF,
+        pool_size=config.HTTP_POOL_SIZE,
+        cache_ttl=config.CACHE_TTL_SECONDS,
+        cache_max_entries=config.CACHE_MAX_ENTRIES,
+    )
+
+
 def _fetch_api_data(method_name: str, base_url: str, timeout: float, **kwargs) -> dict:
-    """Hàm wrapper chung để gọi các phương thức GET của API."""
-    client = ApiClient(base_url, timeout)
+    """Hàm wrapper chung để gọi các phương thức GET của API (cache TTL + ETag nằm trong client)."""
+    client = get_client(base_url, timeout)
     method = getattr(client, method_name)
     return method(**kwargs)
 
 
+def _fetch_many(base_url: str, timeout: float, return_exceptions: bool = False, **calls: tuple) -> dict:
+    """Gọi song song các phương thức GET độc lập: _fetch_many(url, t, a=("root", {}), ...)."""
+    return get_client(base_url, timeout).fetch_many(calls, return_exceptions)
+
+
 def _merge_predictions(original_df: pd.DataFrame, predictions: list) -> pd.DataFrame:
     """Ghép cột dự đoán vào dataframe gốc."""
     result_df = original_df.copy()
@@ -0,0 +1,114 @@
+"""Benchmark compiled (memory-mapped .npy) target encoding against the JSON dict mapping.
+
+Builds an M5-sized target_encoding_mapping.json (10 stores, 3049 items, 7
+depts, 3 cats, 7 weekdays, 30 events, 4 event types) and compiles it with
+`encoding.load_compiled`. It then encodes frames of 1, 100 and 100k rows
+both ways: `features.encode_categoricals` with the JSON dict, and with the
+compiled tables. String columns are what JSON records produce; categorical
+columns are what the Arrow/Parquet paths produce. About 1% of the values
+are unseen or missing, so the fallback is exercised too. The script
+reports the time per call and checks that both paths give identical values.
+
+    python benchmarks/bench_encoding.py
+    python benchmarks/bench_encoding.py --rows 1,100,100000,1000000 --repeat 50
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "docker" / "API"))
+
+from encoding import load_compiled  # noqa: E402
+from features import CATEGORICAL_COLUMNS, WEEKDAY_NAMES, encode_categoricals  # noqa: E402
+
+VOCABULARY = {
+    "store_id": [f"{state}_{n}" for state, count in (("CA", 4), ("TX", 3), ("WI", 3)) for n in range(1, count + 1)],
+    "item_id": [f"FOODS_{d}_{i:03d}" for d in range(1, 4) for i in range(1, 1017)][:3049],
+    "dept_id": ["FOODS_1", "FOODS_2", "FOODS_3", "HOBBIES_1", "HOBBIES_2", "HOUSEHOLD_1", "HOUSEHOLD_2"],
+    "cat_id": ["FOODS", "HOBBIES", "HOUSEHOLD"],
+    "weekday": WEEKDAY_NAMES,
+    "event_name": [f"Event_{n}" for n in range(30)],
+    "event_type": ["Cultural", "National", "Religious", "Sporting"],
+}
+
+
+def make_mapping(seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    return {column: {key: float(rng.gamma(2.0, 1.0)) for key in keys} for column, keys in VOCABULARY.items()}
+
+
+def make_frame(rows: int, categorical: bool, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    frame = {}
+    for column, keys in VOCABULARY.items():
+        values = np.array(keys + ["UNSEEN", None], dtype=object)
+        weights = np.r_[np.full(len(keys), 0.99 / len(keys)), 0.005, 0.005]
+        picked = values[rng.choice(values.size, rows, p=weights)]
+        frame[column] = pd.Categorical(picked) if categorical else picked
+    return pd.DataFrame(frame)
+
+
+def timed(function, repeat: int) -> float:
+    function()  # lần đầu không tính (khởi tạo lười của pandas)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", default="1,100,100000", help="comma separated frame sizes")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    scratch = tempfile.TemporaryDirectory()
+    source = Path(scratch.name) / "target_encoding_mapping.json"
+    source.write_text(json.dumps(make_mapping()), encoding="utf-8")
+
+    started = time.perf_counter()
+    with source.open("r", encoding="utf-8") as handle:
+        mapping = json.load(handle)
+    json_load = time.perf_counter() - started
+    target = Path(scratch.name) / "target_encoding_mapping.compiled"
+    started = time.perf_counter()
+    load_compiled(source, target)
+    compile_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    compiled = load_compiled(source, target)
+    open_seconds = time.perf_counter() - started
+    print(
+        f"load: json {json_load * 1e3:.2f} ms | compile {compile_seconds * 1e3:.2f} ms | "
+        f"open compiled (mmap) {open_seconds * 1e3:.2f} ms"
+    )
+
+    print(f"{'rows':>9} {'input':<12} {'json dict':>12} {'compiled':>12} {'speed-up':>9}")
+    for rows in (int(value) for value in args.rows.split(",")):
+        for categorical in (False, True):
+            frame = make_frame(rows, categorical)
+            repeat = max(1, args.repeat if rows <= 100_000 else args.repeat // 10)
+            expected = encode_categoricals(frame.copy(), mapping)
+            actual = encode_categoricals(frame.copy(), compiled)
+            for column in CATEGORICAL_COLUMNS:
+                if column in frame.columns:
+                    np.testing.assert_array_equal(expected[column].to_numpy(), actual[column].to_numpy())
+            baseline = timed(lambda: encode_categoricals(frame.copy(), mapping), repeat)
+            fast = timed(lambda: encode_categoricals(frame.copy(), compiled), repeat)
+            label = "categorical" if categorical else "string"
+            print(
+                f"{rows:>9,} {label:<12} {baseline * 1e3:>9.3f} ms {fast * 1e3:>9.3f} ms "
+                f"{baseline / fast:>8.1f}x"
+            )
+    scratch.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Benchmark the shared feature pipeline against the original notebook code.
+
+Builds a synthetic M5-shaped frame (stores x items x days), then times the
+notebook's groupby/rolling/transform cells and `features.build_training_frame`
+on copies of it. For each one it reports rows/sec and peak traced memory, and
+it checks that both produce the same values.
+
+    python benchmarks/bench_features.py                 # 1 store  (~5.9M rows)
+    python benchmarks/bench_features.py --stores 10     # full M5 (~59M rows)
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "docker" / "API"))
+
+from features import HISTORY_FEATURES, add_time_features, build_training_frame  # noqa: E402
+
+EVENTS = ["SuperBowl", "ValentinesDay", "Easter", "Thanksgiving", "Christmas"]
+
+
+def make_frame(stores: int, items: int, days: int, seed: int = 0) -> pd.DataFrame:
+    """Synthetic long-format sales data with the columns used by the notebooks."""
+    rng = np.random.default_rng(seed)
+    n = stores * items * days
+    dates = pd.date_range("2011-01-29", periods=days, freq="D")
+    event_days = rng.random(days) < 0.08
+    day_event = np.where(event_days, rng.choice(EVENTS, days), None)
+    item_ids = np.array([f"ITEM_{i:04d}" for i in range(items)], dtype=object)
+    store_ids = np.array([f"STORE_{s}" for s in range(stores)], dtype=object)
+    day_index = np.tile(np.arange(days), stores * items)
+    item_index = np.tile(np.repeat(np.arange(items), days), stores)
+    base_price = rng.uniform(0.5, 20.0, items).round(2)
+    price = base_price[item_index] * np.where(rng.random(n) < 0.02, 0.9, 1.0)
+    df = pd.DataFrame(
+        {
+            "store_id": pd.Categorical(np.repeat(store_ids, items * days)),
+            "item_id": pd.Categorical(item_ids[item_index]),
+            "dept_id": pd.Categorical(item_ids[item_index // 300 * 300]),
+            "cat_id": pd.Categorical(item_ids[item_index // 1000 * 1000]),
+            "date_id": dates[day_index],
+            "units_sold": rng.poisson(1.2, n).astype(np.int16),
+            "price": price.astype(np.float32),
+            "event_name": day_event[day_index],
+        }
+    )
+    # thứ tự ngày trước rồi mới tới item, giống bảng fact đọc từ Parquet
+    return df.sample(frac=1.0, random_state=seed).reset_index(drop=True)
+
+
+def notebook_features(data: pd.DataFrame) -> pd.DataFrame:
+    """The LightGBM notebook feature cells, keyed by (store_id, item_id)."""
+    keys = ["store_id", "item_id"]
+    data = add_time_features(data)
+    data = data.sort_values([*keys, "date_id"])
+    grouped = data.groupby(keys, observed=True)
+    for lag in [1, 7, 28]:
+        data[f"lag_{lag}"] = grouped["units_sold"].shift(lag)
+    data["rolling_7"] = grouped["units_sold"].shift(1).rolling(7).mean()
+    data["rolling_28"] = grouped["units_sold"].shift(1).rolling(28).mean()
+    data["rolling_std_7"] = grouped["units_sold"].shift(1).rolling(7).std()
+    data["price_change_1"] = grouped["price"].diff(1)
+    data["price_change_7"] = grouped["price"].diff(7)
+    data["event_window_7"] = data.groupby(keys, observed=True)["event_name"].transform(
+        lambda x: x.notna().astype(int).rolling(7).sum()
+    )
+    return data
+
+
+def measure(label: str, fn, frame: pd.DataFrame):
+    """Run `fn` on a copy of `frame` and print rows/sec and peak traced memory."""
+    df = frame.copy()
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn(df)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{label:<12} {elapsed:8.2f}s  {len(frame) / elapsed:>14,.0f} rows/s  "
+        f"peak {peak / 2**20:9.1f} MiB"
+    )
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stores", type=int, default=1)
+    parser.add_argument("--items", type=int, default=3049)
+    parser.add_argument("--days", type=int, default=1941)
+    parser.add_argument("--skip-notebook", action="store_true", help="only time the shared module")
+    args = parser.parse_args()
+
+    frame = make_frame(args.stores, args.items, args.days)
+    print(f"{len(frame):,} rows, input {frame.memory_usage(deep=True).sum() / 2**20:,.1f} MiB")
+
+    shared = measure("features.py", lambda df: build_training_frame(df, dropna=False), frame)
+    if args.skip_notebook:
+        return
+    reference = measure("notebook", notebook_features, frame)
+
+    reference = reference.sort_index()
+    for column in HISTORY_FEATURES:
+        np.testing.assert_allclose(
+            shared[column].to_numpy(dtype=np.float64),
+            reference[column].to_numpy(dtype=np.float64),
+            rtol=1e-5,
+            atol=1e-4,
+            err_msg=column,
+        )
+    print("outputs match")
+
+
+if __name__ == "__main__":
+    main()
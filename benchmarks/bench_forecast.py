@@ -0,0 +1,109 @@
+"""Benchmark the vectorised recursive forecast behind /forecast against a per-step rebuild loop.
+
+Seeds an online feature store with the last 28 days of a synthetic store
+(see bench_features.make_frame) and fits a small LightGBM model on the same
+frame, unless --model points to a joblib artifact. It then forecasts
+--horizon days for every series two ways. The baseline is the loop a client
+would drive, once per day: `feature_rows` -> DataFrame ->
+`build_feature_matrix_for_inference` -> predict -> `append`. The other is
+`recursive.recursive_forecast`. It reports the time of each and checks
+that both give the same forecasts.
+
+    python benchmarks/bench_forecast.py                      # one M5 store: 3049 series x 28 days
+    python benchmarks/bench_forecast.py --items 30490 --horizon 28
+"""
+from __future__ import annotations
+
+import argparse
+import copy
+import sys
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from bench_features import make_frame  # noqa: E402
+from m5_synth import target_encoding  # noqa: E402
+from docker.API.feature_store import FeatureStore  # noqa: E402
+from docker.API.features import (  # noqa: E402
+    FEATURE_COLUMNS,
+    TARGET_COLUMN,
+    build_feature_matrix_for_inference,
+    build_training_frame,
+    encode_categoricals,
+)
+from docker.API.partitioned import as_model  # noqa: E402
+from docker.API.recursive import recursive_forecast  # noqa: E402
+
+
+def fit_model(frame: pd.DataFrame, mapping: dict):
+    import lightgbm as lgb
+
+    data = build_training_frame(frame.copy())
+    features = encode_categoricals(data[FEATURE_COLUMNS].copy(), mapping).astype(np.float32)
+    model = lgb.LGBMRegressor(objective="tweedie", n_estimators=200, num_leaves=63, verbose=-1)
+    return model.fit(features, data[TARGET_COLUMN])
+
+
+def rebuild_loop(store: FeatureStore, keys, horizon: int, model, mapping) -> np.ndarray:
+    """Cách client phải làm: mỗi ngày một lần dựng lại DataFrame đặc trưng rồi append dự đoán."""
+    out = np.zeros((len(keys), horizon))
+    requests = [{"store_id": key[0], "item_id": key[1]} for key in keys]
+    for step in range(horizon):
+        rows = store.feature_rows(requests)
+        matrix = build_feature_matrix_for_inference(pd.DataFrame.from_records(rows), mapping)
+        out[:, step] = np.maximum(np.asarray(model.predict(matrix), dtype=np.float64), 0.0)
+        store.append(
+            {
+                "store_id": key[0],
+                "item_id": key[1],
+                "date_id": row["date_id"],
+                "units_sold": value,
+                "price": row["price"],
+            }
+            for key, row, value in zip(keys, rows, out[:, step])
+        )
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stores", type=int, default=1)
+    parser.add_argument("--items", type=int, default=3049)
+    parser.add_argument("--days", type=int, default=120, help="history used to fit the demo model")
+    parser.add_argument("--horizon", type=int, default=28)
+    parser.add_argument("--model", type=Path, help="joblib model instead of the demo LightGBM")
+    args = parser.parse_args()
+
+    frame = make_frame(args.stores, args.items, args.days)
+    frame["event_type"] = frame["event_name"].where(frame["event_name"].isna(), "Cultural")
+    mapping = target_encoding(frame)
+    model = as_model(joblib.load(args.model)) if args.model else fit_model(frame, mapping)
+    started = time.perf_counter()
+    store = FeatureStore.from_frame(frame)
+    keys = store.series_keys()
+    print(f"{len(keys):,} series seeded in {time.perf_counter() - started:.2f}s, horizon {args.horizon}")
+
+    baseline_store = FeatureStore()
+    baseline_store._series = copy.deepcopy(store._series)
+    started = time.perf_counter()
+    expected = rebuild_loop(baseline_store, keys, args.horizon, model, mapping)
+    baseline = time.perf_counter() - started
+
+    started = time.perf_counter()
+    _, predictions = recursive_forecast(store.snapshot(keys), args.horizon, model.predict, mapping)
+    vectorised = time.perf_counter() - started
+
+    for label, seconds in (("rebuild loop", baseline), ("recursive", vectorised)):
+        print(f"{label:<14} {seconds:8.2f}s {predictions.size / seconds:>12,.0f} forecasts/s")
+    print(f"speed-up {baseline / vectorised:.1f}x, max |diff| {np.abs(predictions - expected).max():.2e}")
+
+
+if __name__ == "__main__":
+    main()
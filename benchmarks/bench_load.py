@@ -0,0 +1,119 @@
+"""Benchmark the chunked COPY/upsert loader against the old iterrows INSERT loop.
+
+Loads a synthetic sales_data frame (see bench_features.make_frame) into a
+scratch table. The default target is a throwaway SQLite file; pass --url
+for PostgreSQL. It times the notebook's row-by-row INSERT on a sample, then
+`Load_data.bulk_load` on the full frame and on the same data as Parquet.
+A rerun checks that the upsert is idempotent.
+
+    python benchmarks/bench_load.py                                   # SQLite stand-in
+    python benchmarks/bench_load.py --url postgresql://user:pw@localhost/m5 --workers 8
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "NoteBook"))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from bench_features import make_frame  # noqa: E402
+from Load_data import ConnectionPool, TableSpec, bulk_load  # noqa: E402
+
+TABLE = TableSpec(
+    "bench_sales_data",
+    ("id", "item_id", "dept_id", "cat_id", "store_id", "state_id", "date", "units_sold"),
+    ("id", "date"),
+)
+DDL = """
+CREATE TABLE bench_sales_data (
+    id TEXT, item_id TEXT, dept_id TEXT, cat_id TEXT, store_id TEXT, state_id TEXT,
+    date DATE, units_sold INTEGER, PRIMARY KEY (id, date)
+)
+"""
+
+
+def sales_frame(stores: int, items: int, days: int) -> pd.DataFrame:
+    """make_frame đổi sang các cột của bảng sales_data (dạng dài)."""
+    frame = make_frame(stores, items, days).rename(columns={"date_id": "date"})
+    for column in ("store_id", "item_id", "dept_id", "cat_id"):
+        frame[column] = frame[column].astype(str)
+    frame["id"] = frame["item_id"] + "_" + frame["store_id"] + "_evaluation"
+    frame["state_id"] = "CA"
+    return frame[list(TABLE.columns)]
+
+
+def execute(pool: ConnectionPool, statement: str, fetch: bool = False):
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(statement)
+        result = cursor.fetchone()[0] if fetch else None
+        conn.commit()
+        return result
+
+
+def iterrows_load(pool: ConnectionPool, frame: pd.DataFrame) -> float:
+    """Vòng lặp cũ của load_data_to_db: một INSERT cho mỗi dòng, commit một lần ở cuối."""
+    started = time.perf_counter()
+    with pool.connection() as conn:
+        marker = "?" if pool.url.startswith("sqlite") else "%s"
+        cursor = conn.cursor()
+        if pool.url.startswith("sqlite"):
+            cursor.execute("BEGIN")
+        insert = f"INSERT INTO {TABLE.name} ({', '.join(TABLE.columns)}) VALUES ({', '.join([marker] * 8)})"
+        for _, row in frame.iterrows():
+            cursor.execute(insert, tuple(str(row[c]) if c == "date" else row[c] for c in TABLE.columns))
+        conn.commit()
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="database URL (default: a temporary SQLite file)")
+    parser.add_argument("--stores", type=int, default=4)
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--days", type=int, default=500)
+    parser.add_argument("--iterrows-rows", type=int, default=20_000, help="sample size for the old loop")
+    parser.add_argument("--chunk-rows", type=int, default=50_000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    scratch = tempfile.TemporaryDirectory()
+    url = args.url or f"sqlite:///{Path(scratch.name) / 'bench.db'}"
+    pool = ConnectionPool(url, size=args.workers)
+    frame = sales_frame(args.stores, args.items, args.days)
+    parquet = Path(scratch.name) / "sales.parquet"
+    frame.to_parquet(parquet, index=False)
+    print(f"{len(frame):,} rows -> {url.split('@')[-1]}")
+
+    def reset() -> None:
+        execute(pool, f"DROP TABLE IF EXISTS {TABLE.name}")
+        execute(pool, DDL)
+
+    reset()
+    sample = frame.head(args.iterrows_rows)
+    elapsed = iterrows_load(pool, sample)
+    print(f"{'iterrows':<16} {len(sample):>12,} rows {elapsed:8.2f}s {len(sample) / elapsed:>12,.0f} rows/s")
+
+    for label, source in (("bulk (frame)", frame), ("bulk (parquet)", parquet), ("rerun (upsert)", frame)):
+        if label != "rerun (upsert)":
+            reset()
+        report = bulk_load(source, TABLE, chunk_rows=args.chunk_rows, workers=args.workers, pool=pool)
+        count = execute(pool, f"SELECT COUNT(*) FROM {TABLE.name}", fetch=True)
+        print(
+            f"{label:<16} {report['rows']:>12,} rows {report['seconds']:8.2f}s "
+            f"{report['rows_per_second']:>12,.0f} rows/s  table={count:,}"
+        )
+        assert count == len(frame), "upsert must not duplicate rows"
+    pool.close()
+    scratch.cleanup()
+
+
+if __name__ == "__main__":
+    main()
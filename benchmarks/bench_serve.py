@@ -0,0 +1,171 @@
+"""Benchmark the pre-forking server (docker/API/serve.py) from 1 to N workers.
+
+For each worker count the script starts `python -m docker.API.serve` and
+reports how long it takes until /health answers "ok". It reads the RSS,
+PSS and private memory of the parent and of every worker from
+/proc/<pid>/smaps_rollup; pages shared copy-on-write are counted once in
+PSS. It then drives /predict with --clients client processes for
+--duration seconds and reports requests/s, rows/s, p50/p99 latency and
+the speed-up over one worker. The prediction cache is disabled so every
+request reaches the model.
+
+Without --data-dir/--model-dir it writes a synthetic M5-shaped dataset,
+target encoding and LightGBM model (see m5_synth) to a temporary directory.
+
+    python benchmarks/bench_serve.py                         # 1..cores workers
+    python benchmarks/bench_serve.py --workers 1,2,4,8 --clients 16 --rows 200
+    python benchmarks/bench_serve.py --data-dir Dashboard/data --model-dir model --json serve.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import requests
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from m5_synth import generate  # noqa: E402
+
+
+def memory(pid: int) -> Dict[str, int]:
+    fields = {"Rss": "rss", "Pss": "pss", "Private_Clean": "private", "Private_Dirty": "private"}
+    out = {"rss": 0, "pss": 0, "private": 0}
+    with open(f"/proc/{pid}/smaps_rollup", "r", encoding="ascii") as source:
+        for line in source:
+            name, _, rest = line.partition(":")
+            if name in fields:
+                out[fields[name]] += int(rest.split()[0]) * 1024
+    return out
+
+
+def children(pid: int) -> List[int]:
+    with open(f"/proc/{pid}/task/{pid}/children", "r", encoding="ascii") as source:
+        return [int(value) for value in source.read().split()]
+
+
+def wait_ready(base: str, process: subprocess.Popen, timeout: float) -> float:
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"server thoát với mã {process.returncode}")
+        try:
+            if requests.get(f"{base}/health", timeout=1).status_code == 200:
+                return time.perf_counter() - started
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.05)
+    raise TimeoutError(f"{base} chưa sẵn sàng sau {timeout:.0f}s")
+
+
+def client(base: str, payload: bytes, deadline: float) -> List[float]:
+    """Gửi /predict liên tục tới deadline, trả về độ trễ từng request (giây)."""
+    session = requests.Session()
+    latencies = []
+    headers = {"Content-Type": "application/json"}
+    while time.time() < deadline:
+        started = time.perf_counter()
+        response = session.post(f"{base}/predict", data=payload, headers=headers, timeout=60)
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def run(workers: int, args: argparse.Namespace, env: Dict[str, str], port: int) -> Dict[str, object]:
+    base = f"http://127.0.0.1:{port}"
+    command = [sys.executable, "-m", "docker.API.serve", "--workers", str(workers), "--port", str(port),
+               "--host", "127.0.0.1", "--log-level", "warning"]
+    process = subprocess.Popen(command, cwd=ROOT, env=env)
+    try:
+        startup = wait_ready(base, process, args.timeout)
+        health = requests.get(f"{base}/health").json()
+        sample = requests.get(f"{base}/data/sample", params={"limit": args.rows}).json()["data"]
+        payload = json.dumps({"records": sample}).encode("utf-8")
+        deadline = time.time() + args.duration
+        with multiprocessing.Pool(args.clients) as pool:
+            results = pool.starmap(client, [(base, payload, deadline)] * args.clients)
+        latencies = np.array([value for result in results for value in result])
+        worker_memory = [memory(pid) for pid in children(process.pid)]
+        return {
+            "workers": workers,
+            "model_threads": health["process"]["model_threads"],
+            "startup_seconds": round(startup, 3),
+            "preload_seconds": health["startup_seconds"],
+            "parent": memory(process.pid),
+            "worker_memory": worker_memory,
+            "requests": int(latencies.size),
+            "requests_per_second": round(latencies.size / args.duration, 1),
+            "rows_per_second": round(latencies.size * len(sample) / args.duration, 1),
+            "p50_ms": round(float(np.percentile(latencies, 50)) * 1e3, 2),
+            "p99_ms": round(float(np.percentile(latencies, 99)) * 1e3, 2),
+        }
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=30)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    cores = len(os.sched_getaffinity(0))
+    parser.add_argument("--workers", default=",".join(str(n) for n in sorted({1, max(1, cores // 2), cores})))
+    parser.add_argument("--clients", type=int, default=max(4, 2 * cores))
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--rows", type=int, default=100, help="rows per /predict request")
+    parser.add_argument("--data-dir", type=Path)
+    parser.add_argument("--model-dir", type=Path)
+    parser.add_argument("--items", type=int, default=500, help="synthetic items when no --data-dir")
+    parser.add_argument("--port", type=int, default=8190)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--json", type=Path, help="write the results to this file")
+    args = parser.parse_args()
+
+    scratch: Optional[tempfile.TemporaryDirectory] = None
+    if args.data_dir is None or args.model_dir is None:
+        scratch = tempfile.TemporaryDirectory()
+        generate(Path(scratch.name), items=args.items, stores=2, days=200)
+        args.data_dir = args.data_dir or Path(scratch.name) / "data"
+        args.model_dir = args.model_dir or Path(scratch.name) / "model"
+    env = {
+        **os.environ,
+        "DATA_DIR": str(args.data_dir.resolve()),
+        "MODEL_DIR": str(args.model_dir.resolve()),
+        "SERVED_MODELS": os.getenv("SERVED_MODELS", "lightgbm"),
+        "PREDICTION_CACHE_ENABLED": "0",
+        "MODEL_POLL_SECONDS": "0",
+    }
+
+    print(f"{cores} cores, {args.clients} clients x {args.duration:.0f}s, {args.rows} rows/request")
+    print(f"{'workers':>7} {'threads':>7} {'startup':>8} {'parent rss':>10} {'worker rss':>10} "
+          f"{'pss':>8} {'private':>8} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'scale':>6}")
+    results = []
+    for workers in (int(value) for value in args.workers.split(",")):
+        result = run(workers, args, env, args.port)
+        results.append(result)
+        mean = {key: np.mean([entry[key] for entry in result["worker_memory"]]) / 2**20 for key in ("rss", "pss", "private")}
+        scale = result["requests_per_second"] / results[0]["requests_per_second"]
+        print(
+            f"{workers:>7} {result['model_threads']:>7} {result['startup_seconds']:>7.2f}s "
+            f"{result['parent']['rss'] / 2**20:>8.0f}MB {mean['rss']:>8.0f}MB {mean['pss']:>6.0f}MB "
+            f"{mean['private']:>6.0f}MB {result['requests_per_second']:>8.1f} {result['p50_ms']:>8.2f} "
+            f"{result['p99_ms']:>8.2f} {scale:>5.2f}x"
+        )
+    if args.json:
+        args.json.write_text(json.dumps({"cores": cores, "results": results}, indent=2), encoding="utf-8")
+    if scratch is not None:
+        scratch.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+"""Deterministic generator for M5-shaped data: raw files, Parquet inputs, API artifacts and a small model.
+
+The output has the same shape as the M5 competition files the notebooks
+read. Items are split across FOODS_1..HOUSEHOLD_2 in M5's proportions, and
+stores are taken in order from CA_1..WI_3. The calendar starts on
+2011-01-29 and has Walmart weeks, events and SNAP days; events fall on fixed
+month/day dates. Weekly prices include occasional promotions. Some items
+launch late; like in M5 they have zero sales and no price rows before
+launch. Daily demand is negative-binomial, with weekly and yearly
+seasonality, SNAP and event effects, and price elasticity. Stores are
+closed on Christmas. The same --seed and sizes always give byte-identical
+files.
+
+    <output>/raw/sales_data.csv, calendar.csv, sell_prices.csv      wide M5 files (NoteBook/Ingest_sales.py)
+    <output>/parquet/calendar.parquet, sell_prices.parquet          inputs of NoteBook/Star_Schema.py
+    <output>/data/test_data.parquet, target_encoding_mapping.json   DATA_DIR of the API
+    <output>/model/lgbm_model.joblib (+ xgboost_model.joblib)       MODEL_DIR of the API
+    <output>/manifest.json                                          sizes, seed and row counts
+
+    python benchmarks/m5_synth.py --output /tmp/m5 --items 300 --stores 3 --days 400
+    python benchmarks/m5_synth.py --output /tmp/m5_full --items 3049 --stores 10 --days 1941 --xgboost
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+import joblib
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from docker.API.features import (  # noqa: E402
+    CATEGORICAL_COLUMNS,
+    DATE_COLUMN,
+    FEATURE_COLUMNS,
+    TARGET_COLUMN,
+    add_time_features,
+    build_training_frame,
+    encode_categoricals,
+    smoothed_target_mean,
+)
+
+START_DATE = "2011-01-29"
+# số item của từng dept trong M5 (tổng 3049)
+DEPARTMENTS = {
+    "FOODS_1": 216,
+    "FOODS_2": 398,
+    "FOODS_3": 823,
+    "HOBBIES_1": 416,
+    "HOBBIES_2": 149,
+    "HOUSEHOLD_1": 532,
+    "HOUSEHOLD_2": 515,
+}
+STORES = ["CA_1", "CA_2", "CA_3", "CA_4", "TX_1", "TX_2", "TX_3", "WI_1", "WI_2", "WI_3"]
+# (tên, loại, tháng, ngày); Easter và OrthodoxEaster trùng ngày để có event_name_2 như M5
+EVENTS = [
+    ("NewYear", "National", 1, 1),
+    ("SuperBowl", "Sporting", 2, 6),
+    ("ValentinesDay", "Cultural", 2, 14),
+    ("PresidentsDay", "National", 2, 20),
+    ("StPatricksDay", "Cultural", 3, 17),
+    ("Easter", "Cultural", 4, 16),
+    ("OrthodoxEaster", "Religious", 4, 16),
+    ("Cinco De Mayo", "Cultural", 5, 5),
+    ("Mother's day", "Cultural", 5, 12),
+    ("MemorialDay", "National", 5, 29),
+    ("NBAFinalsStart", "Sporting", 6, 4),
+    ("Father's day", "Cultural", 6, 18),
+    ("IndependenceDay", "National", 7, 4),
+    ("LaborDay", "National", 9, 4),
+    ("Halloween", "Cultural", 10, 31),
+    ("VeteransDay", "National", 11, 11),
+    ("Thanksgiving", "National", 11, 24),
+    ("Christmas", "National", 12, 25),
+]
+# ngày SNAP trong tháng của từng bang (theo lịch M5)
+SNAP_DAYS = {
+    "CA": set(range(1, 11)),
+    "TX": {1, 3, 5, 6, 7, 9, 11, 12, 15},
+    "WI": {2, 3, 5, 6, 8, 9, 11, 12, 14, 15},
+}
+# (trung bình log lượng bán, trung bình log giá, xác suất ngày không có cầu) theo cat
+CATEGORY_PROFILE = {"FOODS": (0.6, 1.0, 0.25), "HOBBIES": (-0.6, 1.6, 0.45), "HOUSEHOLD": (-0.3, 1.5, 0.4)}
+WEEKLY_PROFILE = np.array([1.3, 1.35, 0.95, 0.9, 0.88, 0.9, 1.05])  # wday 1..7 = Saturday..Friday
+HISTORY_DAYS = 35  # đủ cho lag_28 + rolling_28 trên units_sold dịch 1 ngày
+
+
+def item_catalog(items: int) -> pd.DataFrame:
+    """`items` item chia theo tỉ lệ dept của M5: item_id, dept_id, cat_id."""
+    total = sum(DEPARTMENTS.values())
+    counts = {dept: max(1, round(size * items / total)) for dept, size in DEPARTMENTS.items()}
+    # chỉnh phần dư vào dept lớn nhất để tổng đúng bằng items
+    largest = max(counts, key=counts.get)
+    counts[largest] += items - sum(counts.values())
+    rows = [
+        (f"{dept}_{number:03d}", dept, dept.rsplit("_", 1)[0])
+        for dept, count in counts.items()
+        for number in range(1, count + 1)
+    ]
+    return pd.DataFrame(rows[:items], columns=["item_id", "dept_id", "cat_id"])
+
+
+def make_calendar(days: int, horizon: int = 28) -> pd.DataFrame:
+    """Lịch dạng calendar.csv của M5 cho `days` ngày bán + `horizon` ngày dự báo."""
+    dates = pd.date_range(START_DATE, periods=days + horizon, freq="D")
+    week = np.arange(dates.size) // 7
+    events: Dict[Tuple[int, int], List[Tuple[str, str]]] = {}
+    for name, kind, month, day in EVENTS:
+        events.setdefault((month, day), []).append((name, kind))
+    slots = [events.get((date.month, date.day), []) + [(None, None), (None, None)] for date in dates]
+    frame = pd.DataFrame(
+        {
+            "date": dates.strftime("%Y-%m-%d"),
+            # 11101 = năm tài chính 2011, tuần 01; tuần bắt đầu từ thứ Bảy như Walmart
+            "wm_yr_wk": 10000 + (11 + week // 52) * 100 + week % 52 + 1,
+            "weekday": dates.day_name(),
+            "wday": (dates.dayofweek + 2) % 7 + 1,
+            "month": dates.month,
+            "year": dates.year,
+            "d": [f"d_{number}" for number in range(1, dates.size + 1)],
+            "event_name_1": [slot[0][0] for slot in slots],
+            "event_type_1": [slot[0][1] for slot in slots],
+            "event_name_2": [slot[1][0] for slot in slots],
+            "event_type_2": [slot[1][1] for slot in slots],
+        }
+    )
+    for state, snap_days in SNAP_DAYS.items():
+        frame[f"snap_{state}"] = np.isin(dates.day, list(snap_days)).astype(np.int8)
+    return frame
+
+
+def _series_parameters(catalog: pd.DataFrame, seed: int) -> Dict[str, np.ndarray]:
+    """Tham số cố định theo item (dùng chung mọi cửa hàng): giá gốc, mức cầu, ngày ra mắt..."""
+    rng = np.random.default_rng([seed, 0])
+    profile = np.array([CATEGORY_PROFILE[cat] for cat in catalog["cat_id"]])
+    size = len(catalog)
+    launched = rng.random(size) < 0.25
+    return {
+        "demand": np.exp(rng.normal(profile[:, 0], 0.8)),
+        "price": np.maximum(np.exp(rng.normal(profile[:, 1], 0.5)), 0.25).round(2),
+        "zero": np.clip(rng.normal(profile[:, 2], 0.15), 0.0, 0.9),
+        "elasticity": rng.uniform(0.5, 2.5, size),
+        "trend": rng.normal(0.0, 0.15, size),
+        "launch": np.where(launched, rng.integers(0, 900, size), 0),
+    }
+
+
+def _weekly_prices(params: Dict[str, np.ndarray], weeks: int, rng: np.random.Generator) -> np.ndarray:
+    """Giá theo tuần (item × tuần) của một cửa hàng: bậc thay đổi giá + khuyến mãi ngắn."""
+    size = params["price"].size
+    store_level = 1.0 + rng.normal(0.0, 0.03, size)
+    steps = rng.choice([0.95, 1.0, 1.0, 1.05, 1.1], size=(size, weeks)) * (rng.random((size, weeks)) < 0.02)
+    level = np.cumprod(np.where(steps > 0, steps, 1.0), axis=1)
+    promo = np.where(rng.random((size, weeks)) < 0.04, 0.85, 1.0)
+    return np.round(params["price"][:, None] * store_level[:, None] * level * promo, 2)
+
+
+def simulate_store(
+    store: str, catalog: pd.DataFrame, calendar: pd.DataFrame, days: int, seed: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """(units_sold int16 item × ngày, giá tuần item × tuần, NaN trước ngày ra mắt) của một cửa hàng."""
+    params = _series_parameters(catalog, seed)
+    rng = np.random.default_rng([seed, 1 + STORES.index(store)])
+    state = store.split("_")[0]
+    calendar = calendar.iloc[:days]
+    week_codes, week_index = np.unique(calendar["wm_yr_wk"].to_numpy(), return_inverse=True)
+    prices = _weekly_prices(params, week_codes.size, rng)
+    launch_week = week_index[np.minimum(params["launch"], days - 1)]
+    prices[np.arange(week_codes.size)[None, :] < launch_week[:, None]] = np.nan
+
+    dates = pd.to_datetime(calendar["date"])
+    t = np.arange(days) / 365.0
+    yearly = 1.0 + 0.1 * np.sin(2 * np.pi * dates.dt.dayofyear.to_numpy() / 365.25)
+    seasonal = WEEKLY_PROFILE[calendar["wday"].to_numpy() - 1] * yearly
+    event = np.where(calendar["event_name_1"].notna(), 1.2, 1.0)
+    foods = (catalog["cat_id"] == "FOODS").to_numpy()
+    snap = calendar[f"snap_{state}"].to_numpy()
+    daily_price = prices[:, week_index]
+    base = params["demand"] * np.exp(rng.normal(0.0, 0.3))  # mức cầu riêng của cửa hàng
+    rate = (
+        base[:, None]
+        * seasonal[None, :]
+        * event[None, :]
+        * np.exp(params["trend"][:, None] * t[None, :])
+        * np.where(foods[:, None], 1.0 + 0.15 * snap[None, :], 1.0)
+        * np.power(np.nan_to_num(daily_price, nan=1.0) / params["price"][:, None], -params["elasticity"][:, None])
+    )
+    # gamma-Poisson (nhị thức âm, k = 2) + ngày không có cầu
+    units = rng.poisson(rate * rng.gamma(2.0, 0.5, rate.shape))
+    units[rng.random(rate.shape) < params["zero"][:, None]] = 0
+    units[np.arange(days)[None, :] < params["launch"][:, None]] = 0
+    units[:, ((dates.dt.month == 12) & (dates.dt.day == 25)).to_numpy()] = 0  # cửa hàng đóng cửa
+    return np.minimum(units, np.iinfo(np.int16).max).astype(np.int16), prices
+
+
+def iter_stores(
+    stores: List[str], catalog: pd.DataFrame, calendar: pd.DataFrame, days: int, seed: int
+) -> Iterator[Tuple[str, np.ndarray, np.ndarray]]:
+    for store in stores:
+        units, prices = simulate_store(store, catalog, calendar, days, seed)
+        yield store, units, prices
+
+
+def long_frame(
+    store: str, catalog: pd.DataFrame, calendar: pd.DataFrame, units: np.ndarray, prices: np.ndarray, first_day: int
+) -> pd.DataFrame:
+    """Các ngày từ first_day của một cửa hàng ở dạng dài của API (bỏ ngày item chưa ra mắt)."""
+    days = units.shape[1]
+    span = calendar.iloc[first_day:days]
+    _, week_index = np.unique(calendar["wm_yr_wk"].to_numpy()[:days], return_inverse=True)
+    size, width = len(catalog), days - first_day
+    price = prices[:, week_index[first_day:]]
+    frame = pd.DataFrame(
+        {
+            "store_id": store,
+            "item_id": np.repeat(catalog["item_id"].to_numpy(), width),
+            "dept_id": np.repeat(catalog["dept_id"].to_numpy(), width),
+            "cat_id": np.repeat(catalog["cat_id"].to_numpy(), width),
+            DATE_COLUMN: np.tile(pd.to_datetime(span["date"]).to_numpy(), size),
+            TARGET_COLUMN: units[:, first_day:].ravel(),
+            "price": price.ravel().astype(np.float32),
+            "event_name": np.tile(span["event_name_1"].to_numpy(), size),
+            "event_type": np.tile(span["event_type_1"].to_numpy(), size),
+        }
+    )
+    return frame[frame["price"].notna().to_numpy()]
+
+
+def write_wide_sales(path: Path, catalog: pd.DataFrame, store: str, units: np.ndarray, header: bool) -> None:
+    state = store.split("_")[0]
+    with path.open("w" if header else "a", encoding="utf-8", newline="\n") as sink:
+        if header:
+            days = [f"d_{number}" for number in range(1, units.shape[1] + 1)]
+            sink.write(",".join(["id", "item_id", "dept_id", "cat_id", "store_id", "state_id", *days]) + "\n")
+        for (item, dept, cat), row in zip(catalog.itertuples(index=False), units):
+            prefix = f"{item}_{store}_evaluation,{item},{dept},{cat},{store},{state},"
+            sink.write(prefix + ",".join(map(str, row.tolist())) + "\n")
+
+
+def price_rows(store: str, catalog: pd.DataFrame, week_codes: np.ndarray, prices: np.ndarray) -> pd.DataFrame:
+    """sell_prices dạng M5 (store_id, item_id, wm_yr_wk, sell_price), không có tuần trước khi ra mắt."""
+    item, week = np.nonzero(~np.isnan(prices))
+    return pd.DataFrame(
+        {
+            "store_id": store,
+            "item_id": catalog["item_id"].to_numpy()[item],
+            "wm_yr_wk": week_codes[week],
+            "sell_price": prices[item, week],
+        }
+    )
+
+
+def target_encoding(frame: pd.DataFrame) -> Dict[str, Dict[str, float]]:
+    """target_encoding_mapping.json của tập train `frame`: cùng làm mượt với mapping đã publish.
+
+    features.smoothed_target_mean theo từng giá trị phân loại, prior là trung
+    bình units_sold của cả `frame`.
+    """
+    frame = add_time_features(frame.copy())
+    prior = float(frame[TARGET_COLUMN].mean())
+    mapping: Dict[str, Dict[str, float]] = {}
+    for column in CATEGORICAL_COLUMNS:
+        if column not in frame.columns:
+            continue
+        stats = frame.groupby(frame[column].astype(str), observed=True)[TARGET_COLUMN].agg(["count", "sum"])
+        encoded = smoothed_target_mean(stats["count"].to_numpy(), stats["sum"].to_numpy(), prior)
+        mapping[column] = {str(key): float(value) for key, value in zip(stats.index, encoded)}
+    return mapping
+
+
+def train_models(train: pd.DataFrame, mapping: Dict[str, Any], seed: int, xgboost: bool) -> Dict[str, Any]:
+    """Mô hình nhỏ, xác định (một luồng, seed cố định) trên các ngày trước giai đoạn test."""
+    import lightgbm as lgb
+
+    features = encode_categoricals(train[FEATURE_COLUMNS].copy(), mapping).astype(np.float32)
+    models: Dict[str, Any] = {
+        "lgbm_model.joblib": lgb.LGBMRegressor(
+            objective="tweedie", n_estimators=150, num_leaves=31, learning_rate=0.1,
+            random_state=seed, n_jobs=1, deterministic=True, force_row_wise=True, verbose=-1,
+        ).fit(features, train[TARGET_COLUMN])
+    }
+    if xgboost:
+        import xgboost as xgb
+
+        models["xgboost_model.joblib"] = xgb.XGBRegressor(
+            objective="reg:tweedie", n_estimators=150, max_depth=6, learning_rate=0.1,
+            random_state=seed, n_jobs=1, tree_method="hist",
+        ).fit(features, train[TARGET_COLUMN])
+    return models
+
+
+def generate(
+    output: Path,
+    items: int = 300,
+    stores: int = 3,
+    days: int = 400,
+    seed: int = 0,
+    test_days: int = 28,
+    train_days: int = 90,
+    xgboost: bool = False,
+) -> Dict[str, Any]:
+    """Sinh toàn bộ bộ dữ liệu vào `output`; trả về (và ghi) manifest."""
+    started = time.perf_counter()
+    if not 1 <= stores <= len(STORES):
+        raise ValueError(f"stores phải trong khoảng 1..{len(STORES)}")
+    window = HISTORY_DAYS + train_days + test_days
+    if days < window:
+        raise ValueError(f"days phải ≥ {window} (lịch sử + train_days + test_days)")
+    raw, parquet, data, model = (output / name for name in ("raw", "parquet", "data", "model"))
+    for directory in (raw, parquet, data, model):
+        directory.mkdir(parents=True, exist_ok=True)
+
+    catalog = item_catalog(items)
+    calendar = make_calendar(days)
+    calendar.to_csv(raw / "calendar.csv", index=False)
+    calendar.to_parquet(parquet / "calendar.parquet", index=False)
+    week_codes = np.unique(calendar["wm_yr_wk"].to_numpy()[:days])
+
+    tails, price_frames = [], []
+    for position, (store, units, prices) in enumerate(iter_stores(STORES[:stores], catalog, calendar, days, seed)):
+        write_wide_sales(raw / "sales_data.csv", catalog, store, units, header=position == 0)
+        price_frames.append(price_rows(store, catalog, week_codes, prices))
+        tails.append(long_frame(store, catalog, calendar, units, prices, days - window))
+    sell_prices = pd.concat(price_frames, ignore_index=True)
+    sell_prices.to_csv(raw / "sell_prices.csv", index=False)
+    sell_prices.to_parquet(parquet / "sell_prices.parquet", index=False)
+
+    recent = pd.concat(tails, ignore_index=True)
+    features = build_training_frame(recent.copy())
+    cutoff = recent[DATE_COLUMN].max() - pd.Timedelta(days=test_days - 1)
+    train = features[features[DATE_COLUMN] < cutoff]
+    test = features[features[DATE_COLUMN] >= cutoff].reset_index(drop=True)
+    mapping = target_encoding(recent[recent[DATE_COLUMN] < cutoff])
+    test.to_parquet(data / "test_data.parquet", index=False)
+    (data / "target_encoding_mapping.json").write_text(json.dumps(mapping, indent=2), encoding="utf-8")
+    for filename, fitted in train_models(train, mapping, seed, xgboost).items():
+        joblib.dump(fitted, model / filename)
+
+    manifest = {
+        "items": items,
+        "stores": stores,
+        "days": days,
+        "seed": seed,
+        "test_days": test_days,
+        "train_days": train_days,
+        "series": items * stores,
+        "sales_cells": items * stores * days,
+        "price_rows": len(sell_prices),
+        "train_rows": len(train),
+        "test_rows": len(test),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    (output / "manifest.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    return manifest
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", type=Path, required=True)
+    parser.add_argument("--items", type=int, default=300, help="3049 = full M5")
+    parser.add_argument("--stores", type=int, default=3, help="1..10, taken in order CA_1..WI_3")
+    parser.add_argument("--days", type=int, default=400, help="1941 = full M5")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--test-days", type=int, default=28, help="days written to test_data.parquet")
+    parser.add_argument("--train-days", type=int, default=90, help="days the demo model is fitted on")
+    parser.add_argument("--xgboost", action="store_true", help="also fit xgboost_model.joblib")
+    args = parser.parse_args()
+    manifest = generate(
+        args.output, args.items, args.stores, args.days, args.seed, args.test_days, args.train_days, args.xgboost
+    )
+    print(json.dumps(manifest, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,384 @@
+"""End-to-end benchmark suite on synthetic M5 data, with JSON results that can be compared across commits.
+
+The suite first generates a dataset with m5_synth (or reuses --work-dir when
+its manifest matches the requested sizes). It then times each stage and
+records one result per (name, params):
+
+* generate                      m5_synth.generate (only when the dataset is not reused)
+* ingest.csv_to_parquet         NoteBook/Ingest_sales.ingest (wide CSV -> long Parquet)
+* ingest.star_schema            NoteBook/Star_Schema.build (fact + dimensions)
+* ingest.load_sqlite            NoteBook/Load_data.bulk_load into a scratch SQLite file
+* aggregate.cubes               NoteBook/Agg_table.build_cubes + write_cubes (also feeds /rollups)
+* features.training_frame       features.build_training_frame over every day of the first store
+* features.inference_matrix     features.build_feature_matrix_for_inference on the test data
+* api.predict / api.data_sample latency (p50/p95/p99) and throughput for each batch size x
+                                concurrency, against `python -m docker.API.serve`
+
+Results go to --output as JSON, together with the commit, the machine and
+the dataset manifest. In-process stages report the median of --repeat
+runs. --compare prints the ratio of every metric to an
+earlier run and flags regressions beyond --threshold. Metrics named
+*_per_second are better when higher; seconds, *_ms and *_mb are better
+when lower.
+
+    python benchmarks/run_suite.py --output bench.json
+    python benchmarks/run_suite.py --scale medium --work-dir /tmp/m5 --output after.json --compare before.json
+    python benchmarks/run_suite.py --only api --batch-sizes 1,1000 --concurrency 1,8 --server-workers 4
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import requests
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+sys.path.insert(0, str(ROOT / "NoteBook"))
+
+import m5_synth  # noqa: E402
+from bench_serve import memory, wait_ready  # noqa: E402
+from docker.API.encoding import load_compiled  # noqa: E402
+from docker.API.features import build_feature_matrix_for_inference, build_training_frame  # noqa: E402
+
+SUITE_VERSION = 1
+STAGES = ("ingest", "aggregate", "features", "api")
+SCALES = {
+    "small": {"items": 300, "stores": 3, "days": 400},
+    "medium": {"items": 1000, "stores": 10, "days": 800},
+    "m5": {"items": 3049, "stores": 10, "days": 1941},
+}
+HIGHER_IS_BETTER = ("_per_second",)
+LOWER_IS_BETTER = ("seconds", "_ms", "_mb")
+SALES_DDL = """
+CREATE TABLE sales_data (
+    id TEXT, item_id TEXT, dept_id TEXT, cat_id TEXT, store_id TEXT, state_id TEXT,
+    date DATE, units_sold INTEGER, PRIMARY KEY (id, date)
+)
+"""
+
+
+def machine() -> Dict[str, Any]:
+    return {
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cores": len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count(),
+        "memory_mb": os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // 2**20,
+        "packages": {name: _version(name) for name in ("numpy", "pandas", "pyarrow", "polars", "lightgbm")},
+    }
+
+
+def _version(name: str) -> Optional[str]:
+    try:
+        return __import__(name).__version__
+    except ImportError:
+        return None
+
+
+def git_state() -> Dict[str, Any]:
+    def run(*args: str) -> str:
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+
+    return {"commit": run("rev-parse", "HEAD") or None, "dirty": bool(run("status", "--porcelain", "--untracked-files=no"))}
+
+
+def timed(function: Callable[[], Any], repeat: int = 1) -> Tuple[Any, float]:
+    """Kết quả lần chạy cuối và thời gian trung vị của `repeat` lần (giảm nhiễu cho bước ngắn)."""
+    seconds = []
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        result = function()
+        seconds.append(time.perf_counter() - started)
+    return result, float(np.median(seconds))
+
+
+class Suite:
+    """Gom kết quả (name, params, metrics) và in từng dòng khi đo xong."""
+
+    def __init__(self) -> None:
+        self.results: List[Dict[str, Any]] = []
+
+    def record(self, name: str, params: Dict[str, Any], **metrics: float) -> None:
+        metrics = {key: round(float(value), 4) for key, value in metrics.items()}
+        self.results.append({"name": name, "params": params, "metrics": metrics})
+        label = " ".join(f"{key}={value}" for key, value in params.items())
+        shown = " ".join(f"{key}={value:,.6g}" for key, value in metrics.items())
+        print(f"  {name:<26} {label:<28} {shown}", flush=True)
+
+
+def prepare_dataset(work: Path, sizes: Dict[str, int], seed: int, suite: Suite) -> Dict[str, Any]:
+    manifest_path = work / "manifest.json"
+    if manifest_path.is_file():
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        if all(manifest.get(key) == value for key, value in {**sizes, "seed": seed}.items()):
+            print(f"  reusing {work}")
+            return manifest
+    manifest, seconds = timed(lambda: m5_synth.generate(work, seed=seed, **sizes))
+    suite.record("generate", dict(sizes), seconds=seconds, cells_per_second=manifest["sales_cells"] / seconds)
+    return manifest
+
+
+def run_ingest(work: Path, suite: Suite) -> None:
+    import Ingest_sales
+    import Load_data
+    import Star_Schema
+
+    raw, parquet = work / "raw", work / "parquet"
+    # không phân vùng: Load_data.bulk_load chia file một lần theo store_id trước khi nạp song song
+    report = Ingest_sales.ingest(
+        raw / "sales_data.csv", raw / "calendar.csv", parquet / "sales.parquet", "none", 4
+    )
+    suite.record(
+        "ingest.csv_to_parquet", {"partition_by": "none"}, rows=report["rows"], seconds=report["seconds"],
+        rows_per_second=report["rows_per_second"], peak_rss_mb=report["peak_rss_mb"],
+    )
+    report = Star_Schema.build(parquet, work / "star", "store_id", 2048, os.cpu_count() or 1)
+    suite.record(
+        "ingest.star_schema", {"partition_by": "store_id"}, rows=report["rows"], seconds=report["seconds"],
+        rows_per_second=report["rows_per_second"], peak_worker_rss_mb=report["peak_worker_rss_mb"],
+    )
+    with tempfile.TemporaryDirectory() as scratch:
+        database = Path(scratch) / "bench.db"
+        with sqlite3.connect(database) as conn:
+            conn.execute(SALES_DDL)
+        report = Load_data.bulk_load(parquet / "sales.parquet", url=f"sqlite:///{database}", workers=4)
+    suite.record(
+        "ingest.load_sqlite", {"partition_by": "store_id"}, rows=report["rows"], seconds=report["seconds"],
+        rows_per_second=report["rows_per_second"],
+    )
+
+
+def run_aggregate(work: Path, repeat: int, suite: Suite) -> None:
+    import Agg_table
+
+    fact = Agg_table.prepare_fact(Agg_table.scan_star_schema(work / "star"))
+    cubes, seconds = timed(lambda: Agg_table.build_cubes(fact), repeat)
+    _, write_seconds = timed(lambda: Agg_table.write_cubes(cubes, work / "data" / "aggregates"), repeat)
+    suite.record(
+        "aggregate.cubes", {"cubes": len(cubes)}, seconds=seconds, write_seconds=write_seconds,
+        rows=sum(frame.height for frame in cubes.values()),
+    )
+
+
+def run_features(work: Path, manifest: Dict[str, Any], repeat: int, suite: Suite) -> None:
+    catalog = m5_synth.item_catalog(manifest["items"])
+    calendar = m5_synth.make_calendar(manifest["days"])
+    store = m5_synth.STORES[0]
+    units, prices = m5_synth.simulate_store(store, catalog, calendar, manifest["days"], manifest["seed"])
+    frame = m5_synth.long_frame(store, catalog, calendar, units, prices, 0)
+    _, seconds = timed(lambda: build_training_frame(frame.copy()), repeat)
+    suite.record(
+        "features.training_frame", {"store": store}, rows=len(frame), seconds=seconds,
+        rows_per_second=len(frame) / seconds,
+    )
+
+    data = work / "data"
+    test = pd.read_parquet(data / "test_data.parquet")
+    with tempfile.TemporaryDirectory() as scratch:
+        mapping = load_compiled(data / "target_encoding_mapping.json", Path(scratch) / "compiled")
+        _, seconds = timed(lambda: build_feature_matrix_for_inference(test, mapping), repeat)
+    suite.record(
+        "features.inference_matrix", {"encoding": "compiled"}, rows=len(test), seconds=seconds,
+        rows_per_second=len(test) / seconds,
+    )
+
+
+def _client(
+    url: str, method: str, body: Optional[bytes], params: Optional[Dict[str, Any]], deadline: float
+) -> Tuple[List[float], int]:
+    """Gửi request liên tục tới deadline; trả về độ trễ các request thành công và số lỗi."""
+    session = requests.Session()
+    latencies: List[float] = []
+    errors = 0
+    headers = {"Content-Type": "application/json"} if body is not None else {}
+    while time.time() < deadline:
+        started = time.perf_counter()
+        try:
+            ok = session.request(method, url, data=body, params=params, headers=headers, timeout=60).status_code == 200
+        except requests.RequestException:
+            ok = False
+        if ok:
+            latencies.append(time.perf_counter() - started)
+        else:
+            errors += 1
+    return latencies, errors
+
+
+def load(
+    url: str, method: str, body: Optional[bytes], params: Optional[Dict[str, Any]], concurrency: int, duration: float
+) -> Dict[str, float]:
+    deadline = time.time() + duration
+    with multiprocessing.get_context("fork").Pool(concurrency) as pool:
+        results = pool.starmap(_client, [(url, method, body, params, deadline)] * concurrency)
+    latencies = np.array([value for result, _ in results for value in result]) * 1e3
+    if latencies.size == 0:
+        latencies = np.array([np.nan])
+    return {
+        "requests_per_second": np.isfinite(latencies).sum() / duration,
+        "p50_ms": np.percentile(latencies, 50),
+        "p95_ms": np.percentile(latencies, 95),
+        "p99_ms": np.percentile(latencies, 99),
+        "errors": sum(errors for _, errors in results),
+    }
+
+
+def run_api(work: Path, args: argparse.Namespace, suite: Suite) -> None:
+    base = f"http://127.0.0.1:{args.port}"
+    env = {
+        **os.environ,
+        "DATA_DIR": str((work / "data").resolve()),
+        "MODEL_DIR": str((work / "model").resolve()),
+        "SERVED_MODELS": "lightgbm",
+        "MODEL_VARIANT": "lightgbm",
+        # mọi request phải tới mô hình: tắt cache kết quả và theo dõi phiên bản
+        "PREDICTION_CACHE_ENABLED": "0",
+        "MODEL_POLL_SECONDS": "0",
+    }
+    command = [
+        sys.executable, "-m", "docker.API.serve", "--workers", str(args.server_workers),
+        "--host", "127.0.0.1", "--port", str(args.port), "--log-level", "warning",
+    ]
+    process = subprocess.Popen(command, cwd=ROOT, env=env)
+    try:
+        startup = wait_ready(base, process, args.timeout)
+        health = requests.get(f"{base}/health").json()
+        suite.record(
+            "api.startup", {"workers": args.server_workers}, seconds=startup,
+            preload_seconds=health["startup_seconds"], parent_rss_mb=memory(process.pid)["rss"] / 2**20,
+        )
+        sizes = [int(value) for value in args.batch_sizes.split(",")]
+        records = requests.get(f"{base}/data/sample", params={"limit": min(max(sizes), 1000)}).json()["data"]
+        for size in sizes:
+            body = json.dumps({"records": (records * (size // len(records) + 1))[:size]}).encode("utf-8")
+            for concurrency in (int(value) for value in args.concurrency.split(",")):
+                params = {"batch": size, "concurrency": concurrency, "workers": args.server_workers}
+                result = load(f"{base}/predict", "POST", body, None, concurrency, args.duration)
+                suite.record("api.predict", params, rows_per_second=result["requests_per_second"] * size, **result)
+                if size <= 1000:
+                    result = load(f"{base}/data/sample", "GET", None, {"limit": size}, concurrency, args.duration)
+                    suite.record(
+                        "api.data_sample", params, rows_per_second=result["requests_per_second"] * size, **result
+                    )
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=30)
+
+
+def _direction(metric: str) -> int:
+    if metric.endswith(HIGHER_IS_BETTER):
+        return 1
+    if metric.endswith(LOWER_IS_BETTER):
+        return -1
+    return 0
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """In tỉ lệ hiện tại / baseline cho mọi metric có hướng; trả về danh sách regression."""
+    def key(result: Dict[str, Any]) -> str:
+        return result["name"] + json.dumps(result["params"], sort_keys=True)
+
+    previous = {key(result): result for result in baseline["results"]}
+    regressions = []
+    print(f"\ncompared with {baseline.get('git', {}).get('commit')} (threshold {threshold:.0%})")
+    for result in current["results"]:
+        old = previous.get(key(result))
+        if old is None:
+            continue
+        for metric, value in result["metrics"].items():
+            direction, before = _direction(metric), old["metrics"].get(metric)
+            if not direction or not before or not np.isfinite(value):
+                continue
+            ratio = value / before
+            worse = (ratio < 1 - threshold) if direction > 0 else (ratio > 1 + threshold)
+            flag = "REGRESSION" if worse else ""
+            label = " ".join(f"{k}={v}" for k, v in result["params"].items())
+            print(f"  {result['name']:<26} {label:<28} {metric:<20} {before:>12,.4g} -> {value:>12,.4g} {ratio:6.2f}x {flag}")
+            if worse:
+                regressions.append(f"{result['name']} {label} {metric}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--items", type=int)
+    parser.add_argument("--stores", type=int)
+    parser.add_argument("--days", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", type=Path, help="keep (and reuse) the generated data here")
+    parser.add_argument("--only", default=",".join(STAGES), help=f"comma separated subset of {','.join(STAGES)}")
+    parser.add_argument("--batch-sizes", default="1,100,1000", help="rows per /predict and /data/sample request")
+    parser.add_argument("--concurrency", default="1,4,16", help="concurrent client processes")
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds per load level")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per in-process stage (median is kept)")
+    parser.add_argument("--server-workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8191)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--output", type=Path, help="write the results here as JSON")
+    parser.add_argument("--compare", type=Path, help="earlier --output to compare with")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    stages = {stage.strip() for stage in args.only.split(",") if stage.strip()}
+    unknown = stages - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+    sizes = {key: getattr(args, key) or value for key, value in SCALES[args.scale].items()}
+    scratch = None if args.work_dir else tempfile.TemporaryDirectory()
+    work = args.work_dir or Path(scratch.name)
+    work.mkdir(parents=True, exist_ok=True)
+
+    suite = Suite()
+    started = time.perf_counter()
+    print(f"dataset {sizes} -> {work}")
+    manifest = prepare_dataset(work, sizes, args.seed, suite)
+    # cube và star schema là đầu vào của các bước sau: chạy lại nếu thiếu
+    if "ingest" in stages or ("aggregate" in stages and not (work / "star").is_dir()):
+        run_ingest(work, suite)
+    if "aggregate" in stages or ("api" in stages and not (work / "data" / "aggregates").is_dir()):
+        run_aggregate(work, args.repeat, suite)
+    if "features" in stages:
+        run_features(work, manifest, args.repeat, suite)
+    if "api" in stages:
+        run_api(work, args, suite)
+
+    report = {
+        "suite_version": SUITE_VERSION,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git": git_state(),
+        "machine": machine(),
+        "dataset": manifest,
+        "options": {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()},
+        "seconds": round(time.perf_counter() - started, 3),
+        "results": suite.results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"\nresults -> {args.output}")
+    regressions = []
+    if args.compare:
+        regressions = compare(report, json.loads(args.compare.read_text(encoding="utf-8")), args.threshold)
+        print(f"{len(regressions)} regression(s)")
+    if scratch is not None:
+        scratch.cleanup()
+    if regressions and args.fail_on_regression:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
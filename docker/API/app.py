@@ -1,14 +1,37 @@
 """FastAPI entrypoint that wires routers together."""
 from __future__ import annotations
 
+import threading
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
 from fastapi import FastAPI
 
+from . import config
+from . import dependencies as deps
+from .metrics import RequestMetricsMiddleware
 from .routes import router
 
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    """Warm-up ở luồng nền để /health báo "starting" cho tới khi mọi thứ đã nạp xong."""
+    if config.MODEL_PRELOAD:
+        threading.Thread(target=deps.warm_up, name="warm-up", daemon=True).start()
+    else:
+        deps.mark_ready()
+    yield
+    deps.get_model_registry().stop()
+
+
 app = FastAPI(
+    lifespan=lifespan,
     title="API du bao units_sold",
     version="1.0.0",
     summary="bao gom LightGBM (CPU) va XGBoost (GPU-trained) du bao units_sold.",
 )
 
 app.include_router(router)
+app.add_middleware(
+    RequestMetricsMiddleware, endpoints=("/predict", "/predict/bulk", "/predict/online", "/forecast")
+)
@@ -0,0 +1,227 @@
+"""Micro-batching scheduler that coalesces concurrent predict calls."""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from dataclasses import dataclass, field
+from queue import Empty, Full, Queue
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+PredictFn = Callable[[pd.DataFrame], Any]
+
+logger = logging.getLogger(__name__)
+
+
+class BatchQueueFull(RuntimeError):
+    """Hàng đợi micro-batch đã đầy, request bị từ chối."""
+
+
+class BatchTimeout(RuntimeError):
+    """Request chờ kết quả micro-batch quá `timeout_seconds`."""
+
+
+@dataclass
+class _PendingRequest:
+    features: pd.DataFrame
+    future: Future
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+def _percentiles(samples: Deque[float]) -> Dict[str, float]:
+    """Tính p50/p95/p99 (ms) trên các mẫu gần nhất."""
+    if not samples:
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "mean_ms": 0.0}
+    values = np.fromiter(samples, dtype=float) * 1000.0
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "mean_ms": round(float(values.mean()), 3),
+    }
+
+
+class MicroBatcher:
+    """Gom các ma trận đặc trưng đồng thời thành một lần gọi predict duy nhất.
+
+    Request đầu tiên mở một cửa sổ `window_ms`; mọi request đến trong cửa sổ đó
+    được nối vào cùng batch cho tới khi đạt `max_rows`. Kết quả được tách lại
+    theo số dòng của từng request. Caller chờ tối đa `timeout_seconds` (None =
+    không giới hạn); request hết hạn khi còn trong hàng đợi bị bỏ khỏi batch.
+    """
+
+    def __init__(
+        self,
+        predict_fn: PredictFn,
+        *,
+        max_rows: int,
+        window_ms: float,
+        queue_depth: int,
+        timeout_seconds: Optional[float] = None,
+        stats_window: int = 2048,
+    ) -> None:
+        self._predict_fn = predict_fn
+        self.max_rows = max(1, int(max_rows))
+        self.window = max(0.0, float(window_ms)) / 1000.0
+        self.queue_depth = max(1, int(queue_depth))
+        self.timeout = float(timeout_seconds) if timeout_seconds else None
+        self._queue: "Queue[_PendingRequest]" = Queue(maxsize=self.queue_depth)
+        self._carry: Optional[_PendingRequest] = None
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._queue_wait: Deque[float] = deque(maxlen=stats_window)
+        self._compute: Deque[float] = deque(maxlen=stats_window)
+        self._batch_rows: Deque[int] = deque(maxlen=stats_window)
+        self._requests = 0
+        self._batches = 0
+        self._rejected = 0
+        self._timed_out = 0
+
+    def start(self) -> None:
+        """Khởi động luồng worker nếu chưa chạy."""
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="micro-batcher", daemon=True
+            )
+            self._thread.start()
+
+    def submit(self, features: pd.DataFrame) -> np.ndarray:
+        """Đưa ma trận đặc trưng vào hàng đợi và chờ kết quả dự đoán."""
+        self.start()
+        pending = _PendingRequest(features=features, future=Future())
+        try:
+            self._queue.put_nowait(pending)
+        except Full as exc:
+            with self._stats_lock:
+                self._rejected += 1
+            raise BatchQueueFull(
+                f"Hàng đợi dự đoán đã đầy ({self.queue_depth} request)"
+            ) from exc
+        try:
+            return pending.future.result(timeout=self.timeout)
+        except FutureTimeout as exc:
+            # chưa vào batch thì hủy luôn; đang chạy thì kết quả đến sau bị bỏ
+            pending.future.cancel()
+            with self._stats_lock:
+                self._timed_out += 1
+            raise BatchTimeout(f"Dự đoán không hoàn tất trong {self.timeout:g}s") from exc
+
+    def _next_request(self, timeout: Optional[float]) -> Optional[_PendingRequest]:
+        """Lấy request kế tiếp, ưu tiên request bị dời từ batch trước."""
+        if self._carry is not None:
+            pending, self._carry = self._carry, None
+            return pending
+        try:
+            return self._queue.get(timeout=timeout)
+        except Empty:
+            return None
+
+    def _collect(self) -> List[_PendingRequest]:
+        """Gom request cho tới khi hết cửa sổ thời gian hoặc đủ số dòng."""
+        first = self._next_request(timeout=None)
+        batch = [first]
+        rows = len(first.features)
+        deadline = time.perf_counter() + self.window
+        while rows < self.max_rows:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            pending = self._next_request(timeout=remaining)
+            if pending is None:
+                break
+            if rows + len(pending.features) > self.max_rows:
+                self._carry = pending
+                break
+            batch.append(pending)
+            rows += len(pending.features)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch: List[_PendingRequest] = []
+            try:
+                batch = self._collect()
+                self._execute(batch)
+            except Exception as exc:  # lỗi ngoài predict không được giết luồng worker
+                logger.exception("micro-batch %d request lỗi", len(batch))
+                self._fail(batch, exc)
+
+    @staticmethod
+    def _fail(batch: List[_PendingRequest], exc: BaseException) -> None:
+        """Trả lỗi ngay cho mọi caller trong batch chưa nhận kết quả."""
+        for pending in batch:
+            if not pending.future.done():
+                pending.future.set_exception(exc)
+
+    def _execute(self, batch: List[_PendingRequest]) -> None:
+        """Chạy một lần predict cho cả batch rồi trả kết quả về từng caller."""
+        started = time.perf_counter()
+        batch = [pending for pending in batch if pending.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        frames = [pending.features for pending in batch]
+        try:
+            merged = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+            predictions = np.asarray(self._predict_fn(merged))
+        except Exception as exc:  # lỗi mô hình được trả về cho mọi caller trong batch
+            self._fail(batch, exc)
+            return
+        finished = time.perf_counter()
+
+        rows = sum(len(pending.features) for pending in batch)
+        if predictions.ndim != 1 or predictions.shape[0] != rows:
+            # cắt theo offset trên kết quả lệch số dòng sẽ trả nhầm dòng của request khác
+            self._fail(
+                batch,
+                ValueError(f"predict trả về mảng shape {predictions.shape}, cần ({rows},)"),
+            )
+            return
+
+        offset = 0
+        for pending in batch:
+            size = len(pending.features)
+            pending.future.set_result(predictions[offset : offset + size])
+            offset += size
+
+        with self._stats_lock:
+            self._requests += len(batch)
+            self._batches += 1
+            self._batch_rows.append(offset)
+            self._compute.append(finished - started)
+            self._queue_wait.extend(started - pending.enqueued_at for pending in batch)
+
+    def stats(self) -> Dict[str, Any]:
+        """Trả về thống kê thời gian chờ hàng đợi và thời gian tính toán."""
+        with self._stats_lock:
+            batch_rows = list(self._batch_rows)
+            return {
+                "config": {
+                    "max_rows": self.max_rows,
+                    "window_ms": self.window * 1000.0,
+                    "queue_depth": self.queue_depth,
+                    "timeout_seconds": self.timeout,
+                },
+                "requests": self._requests,
+                "batches": self._batches,
+                "rejected": self._rejected,
+                "timed_out": self._timed_out,
+                "queued": self._queue.qsize(),
+                "avg_requests_per_batch": (
+                    round(self._requests / self._batches, 3) if self._batches else 0.0
+                ),
+                "avg_rows_per_batch": (
+                    round(float(np.mean(batch_rows)), 3) if batch_rows else 0.0
+                ),
+                "queue_wait": _percentiles(self._queue_wait),
+                "compute": _percentiles(self._compute),
+            }
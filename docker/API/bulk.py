@@ -0,0 +1,46 @@
+"""Chunked readers used by the streaming bulk-prediction endpoint."""
+from __future__ import annotations
+
+import json
+from typing import IO, Iterator, List
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from .utils import PARQUET_MEDIA_TYPE, records_to_dataframe
+
+NDJSON_MEDIA_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl"}
+PARQUET_MEDIA_TYPES = {PARQUET_MEDIA_TYPE, "application/x-parquet"}
+
+
+def iter_ndjson_frames(source: IO[bytes], chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """Đọc từng dòng NDJSON và trả về dataframe theo từng chunk cố định."""
+    buffer: List[dict] = []
+    for line_number, raw in enumerate(source, start=1):
+        line = raw.strip()
+        if not line:
+            continue
+        try:
+            buffer.append(json.loads(line))
+        except json.JSONDecodeError as exc:
+            raise ValueError(f"Dòng NDJSON {line_number} không hợp lệ: {exc.msg}") from exc
+        if len(buffer) >= chunk_rows:
+            yield records_to_dataframe(buffer)
+            buffer = []
+    if buffer:
+        yield records_to_dataframe(buffer)
+
+
+def iter_parquet_frames(source: IO[bytes], chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """Đọc file Parquet theo từng record batch thay vì nạp toàn bộ."""
+    # mở file ngay để lỗi định dạng được báo trước khi bắt đầu stream
+    parquet_file = pq.ParquetFile(source)
+
+    def _frames() -> Iterator[pd.DataFrame]:
+        for batch in parquet_file.iter_batches(batch_size=chunk_rows):
+            df = batch.to_pandas()
+            if "date_id" in df.columns:
+                df["date_id"] = pd.to_datetime(df["date_id"], errors="coerce")
+            yield df
+
+    return _frames()
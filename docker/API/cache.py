@@ -0,0 +1,100 @@
+"""Bounded LRU cache for prediction results."""
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+def hash_records(records: List[Dict[str, Any]]) -> str:
+    """Băm danh sách bản ghi JSON theo dạng chuẩn hóa (key đã sắp xếp)."""
+    canonical = json.dumps(records, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def hash_frame(df: pd.DataFrame) -> str:
+    """Băm nội dung dataframe (tên cột + giá trị từng dòng)."""
+    digest = hashlib.sha256("\x1f".join(map(str, df.columns)).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    """Cache LRU giới hạn số mục và tổng số byte, TTL tùy chọn (0 = không hết hạn)."""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float = 0.0) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = max(1, int(max_bytes))
+        self.ttl = max(0.0, float(ttl_seconds))
+        self._entries: "OrderedDict[Hashable, tuple[np.ndarray, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Optional[np.ndarray]:
+        """Trả về kết quả đã cache hoặc None, đồng thời đánh dấu mục vừa dùng."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, stored_at = entry
+            if self.ttl and time.monotonic() - stored_at > self.ttl:
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: np.ndarray) -> None:
+        """Lưu kết quả, loại bỏ các mục ít dùng nhất khi vượt giới hạn."""
+        value = np.asarray(value)
+        if value.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (value, time.monotonic())
+            self._bytes += value.nbytes
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def _drop(self, key: Hashable) -> None:
+        value, _ = self._entries.pop(key)
+        self._bytes -= value.nbytes
+
+    def clear(self) -> None:
+        """Xóa toàn bộ cache (ví dụ khi mô hình hoặc encoding thay đổi)."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Trả về bộ đếm hit/miss và mức sử dụng bộ nhớ."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -1,13 +1,85 @@
-"""Static paths shared across the FastAPI service."""
+"""Static paths and tunables shared across the FastAPI service."""
 from __future__ import annotations
 
+import os
 from pathlib import Path
 
 ROOT_DIR = Path(__file__).resolve().parents[1]
-DATA_DIR = ROOT_DIR / "Dashboard" / "data"
-MODEL_DIR = ROOT_DIR / "model"
+# ghi đè được bằng biến môi trường (vd. trong image Docker, dữ liệu nằm ngoài thư mục mã)
+DATA_DIR = Path(os.getenv("DATA_DIR", str(ROOT_DIR / "Dashboard" / "data")))
+MODEL_DIR = Path(os.getenv("MODEL_DIR", str(ROOT_DIR / "model")))
 
 TEST_DATA_PATH = DATA_DIR / "test_data.parquet"
+TEST_DATA_ARROW_PATH = DATA_DIR / "test_data.arrow"
 ENCODING_PATH = DATA_DIR / "target_encoding_mapping.json"
+ENCODING_COMPILED_PATH = DATA_DIR / "target_encoding_mapping.compiled"  # bảng .npy biên dịch từ JSON
+AGG_DIR = DATA_DIR / "aggregates"  # cube do NoteBook/Agg_table.py ghi ra
 LGBM_PATH = MODEL_DIR / "lgbm_model.joblib"
 XGB_PATH = MODEL_DIR / "xgboost_model.joblib"
+
+# Các mô hình được phục vụ trong cùng process (chọn theo request hoặc ensemble)
+SERVED_MODELS = [
+    name.strip().lower()
+    for name in os.getenv("SERVED_MODELS", "lightgbm,xgboost").split(",")
+    if name.strip()
+]
+MODEL_POOL_WORKERS = int(os.getenv("MODEL_POOL_WORKERS", "0"))  # 0 = một luồng mỗi mô hình
+
+# Registry phiên bản mô hình: MODEL_DIR/<variant>/<version>/model.joblib
+MODEL_PRELOAD = os.getenv("MODEL_PRELOAD", "1") == "1"  # nạp + warm-up trước khi /health sẵn sàng
+MODEL_POLL_SECONDS = float(os.getenv("MODEL_POLL_SECONDS", "10"))  # 0 = không theo dõi phiên bản mới
+MODEL_WARMUP_ROWS = int(os.getenv("MODEL_WARMUP_ROWS", "64"))
+MODEL_THREADS = int(os.getenv("MODEL_THREADS", "0"))  # luồng predict của mỗi mô hình, 0 = mặc định của thư viện
+
+# Chế độ pre-fork (python -m docker.API.serve): nạp một lần ở process cha rồi fork các worker
+# 0 = tự chọn: một worker khi feature store online nhận append (FEATURE_STORE_ONLINE), nếu không thì số nhân CPU
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "0"))
+WEB_HOST = os.getenv("WEB_HOST", "0.0.0.0")
+WEB_PORT = int(os.getenv("WEB_PORT", "8080"))
+
+# Micro-batching trước lời gọi predict của mô hình
+BATCH_ENABLED = os.getenv("BATCH_ENABLED", "1") == "1"
+BATCH_MAX_ROWS = int(os.getenv("BATCH_MAX_ROWS", "8192"))
+BATCH_WINDOW_MS = float(os.getenv("BATCH_WINDOW_MS", "2"))
+BATCH_QUEUE_DEPTH = int(os.getenv("BATCH_QUEUE_DEPTH", "256"))
+# thời gian tối đa một request chờ kết quả batch (0 = không giới hạn): vài cửa sổ + ngân sách predict
+BATCH_PREDICT_BUDGET_SECONDS = float(os.getenv("BATCH_PREDICT_BUDGET_SECONDS", "10"))
+BATCH_TIMEOUT_SECONDS = float(
+    os.getenv("BATCH_TIMEOUT_SECONDS", str(4 * BATCH_WINDOW_MS / 1000.0 + BATCH_PREDICT_BUDGET_SECONDS))
+)
+
+# Phân trang theo cursor (/data/rows) và giảm mẫu chuỗi thời gian (/data/series)
+DATA_PAGE_ROWS = int(os.getenv("DATA_PAGE_ROWS", "1000"))
+DATA_PAGE_MAX_ROWS = int(os.getenv("DATA_PAGE_MAX_ROWS", "10000"))
+DATA_SERIES_MAX_POINTS = int(os.getenv("DATA_SERIES_MAX_POINTS", "5000"))
+DATA_SERIES_MAX_GROUPS = int(os.getenv("DATA_SERIES_MAX_GROUPS", "50"))
+ROLLUP_MAX_ROWS = int(os.getenv("ROLLUP_MAX_ROWS", "100000"))
+
+# Endpoint dự đoán hàng loạt dạng streaming
+BULK_CHUNK_ROWS = int(os.getenv("BULK_CHUNK_ROWS", "5000"))
+BULK_SPOOL_BYTES = int(os.getenv("BULK_SPOOL_BYTES", str(64 * 1024 * 1024)))
+
+# Cache kết quả dự đoán (TTL = 0 nghĩa là không hết hạn)
+PREDICTION_CACHE_ENABLED = os.getenv("PREDICTION_CACHE_ENABLED", "1") == "1"
+PREDICTION_CACHE_MAX_ENTRIES = int(os.getenv("PREDICTION_CACHE_MAX_ENTRIES", "1024"))
+PREDICTION_CACHE_MAX_BYTES = int(os.getenv("PREDICTION_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+PREDICTION_CACHE_TTL_SECONDS = float(os.getenv("PREDICTION_CACHE_TTL_SECONDS", "0"))
+
+# Target encoding: tra bảng .npy memory-mapped theo mã số (0 = map dict của JSON như cũ)
+ENCODING_COMPILED = os.getenv("ENCODING_COMPILED", "1") == "1"
+
+# Feature store online: nạp trạng thái ban đầu từ dataset test
+FEATURE_STORE_SEED = os.getenv("FEATURE_STORE_SEED", "1") == "1"
+# nhận /features/append; 0 = chỉ đọc lịch sử đã nạp (cho phép nhiều worker pre-fork)
+FEATURE_STORE_ONLINE = os.getenv("FEATURE_STORE_ONLINE", "1") == "1"
+
+# Dự báo đệ quy nhiều ngày (/forecast)
+FORECAST_MAX_HORIZON = int(os.getenv("FORECAST_MAX_HORIZON", "56"))
+FORECAST_MAX_SERIES = int(os.getenv("FORECAST_MAX_SERIES", "50000"))
+
+# Metrics Prometheus (/metrics) và header Server-Timing theo yêu cầu
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+TIMING_HEADER = os.getenv("TIMING_HEADER", "X-Timing")  # request gửi header này = 1 để nhận Server-Timing
+# Server pre-fork: mỗi worker ghi metric vào thư mục này để /metrics gộp mọi worker ("" = thư mục tạm)
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
@@ -0,0 +1,306 @@
+"""Memory-mapped, date-indexed access to the prepared test dataset."""
+from __future__ import annotations
+
+import base64
+import binascii
+import os
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+DATE_COLUMN = "date_id"
+ID_TYPE = pa.dictionary(pa.int32(), pa.string())
+
+# Schema khai báo của dataset đã chuẩn bị: id/nhãn dạng dictionary (-> pandas category),
+# số đếm và trường lịch là số nguyên nhỏ nhất đủ chứa, đặc trưng số thực là float32.
+COLUMN_TYPES: Dict[str, pa.DataType] = {
+    "id": ID_TYPE,
+    "item_id": ID_TYPE,
+    "dept_id": ID_TYPE,
+    "cat_id": ID_TYPE,
+    "store_id": ID_TYPE,
+    "state_id": ID_TYPE,
+    "weekday": ID_TYPE,
+    "event_name": ID_TYPE,
+    "event_type": ID_TYPE,
+    "units_sold": pa.int16(),
+    "day_of_week": pa.int8(),
+    "day_of_year": pa.int16(),
+    "month": pa.int8(),
+    "year": pa.int16(),
+    "wm_yr_wk": pa.int32(),
+}
+# đổi khi đổi quy tắc ở trên: file Arrow mang dấu cũ sẽ được tạo lại
+SCHEMA_VERSION = "compact-1"
+SCHEMA_KEY = b"dataset_schema"
+
+
+def _compact_type(name: str, array: pa.ChunkedArray) -> pa.DataType:
+    """Kiểu gọn cho một cột: theo COLUMN_TYPES nếu được khai báo, nếu không thì suy ra từ kiểu gốc."""
+    source = array.type
+    declared = COLUMN_TYPES.get(name)
+    if pa.types.is_integer(source) or (declared is not None and pa.types.is_integer(declared)):
+        if array.null_count:
+            # số nguyên có null sang pandas thành float64: giữ dạng float32 ngay từ đầu
+            return pa.float32()
+        if declared is not None and pa.types.is_integer(declared):
+            return declared
+        low, high = pc.min_max(array).values() if len(array) else (pa.scalar(0), pa.scalar(0))
+        for candidate, info in ((pa.int8(), np.iinfo(np.int8)), (pa.int16(), np.iinfo(np.int16)), (pa.int32(), np.iinfo(np.int32))):
+            if info.min <= (low.as_py() or 0) and (high.as_py() or 0) <= info.max:
+                return candidate
+        return source
+    if declared is not None:
+        return declared
+    if pa.types.is_floating(source):
+        return pa.float32()
+    if pa.types.is_string(source) or pa.types.is_large_string(source):
+        return ID_TYPE
+    return source
+
+
+def compact_table(table: pa.Table) -> pa.Table:
+    """Áp schema khai báo lên bảng; cột không ép được (vd. tràn int16) giữ kiểu gốc."""
+    columns = []
+    for name in table.column_names:
+        array = table.column(name)
+        if name != DATE_COLUMN:
+            target = _compact_type(name, array)
+            if target != array.type:
+                try:
+                    if target == ID_TYPE and pa.types.is_null(array.type):
+                        # cột toàn null (vd. không có sự kiện trong khoảng test): ép null -> dictionary
+                        # sinh ra một category null mà pandas từ chối, nên mã hoá từ chuỗi rỗng
+                        array = array.cast(pa.string())
+                    array = array.dictionary_encode() if target == ID_TYPE and not pa.types.is_dictionary(array.type) else array.cast(target)
+                    if array.type != target:
+                        array = array.cast(target)
+                except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                    pass
+        columns.append(array)
+    metadata = {**(table.schema.metadata or {}), SCHEMA_KEY: SCHEMA_VERSION.encode()}
+    return pa.Table.from_arrays(columns, names=table.column_names).replace_schema_metadata(metadata)
+
+
+def build_arrow_file(parquet_path: Path, arrow_path: Path) -> None:
+    """Chuyển Parquet thành file Arrow IPC (không nén) đã sắp xếp theo date_id, theo schema gọn."""
+    df = pd.read_parquet(parquet_path)
+    if DATE_COLUMN in df.columns:
+        df[DATE_COLUMN] = pd.to_datetime(df[DATE_COLUMN], errors="coerce")
+        # ngày lỗi (NaT) nằm cuối để phần đầu cột date_id luôn liên tục và có thứ tự
+        df = df.sort_values(DATE_COLUMN, kind="stable", na_position="last")
+    table = pa.Table.from_pandas(df.reset_index(drop=True), preserve_index=False)
+    del df
+    # một chunk duy nhất cho mỗi cột để đọc lại dưới dạng view zero-copy
+    table = compact_table(table.combine_chunks()).combine_chunks()
+    tmp_path = arrow_path.with_name(f"{arrow_path.name}.{os.getpid()}.tmp")
+    with pa.OSFile(str(tmp_path), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    # ghi nguyên tử: các worker khác chỉ thấy file cũ hoặc file mới hoàn chỉnh
+    os.replace(tmp_path, arrow_path)
+
+
+def _current_schema(arrow_path: Path) -> bool:
+    """File Arrow đã được ghi theo SCHEMA_VERSION hiện tại chưa (chỉ đọc footer, không đọc dữ liệu)."""
+    try:
+        with pa.memory_map(str(arrow_path), "r") as source:
+            metadata = pa.ipc.open_file(source).schema.metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return False
+    return metadata.get(SCHEMA_KEY) == SCHEMA_VERSION.encode()
+
+
+class DateIndexedDataset:
+    """Bảng Arrow memory-mapped, tra cứu khoảng ngày bằng tìm kiếm nhị phân.
+
+    Các trang dữ liệu nằm trong page cache của hệ điều hành nên được chia sẻ
+    giữa các worker uvicorn; chỉ lát kết quả mới được chuyển sang pandas.
+    """
+
+    def __init__(self, table: pa.Table, version: str = "") -> None:
+        self.table = table
+        self.version = version
+        self._dates = self._date_index(table)
+
+    @classmethod
+    def open(cls, parquet_path: Path, arrow_path: Path) -> "DateIndexedDataset":
+        """Mở file Arrow, tạo lại từ Parquet nếu chưa có hoặc đã cũ."""
+        if not arrow_path.exists() or (
+            arrow_path.stat().st_mtime < parquet_path.stat().st_mtime
+        ) or not _current_schema(arrow_path):
+            build_arrow_file(parquet_path, arrow_path)
+        stat = arrow_path.stat()
+        source = pa.memory_map(str(arrow_path), "r")
+        # phiên bản = mtime + kích thước file Arrow, dùng làm ETag cho các endpoint dữ liệu
+        version = f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+        return cls(pa.ipc.open_file(source).read_all(), version)
+
+    def column_bytes(self) -> Dict[str, Dict[str, object]]:
+        """Kiểu Arrow và số byte của từng cột trong bảng memory-mapped (dữ liệu + bitmap null)."""
+        return {
+            name: {"type": str(column.type), "bytes": int(column.nbytes)}
+            for name, column in zip(self.table.column_names, self.table.columns)
+        }
+
+    @staticmethod
+    def _date_index(table: pa.Table) -> np.ndarray:
+        """Trả về cột date_id (không null) dạng datetime64[ns], view trên mmap nếu có thể."""
+        if DATE_COLUMN not in table.column_names:
+            return np.empty(0, dtype="datetime64[ns]")
+        column = table.column(DATE_COLUMN)
+        valid = len(column) - column.null_count
+        column = column.slice(0, valid)
+        if column.num_chunks == 1:
+            array = column.chunk(0)
+        else:
+            array = column.combine_chunks()
+        if not pa.types.is_timestamp(array.type):
+            array = array.cast(pa.timestamp("ns"))
+        return array.to_numpy(zero_copy_only=False).astype("datetime64[ns]", copy=False)
+
+    @property
+    def num_rows(self) -> int:
+        return self.table.num_rows
+
+    @property
+    def columns(self) -> List[str]:
+        return self.table.column_names
+
+    @property
+    def date_min(self) -> Optional[pd.Timestamp]:
+        return pd.Timestamp(self._dates[0]) if self._dates.size else None
+
+    @property
+    def date_max(self) -> Optional[pd.Timestamp]:
+        return pd.Timestamp(self._dates[-1]) if self._dates.size else None
+
+    def bounds(
+        self, start: Optional[pd.Timestamp], end: Optional[pd.Timestamp]
+    ) -> Tuple[int, int]:
+        """Tìm vị trí [lo, hi) của khoảng ngày bằng tìm kiếm nhị phân."""
+        if DATE_COLUMN not in self.table.column_names or (start is None and end is None):
+            return 0, self.num_rows
+        lo = 0 if start is None else int(
+            np.searchsorted(self._dates, start.to_datetime64(), side="left")
+        )
+        hi = self._dates.size if end is None else int(
+            np.searchsorted(self._dates, end.to_datetime64(), side="right")
+        )
+        return lo, max(lo, hi)
+
+    def _to_frame(
+        self, offset: int, length: int, columns: Optional[Sequence[str]] = None
+    ) -> pd.DataFrame:
+        """Chuyển một lát của bảng sang pandas; chi phí tỷ lệ với độ dài lát × số cột."""
+        table = self.table.slice(offset, length)
+        if columns is not None:
+            table = table.select(list(columns))
+        return table.to_pandas(split_blocks=True)
+
+    def frame(
+        self,
+        start: Optional[pd.Timestamp] = None,
+        end: Optional[pd.Timestamp] = None,
+        limit: Optional[int] = None,
+        columns: Optional[Sequence[str]] = None,
+    ) -> pd.DataFrame:
+        """Lấy các dòng trong khoảng ngày, chỉ giữ `limit` dòng cuối nếu có."""
+        lo, hi = self.bounds(start, end)
+        if limit is not None:
+            lo = max(lo, hi - limit)
+        return self._to_frame(lo, hi - lo, columns)
+
+    def encode_cursor(self, position: int) -> str:
+        """Cursor mờ cho vị trí dòng: (ngày, thứ tự trong ngày) thay vì chỉ số tuyệt đối.
+
+        Cursor vẫn trỏ đúng ngày khi file Arrow được tạo lại với dữ liệu khác.
+        """
+        if position < self._dates.size:
+            date = self._dates[position]
+            first = int(np.searchsorted(self._dates, date, side="left"))
+            key = f"{int(date.view(np.int64))}:{position - first}"
+        else:  # các dòng không có ngày (NaT) nằm sau cùng
+            key = f"-:{position - self._dates.size}"
+        return base64.urlsafe_b64encode(key.encode("ascii")).decode("ascii").rstrip("=")
+
+    def decode_cursor(self, cursor: str) -> int:
+        """Đổi cursor về vị trí dòng; ValueError nếu cursor không hợp lệ."""
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            date_part, offset_part = base64.urlsafe_b64decode(padded).decode("ascii").split(":")
+            offset = int(offset_part)
+            if offset < 0:
+                raise ValueError
+            if date_part == "-":
+                first = self._dates.size
+            else:
+                date = np.datetime64(int(date_part), "ns")
+                first = int(np.searchsorted(self._dates, date, side="left"))
+        except (ValueError, UnicodeDecodeError, binascii.Error) as exc:
+            raise ValueError(f"cursor không hợp lệ: {cursor}") from exc
+        return min(first + offset, self.num_rows)
+
+    def page(
+        self,
+        start: Optional[pd.Timestamp],
+        end: Optional[pd.Timestamp],
+        size: int,
+        cursor: Optional[str] = None,
+        columns: Optional[Sequence[str]] = None,
+    ) -> Tuple[pd.DataFrame, Optional[str]]:
+        """Một trang `size` dòng của khoảng ngày, bắt đầu từ cursor; trả về (trang, cursor kế tiếp)."""
+        lo, hi = self.bounds(start, end)
+        position = lo if cursor is None else max(lo, self.decode_cursor(cursor))
+        stop = min(hi, position + size)
+        frame = self._to_frame(position, max(0, stop - position), columns)
+        return frame, (self.encode_cursor(stop) if stop < hi else None)
+
+    def daily_series(
+        self,
+        start: Optional[pd.Timestamp],
+        end: Optional[pd.Timestamp],
+        value: str,
+        agg: str = "sum",
+        by: Optional[str] = None,
+        filters: Optional[Dict[str, str]] = None,
+    ) -> pd.DataFrame:
+        """Tổng hợp `value` theo ngày (và theo cột `by`) bằng Arrow compute trên lát ngày.
+
+        Chỉ các cột cần thiết được đọc và kết quả là một dòng mỗi (nhóm, ngày),
+        nên pandas chỉ nhận dữ liệu đã thu gọn.
+        """
+        lo, hi = self.bounds(start, end)
+        hi = min(hi, self._dates.size)  # bỏ các dòng không có ngày
+        filters = filters or {}
+        keys = [by, DATE_COLUMN] if by else [DATE_COLUMN]
+        table = self.table.slice(lo, max(0, hi - lo)).select(
+            list(dict.fromkeys([*keys, value, *filters]))
+        )
+        for column, expected in filters.items():
+            array = table.column(column)
+            if pa.types.is_dictionary(array.type):
+                array = array.cast(array.type.value_type)
+            table = table.filter(pc.equal(array, pa.scalar(expected, type=array.type)))
+        grouped = table.group_by(keys).aggregate([(value, agg)])
+        frame = grouped.to_pandas().rename(columns={f"{value}_{agg}": value})
+        return frame.sort_values(keys, kind="stable", ignore_index=True)[[*keys, value]]
+
+    def iter_frames(
+        self,
+        start: Optional[pd.Timestamp],
+        end: Optional[pd.Timestamp],
+        chunk_rows: int,
+    ) -> Iterator[pd.DataFrame]:
+        """Duyệt khoảng ngày theo từng chunk cố định."""
+        lo, hi = self.bounds(start, end)
+        for offset in range(lo, hi, chunk_rows):
+            yield self._to_frame(offset, min(chunk_rows, hi - offset))
+
+    def to_pandas(self) -> pd.DataFrame:
+        """Chuyển toàn bộ bảng sang pandas (tốn bộ nhớ, chỉ dùng khi cần)."""
+        return self._to_frame(0, self.num_rows)
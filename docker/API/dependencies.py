@@ -1,52 +1,141 @@
 """Cached loaders for artifacts and prepared data."""
 from __future__ import annotations
 
+import hashlib
 import json
+import logging
 import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import suppress
 from functools import lru_cache
-from typing import Any, Dict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
 
 import joblib
+import numpy as np
 import pandas as pd
 
-from .API import config
+from . import config
+from . import metrics
+from .batching import MicroBatcher
+from .cache import PredictionCache
+from .dataset import DateIndexedDataset
+from .encoding import CompiledEncoding, code_router, load_compiled
+from .feature_store import HISTORY_DAYS, FeatureStore
+from . import forecasts
+from .features import FEATURE_COLUMNS
+from .partitioned import PartitionedModel, as_model
+from .registry import ModelRegistry, file_digest
+from .rollups import RollupStore
 from .utils import ensure_artifact
 
 MODEL_VARIANT = os.getenv("MODEL_VARIANT", "lightgbm").lower()
-SUPPORTED_MODELS = {"lightgbm", "xgboost"}
+SUPPORTED_MODELS = {"lightgbm", "xgboost", "arima"}
+
+logger = logging.getLogger(__name__)
+
+_version_lock = threading.Lock()
+_active_digests: Dict[Path, str] = {}
+_ready = threading.Event()
+_startup: Dict[str, Any] = {
+    "seconds": None, "stages": {}, "errors": {}, "worker": None, "workers": 0, "threads": None
+}
 
 
 @lru_cache()
-def get_test_dataframe() -> pd.DataFrame:
-    """tải dataframe test đã được chuẩn bị trước từ đĩa."""
+def get_test_dataset() -> DateIndexedDataset:
+    """Mở dataset test dạng Arrow memory-mapped, đã sắp xếp và đánh chỉ mục theo ngày."""
     ensure_artifact(config.TEST_DATA_PATH)
-    df = pd.read_parquet(config.TEST_DATA_PATH)
-    if "date_id" in df.columns:
-        df["date_id"] = pd.to_datetime(df["date_id"], errors="coerce")
-    return df.sort_values("date_id").reset_index(drop=True)
+    return DateIndexedDataset.open(config.TEST_DATA_PATH, config.TEST_DATA_ARROW_PATH)
+
+
+def get_test_dataframe() -> pd.DataFrame:
+    """tải toàn bộ dataframe test đã được chuẩn bị trước từ đĩa."""
+    return get_test_dataset().to_pandas()
+
+
+@lru_cache()
+def get_feature_store() -> FeatureStore:
+    """Khởi tạo feature store online, nạp 28 ngày cuối của dataset test làm lịch sử."""
+    if not config.FEATURE_STORE_SEED:
+        return FeatureStore()
+    dataset = get_test_dataset()
+    if dataset.date_max is None:
+        return FeatureStore()
+    start = dataset.date_max - pd.Timedelta(days=HISTORY_DAYS - 1)
+    return FeatureStore.from_frame(dataset.frame(start=start))
+
+
+@lru_cache()
+def get_rollup_store() -> RollupStore:
+    """Nạp một lần các bảng tổng hợp (cube) đã materialize cho các endpoint /rollups."""
+    return RollupStore.load(config.AGG_DIR)
 
 
 @lru_cache()
-def get_encoding_mapping() -> Dict[str, Any]:
-    """Tải encoding từ đĩa."""
+def get_encoding_mapping() -> Union[CompiledEncoding, Dict[str, Any]]:
+    """Tải encoding từ đĩa: bản biên dịch (biên dịch lại khi JSON đổi) hoặc dict JSON nếu tắt."""
     ensure_artifact(config.ENCODING_PATH)
+    if config.ENCODING_COMPILED:
+        return load_compiled(config.ENCODING_PATH, config.ENCODING_COMPILED_PATH)
     with config.ENCODING_PATH.open("r", encoding="utf-8") as source:
         return json.load(source)
 
 
-@lru_cache()
-def _load_lightgbm_model() -> Any:
-    """Tải mô hình LightGBM từ đĩa."""
-    ensure_artifact(config.LGBM_PATH)
-    return joblib.load(config.LGBM_PATH)
+def bind_encoding(model: Any) -> Any:
+    """Gắn mô hình tra theo id gốc (có encoded_ids: ForecastTable, PartitionedModel) với encoding đang nạp."""
+    if not hasattr(model, "encoded_ids"):
+        return model
+    mapping = get_encoding_mapping()
+    unroutable = model.bind_routes(
+        {column: code_router(mapping, column, names) for column, names in model.encoded_ids().items()}
+    )
+    for column, names in unroutable.items():
+        logger.warning(
+            "%d %s trùng giá trị encoding hoặc không có trong mapping, các dòng của chúng dùng nhánh dự phòng: %s",
+            len(names),
+            column,
+            ", ".join(names[:10]),
+        )
+    return model
 
 
-@lru_cache()
-def _load_xgboost_model() -> Any:
-    """Tải mô hình XGBoost từ đĩa và cấu hình để sử dụng CPU predictor."""
-    ensure_artifact(config.XGB_PATH)
-    model = joblib.load(config.XGB_PATH)
+def _rebind_encoding(model: Any) -> None:
+    try:
+        bind_encoding(model)
+    except Exception:
+        logger.exception("không gắn được %s với encoding mới", type(model).__name__)
+
+
+def set_model_threads(model: Any, threads: int) -> Any:
+    """Đặt số luồng predict của LightGBM/XGBoost (mô hình sklearn, Booster hoặc mô hình phân vùng)."""
+    if threads <= 0:
+        return model
+    if isinstance(model, PartitionedModel):
+        return model.configure(lambda part: set_model_threads(part, threads))
+    with suppress(Exception):
+        if hasattr(model, "set_params"):
+            # LGBMModel.predict đọc n_jobs; XGBModel chuyển n_jobs xuống booster
+            model.set_params(n_jobs=threads)
+        booster = model.get_booster() if hasattr(model, "get_booster") else model
+        if hasattr(booster, "set_param"):
+            booster.set_param({"nthread": threads})
+        elif hasattr(booster, "reset_parameter"):
+            booster.reset_parameter({"num_threads": threads})
+    return model
+
+
+def _load_lightgbm_model(path: Path) -> Any:
+    """Tải mô hình LightGBM từ đĩa (một mô hình hoặc artifact theo phân vùng, xem partitioned.py)."""
+    ensure_artifact(path)
+    return set_model_threads(bind_encoding(as_model(joblib.load(path))), config.MODEL_THREADS)
+
+
+def _use_cpu_predictor(model: Any) -> Any:
+    """Đặt XGBoost dùng CPU predictor (mô hình sklearn hoặc Booster)."""
     with suppress(Exception):
         import xgboost as xgb
 
@@ -65,10 +154,270 @@ def _load_xgboost_model() -> Any:
     return model
 
 
+def _load_xgboost_model(path: Path) -> Any:
+    """Tải mô hình XGBoost từ đĩa và cấu hình để sử dụng CPU predictor."""
+    ensure_artifact(path)
+    model = bind_encoding(as_model(joblib.load(path)))
+    if isinstance(model, PartitionedModel):
+        model.configure(_use_cpu_predictor)
+    else:
+        _use_cpu_predictor(model)
+    return set_model_threads(model, config.MODEL_THREADS)
+
+
+def _load_forecast_table(path: Path) -> Any:
+    """Tải bảng dự báo thống kê (ARIMA/SARIMA/ETS) do NoteBook/Stat_forecast.py ghi ra."""
+    ensure_artifact(path)
+    return bind_encoding(forecasts.as_model(joblib.load(path)))
+
+
+_MODEL_LOADERS: Dict[str, Callable[[Path], Any]] = {
+    "lightgbm": _load_lightgbm_model,
+    "xgboost": _load_xgboost_model,
+    "arima": _load_forecast_table,
+}
+
+
+def _warm_up_model(model: Any) -> None:
+    """Chạy một lần predict trên dữ liệu giả để khởi tạo booster trước khi nhận request."""
+    if config.MODEL_WARMUP_ROWS <= 0:
+        return
+    frame = pd.DataFrame(
+        np.zeros((config.MODEL_WARMUP_ROWS, len(FEATURE_COLUMNS)), dtype=np.float32),
+        columns=FEATURE_COLUMNS,
+    )
+    model.predict(frame)
+
+
+@lru_cache()
+def get_model_registry() -> ModelRegistry:
+    """Registry các phiên bản mô hình trong MODEL_DIR, dùng chung cho cả process."""
+    return ModelRegistry(
+        config.MODEL_DIR,
+        legacy_paths={"lightgbm": config.LGBM_PATH, "xgboost": config.XGB_PATH},
+        loaders=_MODEL_LOADERS,
+        warm_up=_warm_up_model,
+        # kết quả cũ không còn khớp với phiên bản mới
+        on_swap=lambda variant, handle: get_prediction_cache().clear(),
+    )
+
+
+def served_models() -> List[str]:
+    """Danh sách mô hình phục vụ trong process, mô hình mặc định đứng đầu."""
+    names = [MODEL_VARIANT] + [name for name in config.SERVED_MODELS if name != MODEL_VARIANT]
+    return [name for name in names if name in SUPPORTED_MODELS]
+
+
+def _model_versions() -> Dict[tuple, float]:
+    """Nhãn (model, version) của các mô hình đang phục vụ cho gauge forecast_model_info."""
+    models = get_model_registry().status()["models"]
+    return {
+        (variant, entry["version"]): 1.0
+        for variant, entry in models.items()
+        if entry.get("version") is not None
+    }
+
+
+metrics.REGISTRY.register(
+    metrics.GaugeCallback(
+        "forecast_model_info", "Model version currently served.", ("model", "version"), _model_versions
+    )
+)
+
+
+def get_model(variant: Optional[str] = None) -> Any:
+    """Trả về mô hình đang phục vụ theo tên (mặc định MODEL_VARIANT)."""
+    variant = variant or MODEL_VARIANT
+    if variant not in SUPPORTED_MODELS:
+        raise ValueError(f"Unsupported MODEL_VARIANT: {variant}")
+    return get_model_registry().get(variant).model
+
+
+def get_batcher(variant: Optional[str] = None) -> MicroBatcher:
+    """Micro-batcher riêng của từng mô hình, đứng trước lời gọi predict."""
+    return _get_batcher(variant or MODEL_VARIANT)
+
+
+@lru_cache()
+def _get_batcher(variant: str) -> MicroBatcher:
+    return MicroBatcher(
+        lambda features: get_model(variant).predict(features),
+        max_rows=config.BATCH_MAX_ROWS,
+        window_ms=config.BATCH_WINDOW_MS,
+        queue_depth=config.BATCH_QUEUE_DEPTH,
+        timeout_seconds=config.BATCH_TIMEOUT_SECONDS,
+    )
+
+
 @lru_cache()
-def get_model() -> Any:
-    if MODEL_VARIANT not in SUPPORTED_MODELS:
-        raise ValueError(f"Unsupported MODEL_VARIANT: {MODEL_VARIANT}")
-    if MODEL_VARIANT == "lightgbm":
-        return _load_lightgbm_model()
-    return _load_xgboost_model()
+def get_model_executor() -> ThreadPoolExecutor:
+    """Thread pool chạy song song các mô hình của một ensemble trên cùng ma trận đặc trưng."""
+    workers = config.MODEL_POOL_WORKERS or max(1, len(served_models()))
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="model")
+
+
+@lru_cache()
+def get_prediction_cache() -> PredictionCache:
+    """Khởi tạo cache kết quả dự đoán dùng chung."""
+    return PredictionCache(
+        max_entries=config.PREDICTION_CACHE_MAX_ENTRIES,
+        max_bytes=config.PREDICTION_CACHE_MAX_BYTES,
+        ttl_seconds=config.PREDICTION_CACHE_TTL_SECONDS,
+    )
+
+
+def get_artifact_version(variants: Optional[Sequence[str]] = None) -> str:
+    """Phiên bản của các mô hình + encoding được dùng; nạp lại encoding khi file thay đổi."""
+    variants = list(variants or [MODEL_VARIANT])
+    registry = get_model_registry()
+    versions = [registry.get(variant).version for variant in variants]
+    with _version_lock:
+        ensure_artifact(config.ENCODING_PATH)
+        digest = file_digest(config.ENCODING_PATH)
+        previous = _active_digests.get(config.ENCODING_PATH)
+        if previous is not None and previous != digest:
+            # encoding trên đĩa đã đổi: bỏ mapping cũ và mọi kết quả đã cache, tra lại id của các mô hình
+            get_encoding_mapping.cache_clear()
+            get_prediction_cache().clear()
+            registry.configure(_rebind_encoding)
+        _active_digests[config.ENCODING_PATH] = digest
+    token = ":".join(["+".join(variants), *versions, digest])
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()[:16]
+
+
+def preload() -> Dict[str, float]:
+    """Nạp dataset, encoding, feature store và mọi mô hình (chưa tạo luồng nền nào); trả về giây mỗi bước.
+
+    Gọi lần thứ hai là no-op: server pre-fork gọi hàm này ở process cha, các
+    worker được fork dùng lại trang bộ nhớ đã nạp (copy-on-write).
+    """
+    if _startup["seconds"] is not None:
+        return _startup["stages"]
+    started = time.perf_counter()
+    steps: Dict[str, Callable[[], Any]] = {
+        "dataset": get_test_dataset,
+        "encoding": get_encoding_mapping,
+        "feature_store": get_feature_store,
+        "rollups": get_rollup_store,
+    }
+    registry = get_model_registry()
+    for variant in served_models():
+        steps[variant] = lambda variant=variant: registry.get(variant)
+    for name, step in steps.items():
+        step_started = time.perf_counter()
+        try:
+            step()
+        except Exception as exc:  # dịch vụ vẫn chạy được với phần còn lại
+            logger.exception("warm-up %s thất bại", name)
+            _startup["errors"][name] = str(exc)
+        _startup["stages"][name] = round(time.perf_counter() - step_started, 3)
+    _startup["seconds"] = round(time.perf_counter() - started, 3)
+    return _startup["stages"]
+
+
+def warm_up() -> None:
+    """Nạp trước mọi artifact (nếu process cha chưa nạp) rồi bật theo dõi phiên bản."""
+    preload()
+    get_model_registry().start(config.MODEL_POLL_SECONDS)
+    _ready.set()
+
+
+def configure_worker(index: int, threads: int, workers: int) -> None:
+    """Gọi trong worker vừa fork: ghi nhận số thứ tự, đặt số luồng predict, gộp metric qua thư mục chung."""
+    config.MODEL_THREADS = threads
+    _startup["worker"] = index
+    _startup["workers"] = workers
+    _startup["threads"] = threads
+    get_model_registry().configure(lambda model: set_model_threads(model, threads))
+    if config.METRICS_DIR and metrics.REGISTRY.enabled:
+        metrics.REGISTRY.configure_multiprocess(Path(config.METRICS_DIR), index, config.METRICS_FLUSH_SECONDS)
+
+
+def prefork_workers() -> int:
+    """Số worker của server pre-fork chứa process này (0 = uvicorn thường, một process)."""
+    return _startup["workers"]
+
+
+def feature_store_status() -> Dict[str, Any]:
+    """Feature store online có nhận /features/append trong process này không, và lý do nếu không."""
+    if not config.FEATURE_STORE_ONLINE:
+        return {"writable": False, "reason": "FEATURE_STORE_ONLINE=0"}
+    if prefork_workers() > 1:
+        # trạng thái nằm trong bộ nhớ của từng worker: ghi vào một worker làm các worker khác lệch nhau
+        return {
+            "writable": False,
+            "reason": f"{prefork_workers()} worker pre-fork không chia sẻ trạng thái; cần WEB_WORKERS=1",
+        }
+    return {"writable": True, "reason": None}
+
+
+def reload_models() -> List[str]:
+    """Kiểm tra MODEL_DIR và thay các mô hình có phiên bản mới trong process này."""
+    return get_model_registry().refresh(served_models())
+
+
+def broadcast_reload() -> int:
+    """Báo process cha (SIGHUP) để mọi worker cùng nạp lại mô hình; trả về số worker được báo."""
+    if prefork_workers() <= 1:
+        return 0
+    os.kill(os.getppid(), signal.SIGHUP)
+    return prefork_workers()
+
+
+def process_memory() -> Dict[str, int]:
+    """Bộ nhớ của process (byte): rss, pss (chia đều trang dùng chung), shared, private.
+
+    Đọc /proc/self/smaps_rollup (Linux); nơi khác chỉ có rss đỉnh từ getrusage.
+    """
+    fields = {"Rss": "rss", "Pss": "pss", "Shared_Clean": "shared", "Shared_Dirty": "shared",
+              "Private_Clean": "private", "Private_Dirty": "private"}
+    try:
+        with open("/proc/self/smaps_rollup", "r", encoding="ascii") as source:
+            lines = source.read().splitlines()
+    except OSError:
+        import resource
+
+        return {"rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}
+    memory = {"rss": 0, "pss": 0, "shared": 0, "private": 0}
+    for line in lines:
+        name, _, rest = line.partition(":")
+        if name in fields:
+            memory[fields[name]] += int(rest.split()[0]) * 1024
+    return memory
+
+
+metrics.REGISTRY.register(
+    metrics.GaugeCallback(
+        "forecast_process_memory_bytes",
+        "Resident memory of this worker process by kind (rss, pss, shared, private).",
+        ("kind",),
+        lambda: {(kind,): float(value) for kind, value in process_memory().items()},
+    )
+)
+
+
+def mark_ready() -> None:
+    """Bỏ qua warm-up (MODEL_PRELOAD=0): mô hình được tải ở request đầu tiên."""
+    get_model_registry().start(config.MODEL_POLL_SECONDS)
+    _ready.set()
+
+
+def readiness() -> Dict[str, Any]:
+    """Trạng thái sẵn sàng: đã warm-up xong và mô hình mặc định đã được tải."""
+    models = get_model_registry().status()["models"]
+    loaded = models.get(MODEL_VARIANT, {}).get("version") is not None
+    return {
+        "ready": _ready.is_set() and (loaded or not config.MODEL_PRELOAD),
+        "warmed_up": _ready.is_set(),
+        "startup_seconds": _startup["seconds"],
+        "startup_stages": dict(_startup["stages"]),
+        "process": {
+            "pid": os.getpid(),
+            "worker": _startup["worker"],
+            "model_threads": _startup["threads"] or config.MODEL_THREADS or None,
+            "memory": process_memory(),
+        },
+        "models": {name: entry.get("version") for name, entry in models.items()},
+        "feature_store": feature_store_status(),
+        "errors": dict(_startup["errors"]),
+    }
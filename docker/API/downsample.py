@@ -0,0 +1,79 @@
+"""Server-side downsampling of time series for charting (LTTB and bucket means)."""
+from __future__ import annotations
+
+from typing import Tuple
+
+import numpy as np
+
+METHODS = ("lttb", "mean", "none")
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: chọn `points` điểm giữ hình dạng đường.
+
+    Điểm đầu và cuối luôn được giữ. Với mỗi bucket ở giữa, chọn điểm tạo tam
+    giác lớn nhất với điểm đã chọn trước đó và trung bình của bucket kế tiếp.
+    Chi phí O(n); vòng lặp Python chỉ chạy `points` lần.
+    """
+    size = len(x)
+    if points >= size or points < 3:
+        return np.arange(size)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # biên bucket cho n - 2 điểm ở giữa: [edges[i], edges[i + 1])
+    every = (size - 2) / (points - 2)
+    edges = (np.arange(points - 1) * every).astype(np.int64) + 1
+    edges[-1] = size - 1
+    # trung bình mỗi bucket bằng tổng tích lũy, bucket cuối là điểm cuối cùng
+    csum_x = np.concatenate(([0.0], np.cumsum(x)))
+    csum_y = np.concatenate(([0.0], np.cumsum(y)))
+    counts = np.diff(edges)
+    avg_x = np.append((csum_x[edges[1:]] - csum_x[edges[:-1]]) / counts, x[-1])
+    avg_y = np.append((csum_y[edges[1:]] - csum_y[edges[:-1]]) / counts, y[-1])
+
+    selected = np.empty(points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = size - 1
+    anchor = 0
+    for bucket in range(points - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        ax, ay = x[anchor], y[anchor]
+        cx, cy = avg_x[bucket + 1], avg_y[bucket + 1]
+        area = np.abs((ax - cx) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (cy - ay))
+        anchor = lo + int(np.argmax(area))
+        selected[bucket + 1] = anchor
+    return selected
+
+
+def bucket_mean(x: np.ndarray, y: np.ndarray, points: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Chia chuỗi thành `points` bucket liên tiếp (số điểm gần bằng nhau) và lấy trung bình y.
+
+    Mỗi bucket được đại diện bởi x đầu tiên của nó.
+    """
+    size = len(x)
+    if points >= size:
+        return x, np.asarray(y, dtype=np.float64)
+    starts = np.unique(np.linspace(0, size, points, endpoint=False).astype(np.int64))
+    sums = np.add.reduceat(np.asarray(y, dtype=np.float64), starts)
+    counts = np.diff(np.append(starts, size))
+    return x[starts], sums / counts
+
+
+def downsample(
+    x: np.ndarray, y: np.ndarray, points: int, method: str = "lttb"
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Giảm chuỗi (x tăng dần, y số) xuống tối đa `points` điểm; bỏ qua y NaN."""
+    if method not in METHODS:
+        raise ValueError(f"method phải là một trong {', '.join(METHODS)}")
+    y = np.asarray(y, dtype=np.float64)
+    valid = ~np.isnan(y)
+    if not valid.all():
+        x, y = x[valid], y[valid]
+    if method == "none" or len(x) <= points:
+        return x, y
+    if method == "mean":
+        return bucket_mean(x, y, points)
+    # LTTB cần trục x dạng số: ngày được đổi sang int64 nano giây
+    numeric_x = x.view(np.int64) if np.issubdtype(x.dtype, np.datetime64) else x
+    index = lttb_indices(numeric_x, y, points)
+    return x[index], y[index]
@@ -0,0 +1,214 @@
+"""Target encoding compiled from the JSON mapping into memory-mapped NumPy lookup tables."""
+from __future__ import annotations
+
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+if __package__:
+    from .registry import file_digest
+else:  # NoteBook/benchmarks thêm docker/API vào sys.path và import thẳng module này
+    from registry import file_digest
+
+FORMAT_VERSION = 1
+MANIFEST_FILENAME = "manifest.json"
+# cột ngắn hơn ngưỡng này được tra thẳng từng giá trị, không qua factorize
+SMALL_COLUMN_ROWS = 64
+
+
+def _names(values: Iterable[Any]) -> List[Optional[str]]:
+    """Giá trị -> khóa chuỗi như astype("string"); thiếu (None/NaN/NA) -> None."""
+    return [value if isinstance(value, str) else None if pd.isna(value) else str(value) for value in values]
+
+
+class ColumnEncoding:
+    """Từ vựng (mảng chuỗi đã sắp xếp) + giá trị float32 thẳng hàng, kèm giá trị cho category chưa thấy."""
+
+    __slots__ = ("keys", "values", "fallback", "_index")
+
+    def __init__(self, keys: np.ndarray, values: np.ndarray, fallback: float) -> None:
+        self.keys = keys
+        self.values = values
+        self.fallback = float(fallback)
+        # chỉ số chuỗi -> vị trí: dựng một lần khi nạp, từ vựng nhỏ (≤ vài nghìn)
+        self._index = {key: position for position, key in enumerate(keys.tolist())}
+
+    def table(self, names: Iterable[Any], dtype: Any = np.float32) -> np.ndarray:
+        """Giá trị mã hóa của từng tên; tên chưa thấy hoặc thiếu nhận fallback."""
+        positions = np.fromiter((self._index.get(name, -1) for name in names), dtype=np.int64)
+        out = np.full(positions.size, self.fallback, dtype=dtype)
+        known = positions >= 0
+        out[known] = self.values[positions[known]]
+        return out
+
+    def lookup(self, names: Iterable[str]) -> np.ndarray:
+        """Giá trị mã hóa (float32) của từng tên; tên không có trong từ vựng -> NaN (không dùng fallback)."""
+        positions = np.fromiter((self._index.get(name, -1) for name in names), dtype=np.int64)
+        out = np.full(positions.size, np.nan, dtype=np.float32)
+        known = positions >= 0
+        out[known] = self.values[positions[known]]
+        return out
+
+    def encode(self, column: pd.Series, dtype: Any = np.float32) -> np.ndarray:
+        """Mã hóa cả cột bằng mã số: tra bảng trên các giá trị phân biệt rồi take theo mã."""
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            codes = column.cat.codes.to_numpy()
+            uniques = column.cat.categories
+        else:
+            values = column.to_numpy()
+            if values.size <= SMALL_COLUMN_ROWS:
+                return self.table(_names(values), dtype)
+            codes, uniques = pd.factorize(values, use_na_sentinel=True)
+        # thêm một ô fallback ở cuối cho mã -1 (giá trị thiếu)
+        lookup = np.append(self.table(_names(uniques), dtype), np.asarray(self.fallback, dtype=dtype))
+        return lookup[codes]
+
+
+class CompiledEncoding:
+    """Target encoding dạng mảng: mỗi cột phân loại một ColumnEncoding, kèm dấu phiên bản của JSON nguồn."""
+
+    def __init__(self, columns: Dict[str, ColumnEncoding], version: str) -> None:
+        self.columns = columns
+        self.version = version
+
+    def __contains__(self, column: object) -> bool:
+        return column in self.columns
+
+    def encode_column(self, column: str, values: pd.Series, dtype: Any = np.float32) -> np.ndarray:
+        return self.columns[column].encode(values, dtype)
+
+    @classmethod
+    def from_mapping(cls, mapping: Mapping[str, Mapping[str, Optional[float]]], version: str = "") -> "CompiledEncoding":
+        columns: Dict[str, ColumnEncoding] = {}
+        for column, column_mapping in mapping.items():
+            known = {str(key): float(value) for key, value in column_mapping.items() if value is not None}
+            # cùng quy ước với features._fallback_value: trung bình các giá trị đã mã hóa
+            fallback = float(np.mean(list(known.values()))) if known else np.nan
+            keys = np.array(sorted(column_mapping), dtype=str)
+            values = np.array([known.get(key, fallback) for key in keys.tolist()], dtype=np.float32)
+            columns[column] = ColumnEncoding(keys, values, fallback)
+        return cls(columns, version)
+
+    def save(self, target: Path, source: Optional[Path] = None) -> Path:
+        """Ghi <cột>.keys.npy / <cột>.values.npy + manifest.json vào thư mục tạm rồi thay thế target."""
+        staging = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir(parents=True)
+        manifest: Dict[str, Any] = {
+            "format": FORMAT_VERSION,
+            "version": self.version,
+            "source": str(source) if source is not None else None,
+            "columns": {},
+        }
+        for column, encoding in self.columns.items():
+            np.save(staging / f"{column}.keys.npy", encoding.keys)
+            np.save(staging / f"{column}.values.npy", encoding.values)
+            manifest["columns"][column] = {
+                "size": int(encoding.keys.size),
+                "fallback": None if np.isnan(encoding.fallback) else encoding.fallback,
+            }
+        (staging / MANIFEST_FILENAME).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        if target.exists():
+            old = target.with_name(f"{target.name}.{os.getpid()}.old")
+            os.replace(target, old)
+            os.replace(staging, target)
+            shutil.rmtree(old, ignore_errors=True)
+        else:
+            os.replace(staging, target)
+        return target
+
+    @classmethod
+    def open(cls, target: Path) -> "CompiledEncoding":
+        """Mở artifact đã biên dịch; mảng giá trị được memory-map, không đọc cả file vào RAM."""
+        manifest = json.loads((target / MANIFEST_FILENAME).read_text(encoding="utf-8"))
+        if manifest.get("format") != FORMAT_VERSION:
+            raise ValueError(f"{target}: định dạng encoding {manifest.get('format')} không được hỗ trợ")
+        columns = {}
+        for column, info in manifest["columns"].items():
+            fallback = np.nan if info["fallback"] is None else info["fallback"]
+            columns[column] = ColumnEncoding(
+                np.load(target / f"{column}.keys.npy", mmap_mode="r"),
+                np.load(target / f"{column}.values.npy", mmap_mode="r"),
+                fallback,
+            )
+        return cls(columns, manifest["version"])
+
+
+class CodeRouter:
+    """Giá trị đã mã hóa của một cột -> vị trí của id gốc trong `names`.
+
+    Target encoding không đơn ánh: hai id có thể có cùng giá trị float32, và
+    category chưa thấy nhận giá trị fallback. Giá trị không xác định được một
+    id duy nhất (trùng nhau, trùng fallback) hoặc id vắng mặt trong mapping
+    được ghi vào `ambiguous` / `missing`; route() trả -1 cho chúng thay vì
+    chọn hay trộn một id khác.
+    """
+
+    def __init__(self, names: Iterable[str], codes: np.ndarray, fallback: float = np.nan) -> None:
+        self.names = [str(name) for name in names]
+        codes = np.asarray(codes, dtype=np.float32)
+        absent = np.isnan(codes)
+        shared = ~absent & (codes == np.float32(fallback))
+        positions = np.flatnonzero(~absent & ~shared)
+        keys, inverse, counts = np.unique(codes[positions], return_inverse=True, return_counts=True)
+        single = counts[inverse] == 1
+        slots = np.full(keys.size, -1, dtype=np.int64)
+        slots[inverse[single]] = positions[single]
+        self._keys = keys
+        self._slots = slots
+        self.missing = [self.names[index] for index in np.flatnonzero(absent)]
+        self.ambiguous = sorted(
+            self.names[index] for index in np.concatenate([positions[~single], np.flatnonzero(shared)])
+        )
+
+    def route(self, values: np.ndarray) -> np.ndarray:
+        values = np.asarray(values, dtype=np.float32)
+        if not self._keys.size:
+            return np.full(values.shape, -1, dtype=np.int64)
+        slot = np.searchsorted(self._keys, values)
+        slot[slot == self._keys.size] = 0
+        return np.where(self._keys[slot] == values, self._slots[slot], -1)
+
+
+def code_router(mapping: Any, column: str, names: Iterable[Any]) -> CodeRouter:
+    """CodeRouter của `names` theo mapping đang nạp (CompiledEncoding hoặc dict của file JSON)."""
+    names = [str(name) for name in names]
+    if isinstance(mapping, CompiledEncoding):
+        encoding = mapping.columns.get(column)
+        if encoding is None:
+            return CodeRouter(names, np.full(len(names), np.nan, dtype=np.float32))
+        return CodeRouter(names, encoding.lookup(names), encoding.fallback)
+    column_mapping = mapping.get(column) or {}
+    known = [float(value) for value in column_mapping.values() if value is not None]
+    # cùng quy ước với features._fallback_value
+    fallback = float(np.mean(known)) if known else np.nan
+    codes = np.array(
+        [np.nan if column_mapping.get(name) is None else column_mapping[name] for name in names], dtype=np.float32
+    )
+    return CodeRouter(names, codes, fallback)
+
+
+def load_compiled(source: Path, target: Path) -> CompiledEncoding:
+    """Mở bản biên dịch của `source`; biên dịch lại khi chưa có hoặc dấu phiên bản không khớp JSON.
+
+    Không ghi được `target` (vd. thư mục chỉ đọc) thì dùng bản biên dịch trong bộ nhớ.
+    """
+    version = file_digest(source)
+    try:
+        compiled = CompiledEncoding.open(target)
+        if compiled.version == version:
+            return compiled
+    except (FileNotFoundError, ValueError, KeyError, json.JSONDecodeError):
+        pass
+    with source.open("r", encoding="utf-8") as handle:
+        compiled = CompiledEncoding.from_mapping(json.load(handle), version)
+    try:
+        compiled.save(target, source)
+    except OSError:
+        return compiled
+    return CompiledEncoding.open(target)
@@ -0,0 +1,348 @@
+"""Online feature store keeping compact rolling state per item/store series."""
+from __future__ import annotations
+
+import math
+import threading
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .features import EVENT_WINDOW, GROUP_KEYS, LAGS, PRICE_DIFFS, ROLLING_MEAN_WINDOWS
+
+HISTORY_DAYS = max(max(LAGS), max(ROLLING_MEAN_WINDOWS))  # lag dài nhất và cửa sổ rolling dài nhất
+PRICE_DAYS = max(PRICE_DIFFS)  # price_change_7 cần giá của 7 ngày trước
+SERIES_KEYS = GROUP_KEYS
+STATIC_COLUMNS = ("dept_id", "cat_id")
+
+SeriesKey = Tuple[Hashable, Hashable]
+
+
+def _has_event(value: Any) -> int:
+    """Quy ước giống notebook: có event khi event_name khác null/rỗng."""
+    if value is None or value == "":
+        return 0
+    if isinstance(value, float) and math.isnan(value):
+        return 0
+    return 1
+
+
+class SeriesState:
+    """Ring buffer số lượng bán, giá và cờ event kèm các tổng chạy của một chuỗi.
+
+    Mỗi lần thêm một ngày chỉ cập nhật vài ô nhớ, nên cả `push` lẫn
+    `features` đều O(1) bất kể lịch sử dài bao nhiêu.
+    """
+
+    __slots__ = (
+        "units",
+        "prices",
+        "events",
+        "n",
+        "sum_7",
+        "sumsq_7",
+        "sum_28",
+        "event_count",
+        "last_date",
+        "attributes",
+    )
+
+    def __init__(self, attributes: Optional[Dict[str, Any]] = None) -> None:
+        self.units = np.zeros(HISTORY_DAYS, dtype=np.float64)
+        self.prices = np.full(PRICE_DAYS, np.nan, dtype=np.float64)
+        self.events = np.zeros(EVENT_WINDOW - 1, dtype=np.int8)
+        self.n = 0
+        self.sum_7 = 0.0
+        self.sumsq_7 = 0.0
+        self.sum_28 = 0.0
+        self.event_count = 0
+        self.last_date: Optional[pd.Timestamp] = None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+
+    def _units_at(self, lag: int) -> float:
+        return float(self.units[(self.n - lag) % HISTORY_DAYS]) if self.n >= lag else math.nan
+
+    def _price_at(self, lag: int) -> float:
+        return float(self.prices[(self.n - lag) % PRICE_DAYS]) if self.n >= lag else math.nan
+
+    def last_price(self) -> float:
+        """Giá của ngày cuối đã thêm (NaN khi chuỗi chưa có ngày nào)."""
+        return self._price_at(1)
+
+    def push(self, units: float, price: float, has_event: int) -> None:
+        """Thêm một ngày vào cuối chuỗi và cập nhật các tổng chạy."""
+        if self.n >= 7:
+            leaving = self._units_at(7)
+            self.sum_7 -= leaving
+            self.sumsq_7 -= leaving * leaving
+        if self.n >= HISTORY_DAYS:
+            self.sum_28 -= self._units_at(HISTORY_DAYS)
+        self.units[self.n % HISTORY_DAYS] = units
+        self.sum_7 += units
+        self.sumsq_7 += units * units
+        self.sum_28 += units
+
+        self.prices[self.n % PRICE_DAYS] = price
+
+        slot = self.n % (EVENT_WINDOW - 1)
+        if self.n >= EVENT_WINDOW - 1:
+            self.event_count -= int(self.events[slot])
+        self.events[slot] = has_event
+        self.event_count += has_event
+        self.n += 1
+
+    def fill_gap(self, days: int) -> None:
+        """Điền `days` ngày không có bản ghi: 0 đơn vị, giữ giá cuối, không event.
+
+        Chỉ HISTORY_DAYS ngày cuối còn ảnh hưởng tới đặc trưng nên khoảng trống dài hơn bị cắt.
+        """
+        last_price = self.last_price()
+        for _ in range(min(days, HISTORY_DAYS)):
+            self.push(0.0, last_price, 0)
+
+    def features(self, price: float, has_event: int) -> Dict[str, float]:
+        """Tính lag/rolling/price/event cho ngày kế tiếp sau ngày cuối đã thêm."""
+        row = {f"lag_{lag}": self._units_at(lag) for lag in LAGS}
+        if self.n >= 7:
+            variance = max(0.0, (self.sumsq_7 - self.sum_7 * self.sum_7 / 7.0) / 6.0)
+            row["rolling_7"] = self.sum_7 / 7.0
+            row["rolling_std_7"] = math.sqrt(variance)
+        else:
+            row["rolling_7"] = math.nan
+            row["rolling_std_7"] = math.nan
+        row["rolling_28"] = self.sum_28 / HISTORY_DAYS if self.n >= HISTORY_DAYS else math.nan
+        row["price_change_1"] = price - self._price_at(1)
+        row["price_change_7"] = price - self._price_at(7)
+        row["event_window_7"] = (
+            float(self.event_count + has_event) if self.n >= EVENT_WINDOW - 1 else math.nan
+        )
+        return row
+
+
+class SeriesBatch:
+    """Trạng thái của nhiều chuỗi dưới dạng mảng (chuỗi × ngày) để chạy dự báo đệ quy.
+
+    Cùng công thức với SeriesState nhưng mọi chuỗi tiến cùng một bước: cột
+    `(step - k) % 28` của `units` giữ lag_k của mọi chuỗi, nên `push` và
+    `features` chỉ là vài phép toán vector, không tạo DataFrame nào.
+    """
+
+    def __init__(self, keys: List[SeriesKey], states: List[SeriesState]) -> None:
+        self.keys = keys
+        self.attributes = [state.attributes for state in states]
+        self.last_dates = [state.last_date for state in states]
+        # xoay ring buffer của từng chuỗi để phần tử ở cột c ứng với lag (-c mod kích thước)
+        self.units = np.array([np.roll(s.units, -s.n) for s in states], dtype=np.float64).reshape(-1, HISTORY_DAYS)
+        self.prices = np.array([np.roll(s.prices, -s.n) for s in states], dtype=np.float64).reshape(-1, PRICE_DAYS)
+        self.events = np.array(
+            [np.roll(s.events, -s.n) for s in states], dtype=np.int16
+        ).reshape(-1, EVENT_WINDOW - 1)
+        self.n = np.array([s.n for s in states], dtype=np.int64)
+        self.sum_7 = np.array([s.sum_7 for s in states], dtype=np.float64)
+        self.sumsq_7 = np.array([s.sumsq_7 for s in states], dtype=np.float64)
+        self.sum_28 = np.array([s.sum_28 for s in states], dtype=np.float64)
+        self.event_count = np.array([s.event_count for s in states], dtype=np.int64)
+        self.step = 0
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _units_at(self, lag: int) -> np.ndarray:
+        return np.where(self.n >= lag, self.units[:, (self.step - lag) % HISTORY_DAYS], np.nan)
+
+    def _price_at(self, lag: int) -> np.ndarray:
+        return np.where(self.n >= lag, self.prices[:, (self.step - lag) % PRICE_DAYS], np.nan)
+
+    def last_price(self) -> np.ndarray:
+        """Giá của ngày cuối đã thêm của từng chuỗi (NaN khi chuỗi chưa có ngày nào)."""
+        return self._price_at(1)
+
+    def push(self, units: np.ndarray, price: np.ndarray, has_event: np.ndarray) -> None:
+        """Thêm một ngày cho mọi chuỗi, cập nhật ring buffer và tổng chạy tại chỗ."""
+        leaving = np.where(self.n >= 7, self.units[:, (self.step - 7) % HISTORY_DAYS], 0.0)
+        self.sum_7 -= leaving
+        self.sumsq_7 -= leaving * leaving
+        self.sum_28 -= np.where(self.n >= HISTORY_DAYS, self.units[:, self.step % HISTORY_DAYS], 0.0)
+        self.units[:, self.step % HISTORY_DAYS] = units
+        self.sum_7 += units
+        self.sumsq_7 += units * units
+        self.sum_28 += units
+
+        self.prices[:, self.step % PRICE_DAYS] = price
+
+        slot = self.step % (EVENT_WINDOW - 1)
+        self.event_count -= np.where(self.n >= EVENT_WINDOW - 1, self.events[:, slot], 0)
+        self.events[:, slot] = has_event
+        self.event_count += has_event
+        self.n += 1
+        self.step += 1
+
+    def features(self, price: np.ndarray, has_event: np.ndarray) -> Dict[str, np.ndarray]:
+        """Các cột lag/rolling/price/event của ngày kế tiếp cho mọi chuỗi."""
+        row = {f"lag_{lag}": self._units_at(lag) for lag in LAGS}
+        variance = np.maximum(0.0, (self.sumsq_7 - self.sum_7 * self.sum_7 / 7.0) / 6.0)
+        row["rolling_7"] = np.where(self.n >= 7, self.sum_7 / 7.0, np.nan)
+        row["rolling_std_7"] = np.where(self.n >= 7, np.sqrt(variance), np.nan)
+        row["rolling_28"] = np.where(self.n >= HISTORY_DAYS, self.sum_28 / HISTORY_DAYS, np.nan)
+        row["price_change_1"] = price - self._price_at(1)
+        row["price_change_7"] = price - self._price_at(7)
+        row["event_window_7"] = np.where(
+            self.n >= EVENT_WINDOW - 1, (self.event_count + has_event).astype(np.float64), np.nan
+        )
+        return row
+
+
+def calendar_features(date: pd.Timestamp) -> Dict[str, Any]:
+    """Các đặc trưng thời gian suy ra từ ngày (giống notebook huấn luyện)."""
+    return {
+        "day_of_week": date.dayofweek,
+        "day_of_year": date.dayofyear,
+        "month": date.month,
+        "year": date.year,
+        "weekday": date.day_name(),
+    }
+
+
+ParsedRecord = Tuple[SeriesKey, pd.Timestamp, float, float, int, Dict[str, Any]]
+
+
+def _parse_record(index: int, record: Dict[str, Any]) -> ParsedRecord:
+    """Bản ghi của append -> (chuỗi, ngày, units, giá, cờ event, thuộc tính tĩnh); sai -> ValueError."""
+    required = (*SERIES_KEYS, "date_id", "units_sold", "price")
+    missing = [column for column in required if record.get(column) is None]
+    if missing:
+        raise ValueError(f"bản ghi {index}: thiếu {', '.join(missing)}")
+    try:
+        date = pd.Timestamp(record["date_id"]).normalize()
+        units = float(record["units_sold"])
+        price = float(record["price"])
+    except (TypeError, ValueError) as exc:
+        raise ValueError(f"bản ghi {index}: {exc}") from exc
+    if not math.isfinite(units):
+        # NaN trong tổng chạy làm hỏng mọi rolling sau đó của chuỗi
+        raise ValueError(f"bản ghi {index}: units_sold phải là số hữu hạn, nhận {units}")
+    attributes = {column: record[column] for column in STATIC_COLUMNS if record.get(column) is not None}
+    key = (record["store_id"], record["item_id"])
+    return key, date, units, price, _has_event(record.get("event_name")), attributes
+
+
+class FeatureStore:
+    """Kho trạng thái online cho mọi chuỗi item×store."""
+
+    def __init__(self) -> None:
+        self._series: Dict[SeriesKey, SeriesState] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._series)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "FeatureStore":
+        """Khởi tạo trạng thái từ lịch sử bán hàng (chỉ giữ 28 ngày cuối mỗi chuỗi).
+
+        Cùng quy ước với `append`: ngày bị thiếu được điền 0 đơn vị và giữ giá cũ,
+        nên nạp từ frame hay append cùng lịch sử cho cùng đặc trưng. units_sold
+        thiếu (NaN) được coi là 0.
+        """
+        store = cls()
+        required = [*SERIES_KEYS, "date_id", "units_sold", "price"]
+        if df.empty or any(column not in df.columns for column in required):
+            return store
+        history = df.sort_values([*SERIES_KEYS, "date_id"], kind="stable")
+        history = history.groupby(list(SERIES_KEYS), sort=False, observed=True).tail(HISTORY_DAYS)
+        events = history["event_name"] if "event_name" in history.columns else None
+        for key, group in history.groupby(list(SERIES_KEYS), sort=False, observed=True):
+            last = group.iloc[-1]
+            state = SeriesState({col: last[col] for col in STATIC_COLUMNS if col in group.columns})
+            flags = [0] * len(group) if events is None else [_has_event(v) for v in events.loc[group.index]]
+            days = pd.to_datetime(group["date_id"]).dt.normalize().to_numpy(dtype="datetime64[D]")
+            gaps = np.diff(days, prepend=days[:1]).astype(np.int64) - 1
+            units = group["units_sold"].to_numpy(dtype=np.float64, na_value=np.nan)
+            units = np.where(np.isfinite(units), units, 0.0)
+            for gap, value, price, flag in zip(gaps, units, group["price"].to_numpy(dtype=np.float64), flags):
+                if gap > 0:
+                    state.fill_gap(int(gap))
+                state.push(float(value), float(price), flag)
+            state.last_date = pd.Timestamp(days[-1])
+            store._series[tuple(key)] = state
+        return store
+
+    def append(self, records: Iterable[Dict[str, Any]]) -> int:
+        """Thêm doanh số theo ngày; ngày bị thiếu được điền 0 đơn vị và giữ giá cũ.
+
+        Cả lô được kiểm tra trước (đủ trường, ngày của mỗi chuỗi tăng dần và sau
+        ngày cuối đã lưu) rồi mới ghi: lô lỗi không thay đổi trạng thái nào.
+        """
+        rows = [_parse_record(index, record) for index, record in enumerate(records)]
+        with self._lock:
+            last_dates: Dict[SeriesKey, Optional[pd.Timestamp]] = {}
+            for key, date, *_ in rows:
+                state = self._series.get(key)
+                last = last_dates.get(key, None if state is None else state.last_date)
+                if last is not None and date <= last:
+                    raise ValueError(f"{key}: ngày {date.date()} không sau ngày cuối {last.date()}")
+                last_dates[key] = date
+
+            for key, date, units, price, has_event, attributes in rows:
+                state = self._series.get(key)
+                if state is None:
+                    state = self._series[key] = SeriesState()
+                state.attributes.update(attributes)
+                if state.last_date is not None:
+                    state.fill_gap((date - state.last_date).days - 1)
+                state.push(units, price, has_event)
+                state.last_date = date
+        return len(rows)
+
+    def series_keys(self, store_id: Optional[Hashable] = None) -> List[SeriesKey]:
+        """Các chuỗi đã có lịch sử, có thể lọc theo cửa hàng."""
+        with self._lock:
+            return sorted(
+                key
+                for key, state in self._series.items()
+                if state.last_date is not None and (store_id is None or key[0] == store_id)
+            )
+
+    def snapshot(self, keys: Iterable[SeriesKey]) -> SeriesBatch:
+        """Sao chép trạng thái các chuỗi được hỏi thành SeriesBatch (trạng thái online không đổi)."""
+        keys = [tuple(key) for key in keys]
+        with self._lock:
+            states = []
+            for key in keys:
+                state = self._series.get(key)
+                if state is None or state.last_date is None:
+                    raise KeyError(f"Chưa có lịch sử cho chuỗi {key}")
+                states.append(state)
+            return SeriesBatch(keys, states)
+
+    def feature_rows(self, requests: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Trả về vector đặc trưng đầy đủ cho ngày kế tiếp của từng chuỗi được hỏi."""
+        rows: List[Dict[str, Any]] = []
+        with self._lock:
+            for request in requests:
+                key = (request["store_id"], request["item_id"])
+                state = self._series.get(key)
+                if state is None or state.last_date is None:
+                    raise KeyError(f"Chưa có lịch sử cho chuỗi {key}")
+                next_date = state.last_date + pd.Timedelta(days=1)
+                if request.get("date_id") is not None:
+                    date = pd.Timestamp(request["date_id"]).normalize()
+                    if date != next_date:
+                        raise ValueError(
+                            f"{key}: chỉ tính được đặc trưng cho ngày {next_date.date()}"
+                        )
+                event_name = request.get("event_name")
+                price = float(request["price"]) if request.get("price") is not None else state.last_price()
+                row: Dict[str, Any] = {
+                    "store_id": key[0],
+                    "item_id": key[1],
+                    **{col: state.attributes.get(col) for col in STATIC_COLUMNS},
+                    "date_id": next_date,
+                    "price": price,
+                    "event_name": event_name,
+                    "event_type": request.get("event_type"),
+                    **calendar_features(next_date),
+                }
+                row.update(state.features(price, _has_event(event_name)))
+                rows.append(row)
+        return rows
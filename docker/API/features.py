@@ -0,0 +1,333 @@
+"""Vectorised feature pipeline shared by the API and the training notebooks.
+
+The notebooks used to build lag, rolling, price-diff and event-window
+features with several `groupby('item_id')` passes and a Python lambda per
+item. Here every history feature is computed from a single stable sort of
+the frame, using shifted views and cumulative sums over NumPy arrays.
+"""
+from __future__ import annotations
+
+from typing import Any, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+TARGET_COLUMN = "units_sold"
+DATE_COLUMN = "date_id"
+GROUP_KEYS = ("store_id", "item_id")
+
+LAGS = (1, 7, 28)
+ROLLING_MEAN_WINDOWS = (7, 28)
+ROLLING_STD_WINDOW = 7
+PRICE_DIFFS = (1, 7)
+EVENT_WINDOW = 7
+
+CATEGORICAL_COLUMNS = [
+    "store_id",
+    "item_id",
+    "dept_id",
+    "cat_id",
+    "weekday",
+    "event_name",
+    "event_type",
+]
+BASE_FEATURES = [
+    "price",
+    "day_of_week",
+    "day_of_year",
+    "month",
+    "year",
+    "store_id",
+    "item_id",
+    "dept_id",
+    "cat_id",
+    "weekday",
+    "event_name",
+    "event_type",
+]
+LAG_FEATURES = [f"lag_{lag}" for lag in LAGS]
+ROLLING_FEATURES = [f"rolling_{w}" for w in ROLLING_MEAN_WINDOWS] + [
+    f"rolling_std_{ROLLING_STD_WINDOW}"
+]
+PRICE_FEATURES = [f"price_change_{k}" for k in PRICE_DIFFS]
+EVENT_FEATURES = [f"event_window_{EVENT_WINDOW}"]
+HISTORY_FEATURES = LAG_FEATURES + ROLLING_FEATURES + PRICE_FEATURES + EVENT_FEATURES
+FEATURE_COLUMNS = BASE_FEATURES + HISTORY_FEATURES
+
+
+WEEKDAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+# làm mượt của category_encoders.TargetEncoder (mặc định) đã sinh target_encoding_mapping.json
+TARGET_ENCODING_MIN_SAMPLES_LEAF = 20
+TARGET_ENCODING_SMOOTHING = 10.0
+_NS_PER_DAY = 86_400_000_000_000
+
+
+def _day_numbers(dates: pd.Series) -> np.ndarray:
+    """Số ngày kể từ 1970-01-01 (int64); NaT giữ giá trị âm rất lớn của NaT."""
+    values = dates.to_numpy(dtype="datetime64[ns]").view("int64")
+    return np.floor_divide(values, _NS_PER_DAY)
+
+
+def add_time_features(df: pd.DataFrame) -> pd.DataFrame:
+    """Thêm day_of_week/day_of_year (và month/year/weekday nếu thiếu) từ date_id."""
+    dates = pd.to_datetime(df[DATE_COLUMN], errors="coerce")
+    df[DATE_COLUMN] = dates
+    valid = dates.notna().to_numpy()
+    days = _day_numbers(dates)
+    # chỉ tính các trường lịch trên các ngày phân biệt rồi tra bảng theo offset
+    first = int(days[valid].min()) if valid.any() else 0
+    span = int(days[valid].max()) - first + 1 if valid.any() else 1
+    calendar = pd.DatetimeIndex(
+        (np.arange(span, dtype=np.int64) + first) * _NS_PER_DAY
+    )
+    offset = np.where(valid, days - first, 0)
+    fields = {
+        "day_of_week": (calendar.dayofweek.to_numpy(), np.int8),
+        "day_of_year": (calendar.dayofyear.to_numpy(), np.int16),
+        "month": (calendar.month.to_numpy(), np.int8),
+        "year": (calendar.year.to_numpy(), np.int16),
+    }
+    for name, (table, dtype) in fields.items():
+        if name in ("month", "year") and name in df.columns:
+            continue
+        values = table[offset]
+        if valid.all():
+            df[name] = values.astype(dtype)
+        else:
+            df[name] = np.where(valid, values, np.nan).astype(np.float32)
+    if "weekday" not in df.columns:
+        codes = np.where(valid, fields["day_of_week"][0][offset], -1)
+        df["weekday"] = pd.Categorical.from_codes(codes, categories=WEEKDAY_NAMES)
+    return df
+
+
+def _group_order(df: pd.DataFrame, keys: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Thứ tự sắp xếp (chuỗi, ngày) và vị trí của từng dòng trong chuỗi của nó."""
+    n = len(df)
+    days = _day_numbers(df[DATE_COLUMN])
+    series = np.zeros(n, dtype=np.int64)
+    for key in keys:
+        codes, uniques = pd.factorize(df[key], sort=False)
+        series = series * (len(uniques) + 1) + (codes + 1)
+    if n == 0:
+        return np.arange(0), np.arange(0, dtype=np.int32)
+    # ghép (chuỗi, ngày) thành một khóa int64 để chỉ cần một lần argsort;
+    # khóa là duy nhất với dữ liệu hợp lệ nên không cần sắp xếp ổn định
+    first = int(days.min())
+    span = int(days.max()) - first + 1
+    if series.max() < np.iinfo(np.int64).max // max(span, 1):
+        order = np.argsort(series * span + (days - first))
+    else:
+        order = np.lexsort((days, series))
+    sorted_series = series[order]
+    group_start = np.empty(n, dtype=bool)
+    group_start[0] = True
+    group_start[1:] = sorted_series[1:] != sorted_series[:-1]
+    starts = np.flatnonzero(group_start)
+    lengths = np.diff(np.append(starts, n))
+    position = (np.arange(n) - np.repeat(starts, lengths)).astype(np.int32)
+    return order, position
+
+
+def _shift(values: np.ndarray, k: int) -> np.ndarray:
+    """values[i - k] dạng float64; các ô đầu mỗi chuỗi được `emit` đặt NaN."""
+    out = np.full(values.shape[0], np.nan, dtype=np.float64)
+    out[k:] = values[:-k] if k else values
+    return out
+
+
+def _cumsum(values: np.ndarray, dtype: Any) -> np.ndarray:
+    """Tổng tích lũy có số 0 ở đầu: C[i] = values[0] + ... + values[i-1]."""
+    out = np.empty(values.shape[0] + 1, dtype=dtype)
+    out[0] = 0
+    np.cumsum(values, dtype=dtype, out=out[1:])
+    return out
+
+
+def _window_sum(cumsum: np.ndarray, size: int, include_current: bool = False) -> np.ndarray:
+    """Tổng trượt `size` phần tử kết thúc tại i-1 (hoặc tại i); ô chưa đủ cửa sổ bằng 0."""
+    n = cumsum.shape[0] - 1
+    lo = size - 1 if include_current else size
+    out = np.zeros(n, dtype=cumsum.dtype)
+    if n > lo:
+        out[lo:] = cumsum[size : size + n - lo] - cumsum[: n - lo]
+    return out
+
+
+def add_history_features(
+    df: pd.DataFrame,
+    group_keys: Optional[Sequence[str]] = None,
+    dtype: Any = np.float32,
+) -> pd.DataFrame:
+    """Thêm lag/rolling/price-diff/event-window trong một lần sắp xếp duy nhất.
+
+    Định nghĩa giống notebook: lag_k = units(t-k); rolling_w = mean/std của
+    units(t-w..t-1); price_change_k = price(t) - price(t-k); event_window_7 =
+    số ngày có event trong t-6..t. Thứ tự dòng của `df` được giữ nguyên.
+    """
+    keys = [key for key in (group_keys or GROUP_KEYS) if key in df.columns]
+    n = len(df)
+    order, position = _group_order(df, keys)
+
+    def emit(name: str, sorted_values: np.ndarray, first_valid: int) -> None:
+        # trả về thứ tự dòng ban đầu ngay để không giữ nhiều mảng float64 cùng lúc
+        sorted_values[position < first_valid] = np.nan
+        values = np.empty(n, dtype=dtype)
+        values[order] = sorted_values
+        df[name] = values
+
+    if TARGET_COLUMN in df.columns:
+        units = df[TARGET_COLUMN].to_numpy()[order]
+        for lag in LAGS:
+            emit(f"lag_{lag}", _shift(units, lag), lag)
+
+        # số nguyên được cộng dồn bằng int64 nên tổng trượt chính xác tuyệt đối
+        integral = np.issubdtype(units.dtype, np.integer)
+        missing = None
+        if not integral:
+            units = units.astype(np.float64)
+            missing = np.isnan(units)
+            if missing.any():
+                units = np.where(missing, 0.0, units)
+            else:
+                missing = None
+            integral = bool(np.all(units == np.round(units))) and np.abs(units).max(initial=0) < 2**20
+        acc = np.int64 if integral else np.float64
+        csum = _cumsum(units, acc)
+        csq = _cumsum(units.astype(acc) ** 2, acc)
+        cmissing = None if missing is None else _cumsum(missing, np.int32)
+
+        def window_mask(window: int) -> Optional[np.ndarray]:
+            # cửa sổ chứa giá trị thiếu thì trả về NaN giống pandas rolling
+            return None if cmissing is None else _window_sum(cmissing, window) > 0
+
+        # cửa sổ rolling của notebook là shift(1).rolling(w): units(t-w .. t-1)
+        for window in ROLLING_MEAN_WINDOWS:
+            mean = _window_sum(csum, window).astype(np.float64) / window
+            gaps = window_mask(window)
+            if gaps is not None:
+                mean[gaps] = np.nan
+            emit(f"rolling_{window}", mean, window)
+
+        w = ROLLING_STD_WINDOW
+        s1 = _window_sum(csum, w)
+        variance = (w * _window_sum(csq, w) - s1 * s1).astype(np.float64) / (w * (w - 1))
+        std = np.sqrt(np.maximum(variance, 0.0, out=variance), out=variance)
+        gaps = window_mask(w)
+        if gaps is not None:
+            std[gaps] = np.nan
+        emit(f"rolling_std_{w}", std, w)
+        del units, csum, csq, cmissing
+
+    if "price" in df.columns:
+        price = df["price"].to_numpy(dtype=np.float64)[order]
+        for k in PRICE_DIFFS:
+            emit(f"price_change_{k}", price - _shift(price, k), k)
+
+    if "event_name" in df.columns:
+        events = df["event_name"].notna().to_numpy()[order]
+        counts = _window_sum(_cumsum(events, np.int32), EVENT_WINDOW, include_current=True)
+        emit(f"event_window_{EVENT_WINDOW}", counts.astype(np.float64), EVENT_WINDOW - 1)
+
+    return df
+
+
+def build_training_frame(df: pd.DataFrame, dropna: bool = True) -> pd.DataFrame:
+    """Pipeline của notebook huấn luyện: đặc trưng thời gian + lịch sử, bỏ dòng thiếu."""
+    df = add_history_features(add_time_features(df))
+    if dropna:
+        df = df.dropna(subset=HISTORY_FEATURES).reset_index(drop=True)
+    return df
+
+
+def smoothed_target_mean(
+    counts: np.ndarray,
+    sums: np.ndarray,
+    prior: float,
+    min_samples_leaf: int = TARGET_ENCODING_MIN_SAMPLES_LEAF,
+    smoothing: float = TARGET_ENCODING_SMOOTHING,
+) -> np.ndarray:
+    """Target encoding theo từng category, cùng công thức với mapping đã publish.
+
+    Trung bình target của category được kéo về `prior` (trung bình toàn bộ
+    target) theo trọng số sigmoid((count - min_samples_leaf) / smoothing);
+    category chỉ có một dòng nhận `prior`, category không có dòng nào là NaN.
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    sums = np.asarray(sums, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means = sums / counts
+    weight = 1.0 / (1.0 + np.exp(-(counts - min_samples_leaf) / smoothing))
+    encoded = prior * (1.0 - weight) + means * weight
+    encoded[counts == 1] = prior
+    return encoded
+
+
+def _fallback_value(column_mapping: Mapping[str, float]) -> float:
+    """Giá trị dùng cho category chưa thấy khi huấn luyện: trung bình các giá trị đã mã hóa."""
+    values = [float(v) for v in column_mapping.values() if v is not None]
+    return float(np.mean(values)) if values else np.nan
+
+
+def _encode_column(
+    values: pd.Series, column: str, mapping: Mapping[str, Mapping[str, float]], dtype: Any = np.float32
+) -> np.ndarray:
+    """Giá trị target encoding của một cột; category chưa thấy nhận giá trị fallback."""
+    if hasattr(mapping, "encode_column"):
+        return mapping.encode_column(column, values, dtype)
+    column_mapping = mapping[column]
+    keys = values.astype("string").astype(object)
+    encoded = keys.map(column_mapping)
+    return encoded.fillna(_fallback_value(column_mapping)).to_numpy(dtype=dtype)
+
+
+def encode_categoricals(
+    df: pd.DataFrame, mapping: Mapping[str, Mapping[str, float]], dtype: Any = np.float32
+) -> pd.DataFrame:
+    """Thay các cột phân loại bằng giá trị target encoding tương ứng.
+
+    `mapping` là dict của target_encoding_mapping.json, hoặc bảng đã biên dịch
+    (encoding.CompiledEncoding) tra theo mã số thay vì map từng giá trị.
+    """
+    for column in CATEGORICAL_COLUMNS:
+        if column not in df.columns or column not in mapping:
+            continue
+        df[column] = _encode_column(df[column], column, mapping, dtype)
+    return df
+
+
+def _missing_columns(df: pd.DataFrame, columns: List[str]) -> List[str]:
+    return [column for column in columns if column not in df.columns]
+
+
+def build_feature_matrix_for_inference(
+    df: pd.DataFrame, mapping: Mapping[str, Mapping[str, float]]
+) -> pd.DataFrame:
+    """Xây ma trận FEATURE_COLUMNS (float32) từ dữ liệu đã có đặc trưng lịch sử."""
+    frame = df
+    if DATE_COLUMN in frame.columns and _missing_columns(
+        frame, ["day_of_week", "day_of_year", "month", "year", "weekday"]
+    ):
+        frame = add_time_features(df.copy(deep=False))
+    missing = _missing_columns(frame, FEATURE_COLUMNS)
+    if missing:
+        raise KeyError(f"Thiếu các cột đặc trưng: {missing}")
+    # một ma trận float32 (dòng × cột) cấp phát một lần; mỗi cột (int8/int16/float32/category
+    # của dataset gọn) được ép kiểu ngay khi ghi vào, không qua DataFrame hay bản sao float64 trung gian
+    matrix = np.empty((len(frame), len(FEATURE_COLUMNS)), dtype=np.float32)
+    for index, column in enumerate(FEATURE_COLUMNS):
+        values = frame[column]
+        if column in CATEGORICAL_COLUMNS and column in mapping:
+            matrix[:, index] = _encode_column(values, column, mapping)
+        else:
+            matrix[:, index] = values.to_numpy(dtype=np.float32, na_value=np.nan)
+    return pd.DataFrame(matrix, columns=FEATURE_COLUMNS, copy=False)
+
+
+def build_feature_matrix(
+    df: pd.DataFrame, mapping: Mapping[str, Mapping[str, float]]
+) -> Tuple[pd.DataFrame, pd.Series]:
+    """Ma trận đặc trưng kèm cột mục tiêu units_sold."""
+    if TARGET_COLUMN not in df.columns:
+        raise KeyError(f"Thiếu cột mục tiêu: {TARGET_COLUMN}")
+    return build_feature_matrix_for_inference(df, mapping), df[TARGET_COLUMN]
@@ -0,0 +1,141 @@
+"""Precomputed statistical forecasts (ARIMA/SARIMA/ETS) served behind predict()."""
+from __future__ import annotations
+
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+ARTIFACT_KIND = "forecast_table"
+FALLBACK_COLUMN = "lag_7"
+
+
+def _day_numbers(years: np.ndarray, day_of_year: np.ndarray) -> np.ndarray:
+    """(year, day_of_year) -> số ngày kể từ 1970-01-01, cùng quy ước với features._day_numbers."""
+    starts = (years.astype(np.int64) - 1970).astype("datetime64[Y]").astype("datetime64[D]")
+    return starts.astype(np.int64) + day_of_year.astype(np.int64) - 1
+
+
+class ForecastTable:
+    """Bảng dự báo (chuỗi × horizon) được tra theo cửa hàng, sản phẩm và ngày của từng dòng.
+
+    Chuỗi được khóa theo id gốc (store_id, item_id). Ma trận đặc trưng của API
+    đã được target encoding, nên trước khi predict bảng phải được gắn với
+    encoding đang nạp (`bind_routes`, dependencies làm khi nạp và khi encoding
+    đổi): giá trị mã hóa của dòng được đổi ngược về id gốc. Giá trị trùng
+    nhau giữa nhiều id không xác định được chuỗi; các dòng đó, cùng dòng của
+    chuỗi lạ hoặc ngày ngoài horizon, nhận seasonal naive qua lag_7.
+    """
+
+    def __init__(
+        self,
+        feature_columns: Sequence[str],
+        store_ids: Sequence[str],
+        item_ids: Sequence[str],
+        start_day: int,
+        values: np.ndarray,
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.feature_columns = list(feature_columns)
+        self.metadata = dict(metadata or {})
+        self.start_day = int(start_day)
+        self.values = np.asarray(values, dtype=np.float32)
+        stores = np.asarray([str(store) for store in store_ids], dtype=object)
+        items = np.asarray([str(item) for item in item_ids], dtype=object)
+        if self.values.ndim != 2 or self.values.shape[0] != stores.size or stores.size != items.size:
+            raise ValueError("store_ids, item_ids và values phải có cùng số chuỗi")
+        self._position = {
+            name: self.feature_columns.index(name)
+            for name in ("store_id", "item_id", "year", "day_of_year", FALLBACK_COLUMN)
+        }
+        store_keys, store_slot = np.unique(stores, return_inverse=True)
+        item_keys, item_slot = np.unique(items, return_inverse=True)
+        self.stores: List[str] = store_keys.tolist()
+        self.items: List[str] = item_keys.tolist()
+        # (cửa hàng, sản phẩm) -> dòng của values; -1 = không có chuỗi
+        self._series = np.full((len(self.stores), len(self.items)), -1, dtype=np.int64)
+        self._series[store_slot, item_slot] = np.arange(stores.size)
+        if np.count_nonzero(self._series >= 0) != stores.size:
+            raise ValueError("có chuỗi (store_id, item_id) bị lặp")
+        self._raw = {"store_ids": stores.tolist(), "item_ids": items.tolist()}
+        self._routers: Optional[Tuple[Any, Any]] = None
+
+    def encoded_ids(self) -> Dict[str, List[str]]:
+        """Các id gốc cần đổi sang giá trị mã hóa để tra bảng, theo cột."""
+        return {"store_id": self.stores, "item_id": self.items}
+
+    def bind_routes(self, routers: Mapping[str, Any]) -> Dict[str, List[str]]:
+        """Gắn CodeRouter (encoding.code_router) của store_id/item_id; trả về id không tra được."""
+        store, item = routers["store_id"], routers["item_id"]
+        if store.names != self.stores or item.names != self.items:
+            raise ValueError("CodeRouter không khớp danh sách id của bảng dự báo")
+        # gán một lần: request đang chạy thấy cặp router cũ hoặc mới, không lẫn
+        self._routers = (store, item)
+        return {
+            column: router.ambiguous + router.missing
+            for column, router in routers.items()
+            if router.ambiguous or router.missing
+        }
+
+    @property
+    def horizon(self) -> int:
+        return int(self.values.shape[1])
+
+    def predict(self, features: Any) -> np.ndarray:
+        if self._routers is None:
+            raise RuntimeError("ForecastTable chưa được gắn với encoding (bind_routes)")
+        store_router, item_router = self._routers
+        matrix = (
+            features.to_numpy(dtype=np.float32)
+            if isinstance(features, pd.DataFrame)
+            else np.asarray(features, dtype=np.float32)
+        )
+        column = {name: matrix[:, index] for name, index in self._position.items()}
+        out = np.nan_to_num(column[FALLBACK_COLUMN].astype(np.float64), nan=0.0)
+        if not self.values.shape[0] or not len(matrix):
+            return out
+        store = store_router.route(column["store_id"])
+        item = item_router.route(column["item_id"])
+        series = np.full(len(matrix), -1, dtype=np.int64)
+        known = (store >= 0) & (item >= 0)
+        series[known] = self._series[store[known], item[known]]
+        days = _day_numbers(
+            np.nan_to_num(column["year"], nan=1970), np.nan_to_num(column["day_of_year"], nan=1)
+        )
+        step = days - self.start_day
+        hit = (series >= 0) & (step >= 0) & (step < self.horizon)
+        out[hit] = self.values[series[hit], step[hit]]
+        return out
+
+    def to_artifact(self) -> Dict[str, Any]:
+        return {
+            "kind": ARTIFACT_KIND,
+            "feature_columns": self.feature_columns,
+            "start_day": self.start_day,
+            **self._raw,
+            "values": self.values,
+            "metadata": self.metadata,
+        }
+
+    @classmethod
+    def from_artifact(cls, artifact: Mapping[str, Any]) -> "ForecastTable":
+        if "store_ids" not in artifact:
+            # bản đầu khóa chuỗi theo giá trị mã hóa: không tra ngược được id gốc
+            raise ValueError("artifact arima khóa theo giá trị encoding; chạy lại NoteBook/Stat_forecast.py")
+        return cls(
+            artifact["feature_columns"],
+            artifact["store_ids"],
+            artifact["item_ids"],
+            artifact["start_day"],
+            artifact["values"],
+            artifact.get("metadata"),
+        )
+
+
+def as_model(loaded: Any) -> ForecastTable:
+    """Đối tượng đọc từ model.joblib -> ForecastTable."""
+    if isinstance(loaded, ForecastTable):
+        return loaded
+    if isinstance(loaded, Mapping) and loaded.get("kind") == ARTIFACT_KIND:
+        return ForecastTable.from_artifact(loaded)
+    raise ValueError(f"artifact không phải {ARTIFACT_KIND}")
@@ -0,0 +1,377 @@
+"""In-process latency histograms and counters rendered in Prometheus text format."""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from . import config
+
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+ROW_BUCKETS = (1, 10, 50, 100, 500, 1_000, 5_000, 10_000, 50_000, 100_000, 1_000_000)
+
+LabelValues = Tuple[str, ...]
+_INF = 'le="+Inf"'
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Histogram với bucket cố định; mỗi lần observe chỉ là một bisect + vài phép cộng."""
+
+    def __init__(
+        self, name: str, help_text: str, labelnames: Sequence[str], buckets: Sequence[float]
+    ) -> None:
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[LabelValues, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # [count theo từng bucket..., +Inf, sum]
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def collect(self) -> Dict[LabelValues, List[float]]:
+        with self._lock:
+            return {labels: list(series) for labels, series in self._series.items()}
+
+    @staticmethod
+    def merge(parts: Sequence[Dict[LabelValues, List[float]]]) -> Dict[LabelValues, List[float]]:
+        """Cộng histogram của nhiều worker theo từng nhãn (cùng bucket vì cùng mã)."""
+        merged: Dict[LabelValues, List[float]] = {}
+        for part in parts:
+            for labels, series in part.items():
+                current = merged.get(labels)
+                merged[labels] = list(series) if current is None else [a + b for a, b in zip(current, series)]
+        return merged
+
+    def render(self, samples: Optional[Dict[LabelValues, List[float]]] = None) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        snapshot = self.collect() if samples is None else samples
+        for labels, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = f'le="{_number(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            cumulative += series[len(self.buckets)]
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, _INF)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Counter:
+    """Bộ đếm tăng dần theo nhãn."""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str]) -> None:
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self) -> Dict[LabelValues, float]:
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def merge(parts: Sequence[Dict[LabelValues, float]]) -> Dict[LabelValues, float]:
+        merged: Dict[LabelValues, float] = {}
+        for part in parts:
+            for labels, value in part.items():
+                merged[labels] = merged.get(labels, 0) + value
+        return merged
+
+    def render(self, samples: Optional[Dict[LabelValues, float]] = None) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        snapshot = self.collect() if samples is None else samples
+        for labels, value in sorted(snapshot.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class GaugeCallback:
+    """Gauge được đọc lúc scrape từ một hàm trả về {nhãn: giá trị}."""
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str],
+        collect: Callable[[], Dict[LabelValues, float]],
+    ) -> None:
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._collect = collect
+
+    def collect(self) -> Dict[LabelValues, float]:
+        try:
+            return self._collect()
+        except Exception:  # scrape không bao giờ được làm hỏng /metrics
+            return {}
+
+    @staticmethod
+    def merge(parts: Sequence[Dict[LabelValues, float]]) -> Dict[LabelValues, float]:
+        # gauge không cộng được giữa các worker: nhãn đã có thêm số worker (xem MetricsRegistry)
+        merged: Dict[LabelValues, float] = {}
+        for part in parts:
+            merged.update(part)
+        return merged
+
+    def render(self, samples: Optional[Dict[LabelValues, float]] = None) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        values = self.collect() if samples is None else samples
+        labelnames = self.labelnames if samples is None else self.labelnames + ("worker",)
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Tập các metric của process, xuất ra dạng text cho Prometheus.
+
+    Ở server pre-fork mỗi worker có bộ đếm riêng và scrape rơi vào một worker
+    bất kỳ. Khi có `directory` (multiprocess), mỗi worker ghi ảnh chụp metric
+    của mình vào <directory>/<pid>.json (lúc scrape và định kỳ), worker nhận
+    scrape gộp mọi file: counter và histogram được cộng, gauge mang thêm nhãn
+    `worker`. File của worker đã thoát được giữ lại (bỏ gauge) để tổng các
+    counter không giảm khi worker được fork lại.
+    """
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self._metrics: List[object] = []
+        self.directory: Optional[Path] = None
+        self.worker: Optional[int] = None
+        self._flusher: Optional[threading.Thread] = None
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "pid": os.getpid(),
+            "worker": self.worker,
+            "metrics": {
+                metric.name: [[list(labels), value] for labels, value in metric.collect().items()]
+                for metric in self._metrics
+            },
+        }
+
+    def flush(self) -> None:
+        """Ghi ảnh chụp của process này vào thư mục multiprocess (ghi nguyên tử)."""
+        if self.directory is None:
+            return
+        path = self.directory / f"{os.getpid()}.json"
+        tmp = path.with_name(f".{path.name}.tmp")
+        tmp.write_text(json.dumps(self.snapshot()), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def configure_multiprocess(self, directory: Path, worker: int, interval_seconds: float) -> None:
+        """Gọi trong worker sau khi fork: bật chế độ gộp qua thư mục và luồng ghi định kỳ."""
+        self.directory = Path(directory)
+        self.worker = worker
+        self.flush()
+        if interval_seconds <= 0 or self._flusher is not None:
+            return
+
+        def _loop() -> None:
+            while True:
+                time.sleep(interval_seconds)
+                try:
+                    self.flush()
+                except OSError:
+                    pass
+
+        self._flusher = threading.Thread(target=_loop, name="metrics-flush", daemon=True)
+        self._flusher.start()
+
+    def _snapshots(self) -> List[Dict[str, Any]]:
+        self.flush()
+        snapshots = []
+        for path in sorted(self.directory.glob("*.json")):
+            try:
+                snapshots.append(json.loads(path.read_text(encoding="utf-8")))
+            except (OSError, ValueError):  # file bị xóa/ghi dở giữa chừng: bỏ qua lần scrape này
+                continue
+        return snapshots
+
+    def render(self) -> str:
+        lines: List[str] = []
+        if self.directory is None:
+            for metric in self._metrics:
+                lines.extend(metric.render())
+            return "\n".join(lines) + "\n"
+        snapshots = self._snapshots()
+        for metric in self._metrics:
+            parts = []
+            for snapshot in snapshots:
+                samples = snapshot["metrics"].get(metric.name, [])
+                if isinstance(metric, GaugeCallback):
+                    if snapshot.get("retired"):
+                        continue
+                    worker = str(snapshot.get("worker"))
+                    parts.append({(*labels, worker): value for labels, value in samples})
+                else:
+                    parts.append({tuple(labels): value for labels, value in samples})
+            lines.extend(metric.render(metric.merge(parts)))
+        return "\n".join(lines) + "\n"
+
+
+def retire(directory: Path, pid: int) -> None:
+    """Process cha gọi khi worker `pid` thoát: giữ counter/histogram cuối cùng, bỏ gauge của nó."""
+    path = Path(directory) / f"{pid}.json"
+    try:
+        snapshot = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return
+    snapshot["retired"] = True
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(json.dumps(snapshot), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+REGISTRY = MetricsRegistry(enabled=config.METRICS_ENABLED)
+
+STAGE_SECONDS = REGISTRY.register(
+    Histogram(
+        "forecast_stage_seconds",
+        "Latency of each request stage (select, features, predict, serialize).",
+        ("endpoint", "stage"),
+        LATENCY_BUCKETS,
+    )
+)
+REQUEST_SECONDS = REGISTRY.register(
+    Histogram(
+        "forecast_request_seconds",
+        "Handler latency per endpoint and response status, excluding network I/O.",
+        ("endpoint", "status"),
+        LATENCY_BUCKETS,
+    )
+)
+MODEL_SECONDS = REGISTRY.register(
+    Histogram(
+        "forecast_model_predict_seconds",
+        "Model predict latency per model, including micro-batch queueing.",
+        ("model",),
+        LATENCY_BUCKETS,
+    )
+)
+ROWS_PER_REQUEST = REGISTRY.register(
+    Histogram("forecast_rows_per_request", "Rows predicted per request.", ("endpoint",), ROW_BUCKETS)
+)
+CACHE_REQUESTS = REGISTRY.register(
+    Counter("forecast_prediction_cache_total", "Prediction cache lookups by result.", ("result",))
+)
+
+
+class RequestTimer:
+    """Đo thời gian từng giai đoạn của một request và ghi vào histogram chung."""
+
+    __slots__ = ("endpoint", "started", "stages", "rows", "status", "finished")
+
+    def __init__(self, endpoint: str) -> None:
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.rows: Optional[int] = None
+        # mã lỗi gặp sau khi response đã bắt đầu (stream /predict/bulk), ưu tiên hơn mã HTTP đã gửi
+        self.status: Optional[int] = None
+        self.finished = False
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+        if REGISTRY.enabled:
+            STAGE_SECONDS.observe(seconds, self.endpoint, name)
+
+    def finish(self, status: int) -> float:
+        """Ghi tổng thời gian (và số dòng) của request theo mã trạng thái, một lần duy nhất."""
+        elapsed = time.perf_counter() - self.started
+        if self.finished:
+            return elapsed
+        self.finished = True
+        if REGISTRY.enabled:
+            REQUEST_SECONDS.observe(elapsed, self.endpoint, str(self.status or status))
+            if self.rows is not None:
+                ROWS_PER_REQUEST.observe(self.rows, self.endpoint)
+        return elapsed
+
+    def server_timing(self) -> str:
+        """Giá trị header Server-Timing (mili giây) cho các giai đoạn đã đo."""
+        parts = [f"{name};dur={seconds * 1000.0:.3f}" for name, seconds in self.stages.items()]
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000.0:.3f}")
+        return ", ".join(parts)
+
+
+class RequestMetricsMiddleware:
+    """Middleware ASGI: đo mọi request tới `endpoints`, kể cả 4xx/5xx và lỗi không bắt.
+
+    Timer được đặt vào `request.state.timer` trước khi route (và dependency đọc
+    body) chạy, nên lỗi 400/409/422/503 vẫn được ghi cùng mã trạng thái. Request
+    ghi khi response kết thúc: với stream là lúc gửi xong chunk cuối.
+    """
+
+    def __init__(self, app: Callable[..., Awaitable[None]], endpoints: Iterable[str]) -> None:
+        self.app = app
+        self.endpoints = frozenset(endpoints)
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable[..., Any], send: Callable[..., Any]) -> None:
+        if scope["type"] != "http" or scope["path"] not in self.endpoints:
+            await self.app(scope, receive, send)
+            return
+        timer = scope.setdefault("state", {})["timer"] = RequestTimer(scope["path"])
+        status = 500  # lỗi trước khi gửi header: ServerErrorMiddleware trả 500
+
+        async def _send(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            timer.finish(status)
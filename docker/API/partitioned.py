@@ -0,0 +1,131 @@
+"""Per-store / per-dept models served behind a single predict()."""
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+ARTIFACT_KIND = "partitioned"
+
+
+class PartitionedModel:
+    """Định tuyến từng dòng tới mô hình của phân vùng (cửa hàng, ngành hàng) của nó.
+
+    Ma trận đặc trưng của API đã được target encoding, nên phân vùng của một
+    dòng được nhận ra qua giá trị đã mã hóa của cột phân vùng (mỗi cửa hàng một
+    giá trị riêng). `codes` giữ id gốc -> giá trị mã hóa lúc huấn luyện và chỉ
+    dùng khi chưa gắn encoding; trong API, dependencies gắn mô hình với encoding
+    đang nạp (`bind_routes`, khi nạp và khi encoding đổi). Phân vùng mà encoding
+    không phân biệt được (thiếu hoặc trùng giá trị mã hóa) được bind_routes trả
+    về để cảnh báo; dòng của chúng, như dòng thuộc phân vùng không có mô hình
+    (vd. cửa hàng mới), nhận trung bình dự đoán của mọi mô hình.
+
+    Artifact trên đĩa là một dict thuần (xem `to_artifact`), chỉ chứa đối tượng
+    của LightGBM/XGBoost, nên unpickle không cần import module huấn luyện.
+    """
+
+    def __init__(
+        self,
+        column: str,
+        feature_columns: Sequence[str],
+        models: Mapping[str, Any],
+        codes: Mapping[str, float],
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        missing = sorted(name for name in models if codes.get(name) is None)
+        if missing:
+            raise ValueError(f"không có giá trị mã hóa cho {column}: {', '.join(missing[:5])}")
+        self.column = column
+        self.feature_columns = list(feature_columns)
+        self.position = self.feature_columns.index(column)
+        self.models = dict(models)
+        self.codes = {name: float(codes[name]) for name in self.models}
+        self.metadata = dict(metadata or {})
+        names = sorted(self.models, key=lambda name: self.codes[name])
+        keys = np.array([self.codes[name] for name in names], dtype=np.float32)
+        if np.unique(keys).size != keys.size:
+            raise ValueError(f"hai phân vùng {column} có cùng giá trị mã hóa; không thể định tuyến")
+        self._keys = keys
+        # (hàm giá trị mã hóa -> vị trí, mô hình theo vị trí)
+        self._routing: Tuple[Callable[[np.ndarray], np.ndarray], List[Any]] = (
+            self._training_route,
+            [self.models[name] for name in names],
+        )
+
+    def _training_route(self, values: np.ndarray) -> np.ndarray:
+        slot = np.searchsorted(self._keys, values)
+        slot[slot == self._keys.size] = 0
+        return np.where(self._keys[slot] == values, slot, -1)
+
+    def encoded_ids(self) -> Dict[str, List[str]]:
+        """Id gốc của các phân vùng cần đổi sang giá trị mã hóa để định tuyến."""
+        return {self.column: sorted(self.models)}
+
+    def bind_routes(self, routers: Mapping[str, Any]) -> Dict[str, List[str]]:
+        """Định tuyến theo CodeRouter (encoding.code_router) của encoding đang nạp.
+
+        Trả về các phân vùng vắng mặt trong mapping hoặc trùng giá trị mã hóa với
+        phân vùng khác; router trả -1 cho chúng nên dòng của chúng dùng nhánh dự phòng.
+        """
+        router = routers[self.column]
+        names = sorted(self.models)
+        if router.names != names:
+            raise ValueError(f"CodeRouter của {self.column} không khớp các phân vùng của mô hình")
+        # gán một lần: request đang chạy thấy bộ định tuyến cũ hoặc mới, không lẫn
+        self._routing = (router.route, [self.models[name] for name in names])
+        unroutable = router.missing + router.ambiguous
+        return {self.column: unroutable} if unroutable else {}
+
+    def predict(self, features: Any) -> np.ndarray:
+        route, ordered = self._routing
+        frame = features if isinstance(features, pd.DataFrame) else pd.DataFrame(
+            np.asarray(features), columns=self.feature_columns
+        )
+        routed = route(frame.iloc[:, self.position].to_numpy(dtype=np.float32))
+        out = np.empty(len(frame), dtype=np.float64)
+        order = np.argsort(routed, kind="stable")
+        bounds = np.flatnonzero(np.diff(routed[order])) + 1
+        for rows in np.split(order, bounds):
+            if rows.size == 0:
+                continue
+            part = frame.iloc[rows]
+            target = int(routed[rows[0]])
+            if target >= 0:
+                out[rows] = ordered[target].predict(part)
+            else:
+                out[rows] = np.mean([model.predict(part) for model in ordered], axis=0)
+        return out
+
+    def configure(self, apply: Callable[[Any], Any]) -> "PartitionedModel":
+        """Áp cùng một bước cấu hình (vd. CPU predictor của XGBoost) lên từng mô hình con."""
+        for model in self.models.values():
+            apply(model)
+        return self
+
+    def to_artifact(self) -> Dict[str, Any]:
+        return {
+            "kind": ARTIFACT_KIND,
+            "column": self.column,
+            "feature_columns": self.feature_columns,
+            "models": self.models,
+            "codes": self.codes,
+            "metadata": self.metadata,
+        }
+
+    @classmethod
+    def from_artifact(cls, artifact: Mapping[str, Any]) -> "PartitionedModel":
+        return cls(
+            artifact["column"],
+            artifact["feature_columns"],
+            artifact["models"],
+            artifact["codes"],
+            artifact.get("metadata"),
+        )
+
+
+def as_model(loaded: Any) -> Any:
+    """Đối tượng đọc từ model.joblib -> mô hình có predict (dict phân vùng được bọc lại)."""
+    if isinstance(loaded, Mapping) and loaded.get("kind") == ARTIFACT_KIND:
+        return PartitionedModel.from_artifact(loaded)
+    return loaded
@@ -0,0 +1,89 @@
+"""Multi-day recursive forecasts driven by the online feature store state."""
+from __future__ import annotations
+
+from typing import Callable, Dict, Mapping, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .feature_store import STATIC_COLUMNS, SeriesBatch, _has_event
+from .features import DATE_COLUMN, FEATURE_COLUMNS, HISTORY_FEATURES, add_time_features, encode_categoricals
+
+CALENDAR_COLUMNS = ["day_of_week", "day_of_year", "month", "year", "weekday", "event_name", "event_type"]
+_POSITION = {column: index for index, column in enumerate(FEATURE_COLUMNS)}
+
+
+def _calendar_table(
+    days: np.ndarray, events: Mapping[pd.Timestamp, Tuple[Optional[str], Optional[str]]], mapping: Mapping
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Các cột lịch đã mã hóa (ngày × CALENDAR_COLUMNS) cho mỗi ngày phân biệt, kèm cờ event."""
+    dates = pd.to_datetime(days, unit="D")
+    names = [events.get(date, (None, None)) for date in dates]
+    frame = pd.DataFrame(
+        {
+            DATE_COLUMN: dates,
+            "event_name": [name for name, _ in names],
+            "event_type": [kind for _, kind in names],
+        }
+    )
+    frame = encode_categoricals(add_time_features(frame), mapping)
+    flags = np.array([_has_event(name) for name, _ in names], dtype=np.int16)
+    return frame[CALENDAR_COLUMNS].to_numpy(dtype=np.float32), flags
+
+
+def recursive_forecast(
+    batch: SeriesBatch,
+    horizon: int,
+    predict: Callable[[pd.DataFrame], np.ndarray],
+    mapping: Mapping,
+    prices: Optional[np.ndarray] = None,
+    events: Optional[Mapping[pd.Timestamp, Tuple[Optional[str], Optional[str]]]] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Dự báo `horizon` ngày cho mọi chuỗi của batch, mỗi bước một lần predict cho cả batch.
+
+    Dự đoán của ngày t được đưa lại vào ring buffer của batch làm units_sold,
+    nên lag/rolling của ngày t+1 được cập nhật tại chỗ. Ma trận đặc trưng được
+    cấp phát một lần; mỗi bước chỉ ghi đè các cột lịch và lịch sử. Giá mặc định
+    giữ nguyên giá của ngày cuối. Trả về (ngày datetime64[D], dự đoán), cùng kích
+    thước chuỗi × horizon.
+    """
+    size = len(batch)
+    first = np.array(
+        [date.normalize().value // 86_400_000_000_000 + 1 for date in batch.last_dates], dtype=np.int64
+    )
+    if prices is None:
+        prices = batch.last_price()
+    prices = np.asarray(prices, dtype=np.float64)
+    # các cột cố định (store/item/dept/cat, giá) mã hóa một lần, đúng như build_feature_matrix_for_inference
+    static = pd.DataFrame(
+        {
+            "store_id": [key[0] for key in batch.keys],
+            "item_id": [key[1] for key in batch.keys],
+            **{col: [attrs.get(col) for attrs in batch.attributes] for col in STATIC_COLUMNS},
+        }
+    )
+    static = encode_categoricals(static, mapping)
+    matrix = np.empty((size, len(FEATURE_COLUMNS)), dtype=np.float32)
+    for column in static.columns:
+        matrix[:, _POSITION[column]] = static[column].to_numpy(dtype=np.float32)
+    matrix[:, _POSITION["price"]] = prices
+
+    days = first[:, None] + np.arange(horizon)
+    unique_days, day_index = np.unique(days, return_inverse=True)
+    day_index = day_index.reshape(days.shape)
+    calendar, flags = _calendar_table(unique_days, events or {}, mapping)
+    calendar_positions = [_POSITION[column] for column in CALENDAR_COLUMNS]
+    history_positions = [_POSITION[column] for column in HISTORY_FEATURES]
+
+    out = np.empty((size, horizon), dtype=np.float64)
+    for step in range(horizon):
+        today = day_index[:, step]
+        has_event = flags[today]
+        matrix[:, calendar_positions] = calendar[today]
+        history: Dict[str, np.ndarray] = batch.features(prices, has_event)
+        matrix[:, history_positions] = np.column_stack([history[column] for column in HISTORY_FEATURES])
+        predictions = np.asarray(predict(pd.DataFrame(matrix, columns=FEATURE_COLUMNS)), dtype=np.float64)
+        # doanh số không âm: dự đoán âm của mô hình không được đưa vào lag
+        out[:, step] = np.maximum(predictions, 0.0)
+        batch.push(out[:, step], prices, has_event)
+    return days.astype("datetime64[D]"), out
@@ -0,0 +1,234 @@
+"""Versioned model registry with background loading, warm-up and atomic swap."""
+from __future__ import annotations
+
+import hashlib
+import logging
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MODEL_FILENAME = "model.joblib"
+CURRENT_FILENAME = "CURRENT"
+
+_digest_lock = threading.Lock()
+_file_digests: Dict[Path, Tuple[Tuple[int, int], str]] = {}
+
+
+def file_digest(path: Path) -> str:
+    """Băm SHA-256 nội dung file, chỉ băm lại khi mtime/kích thước thay đổi."""
+    stat = path.stat()
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _digest_lock:
+        cached = _file_digests.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    digest = hashlib.sha256()
+    with path.open("rb") as source:
+        for block in iter(lambda: source.read(1 << 20), b""):
+            digest.update(block)
+    with _digest_lock:
+        _file_digests[path] = (signature, digest.hexdigest())
+    return digest.hexdigest()
+
+
+def _version_key(name: str) -> List[Any]:
+    """Sắp xếp tự nhiên: v2 < v10, 2024-01-02 < 2024-01-10."""
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", name)]
+
+
+class ModelHandle:
+    """Một phiên bản mô hình đã tải và warm-up, không thay đổi sau khi tạo."""
+
+    __slots__ = ("variant", "version", "path", "model", "loaded_at", "load_ms", "warmup_ms")
+
+    def __init__(
+        self,
+        variant: str,
+        version: str,
+        path: Path,
+        model: Any,
+        load_ms: float,
+        warmup_ms: float,
+    ) -> None:
+        self.variant = variant
+        self.version = version
+        self.path = path
+        self.model = model
+        self.loaded_at = time.time()
+        self.load_ms = load_ms
+        self.warmup_ms = warmup_ms
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "path": str(self.path),
+            "loaded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.loaded_at)),
+            "load_ms": round(self.load_ms, 3),
+            "warmup_ms": round(self.warmup_ms, 3),
+        }
+
+
+class ModelRegistry:
+    """Theo dõi MODEL_DIR/<variant>/<version>/model.joblib và giữ phiên bản đang phục vụ.
+
+    Phiên bản được chọn theo file MODEL_DIR/<variant>/CURRENT nếu có, nếu không
+    là thư mục có tên lớn nhất (sắp xếp tự nhiên). Khi chưa có thư mục phiên bản
+    nào, file phẳng cũ (ví dụ lgbm_model.joblib) được dùng với phiên bản
+    `legacy-<hash>`. Phiên bản mới được tải và warm-up ở luồng nền rồi mới thay
+    thế bằng một phép gán, nên request đang chạy vẫn dùng mô hình cũ tới hết.
+    """
+
+    def __init__(
+        self,
+        model_dir: Path,
+        legacy_paths: Dict[str, Path],
+        loaders: Dict[str, Callable[[Path], Any]],
+        warm_up: Callable[[Any], None],
+        on_swap: Optional[Callable[[str, ModelHandle], None]] = None,
+    ) -> None:
+        self.model_dir = model_dir
+        self.legacy_paths = legacy_paths
+        self.loaders = loaders
+        self.warm_up = warm_up
+        self.on_swap = on_swap
+        self._handles: Dict[str, ModelHandle] = {}
+        self._errors: Dict[str, str] = {}
+        self._failed: Dict[str, Tuple[str, Path, Tuple[int, int]]] = {}
+        self._locks = {variant: threading.Lock() for variant in loaders}
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        self.swaps = 0
+
+    def resolve(self, variant: str) -> Tuple[str, Path]:
+        """Tìm phiên bản cần phục vụ và đường dẫn file mô hình của nó."""
+        root = self.model_dir / variant
+        pointer = root / CURRENT_FILENAME
+        if pointer.is_file():
+            version = pointer.read_text(encoding="utf-8").strip()
+            path = root / version / MODEL_FILENAME
+            if not path.is_file():
+                raise FileNotFoundError(
+                    f"{pointer} trỏ tới phiên bản không có {MODEL_FILENAME}: {version}"
+                )
+            return version, path
+        if root.is_dir():
+            versions = [
+                entry.name
+                for entry in root.iterdir()
+                if entry.is_dir() and (entry / MODEL_FILENAME).is_file()
+            ]
+            if versions:
+                version = max(versions, key=_version_key)
+                return version, root / version / MODEL_FILENAME
+        legacy = self.legacy_paths.get(variant)
+        if legacy is None or not legacy.is_file():
+            raise FileNotFoundError(
+                f"không thể tìm thấy artifact cho mô hình {variant} trong {self.model_dir}"
+            )
+        return f"legacy-{file_digest(legacy)[:12]}", legacy
+
+    def _load(self, variant: str, version: str, path: Path) -> ModelHandle:
+        started = time.perf_counter()
+        model = self.loaders[variant](path)
+        loaded = time.perf_counter()
+        self.warm_up(model)
+        warmed = time.perf_counter()
+        return ModelHandle(
+            variant, version, path, model, (loaded - started) * 1000.0, (warmed - loaded) * 1000.0
+        )
+
+    def _install(self, variant: str, handle: ModelHandle) -> None:
+        previous = self._handles.get(variant)
+        # phép gán một khóa dict là nguyên tử: request sau thấy bản mới, request đang chạy giữ bản cũ
+        self._handles[variant] = handle
+        self._errors.pop(variant, None)
+        self._failed.pop(variant, None)
+        if previous is not None:
+            self.swaps += 1
+            logger.info("model %s: %s -> %s", variant, previous.version, handle.version)
+            if self.on_swap is not None:
+                self.on_swap(variant, handle)
+
+    def get(self, variant: str) -> ModelHandle:
+        """Trả về phiên bản đang phục vụ; tải đồng bộ nếu mô hình chưa từng được tải."""
+        handle = self._handles.get(variant)
+        if handle is not None:
+            return handle
+        if variant not in self.loaders:
+            raise ValueError(f"Unsupported MODEL_VARIANT: {variant}")
+        with self._locks[variant]:
+            handle = self._handles.get(variant)
+            if handle is None:
+                version, path = self.resolve(variant)
+                handle = self._load(variant, version, path)
+                self._install(variant, handle)
+            return handle
+
+    def refresh(self, variants: Optional[Iterable[str]] = None) -> List[str]:
+        """Kiểm tra phiên bản mới trên đĩa; tải + warm-up rồi thay thế. Trả về các mô hình đã đổi."""
+        swapped: List[str] = []
+        for variant in variants or list(self.loaders):
+            current = self._handles.get(variant)
+            try:
+                version, path = self.resolve(variant)
+            except FileNotFoundError as exc:
+                if current is None:
+                    self._errors[variant] = str(exc)
+                continue
+            if current is not None and (current.version, current.path) == (version, path):
+                self._errors.pop(variant, None)
+                continue
+            stat = path.stat()
+            attempt = (version, path, (stat.st_mtime_ns, stat.st_size))
+            if self._failed.get(variant) == attempt:
+                continue  # bản lỗi chỉ được thử lại khi file thay đổi (ví dụ đã chép xong)
+            with self._locks[variant]:
+                try:
+                    handle = self._load(variant, version, path)
+                except Exception as exc:  # giữ phiên bản cũ nếu bản mới hỏng
+                    logger.exception("model %s: không tải được phiên bản %s", variant, version)
+                    self._errors[variant] = f"{version}: {exc}"
+                    self._failed[variant] = attempt
+                    continue
+                self._install(variant, handle)
+            swapped.append(variant)
+        return swapped
+
+    def configure(self, apply: Callable[[Any], Any]) -> None:
+        """Áp một bước cấu hình lên mọi mô hình đang phục vụ (vd. số luồng predict sau khi fork)."""
+        for handle in list(self._handles.values()):
+            apply(handle.model)
+
+    def start(self, interval_seconds: float) -> None:
+        """Chạy luồng nền kiểm tra thư mục mô hình định kỳ."""
+        if interval_seconds <= 0 or self._watcher is not None:
+            return
+
+        def _watch() -> None:
+            while not self._stop.wait(interval_seconds):
+                try:
+                    # cả mô hình đang phục vụ lẫn mô hình chưa tải được (chờ artifact xuất hiện)
+                    self.refresh({*self._handles, *self._errors})
+                except Exception:
+                    logger.exception("model registry: lỗi khi kiểm tra phiên bản mới")
+
+        self._watcher = threading.Thread(target=_watch, name="model-registry", daemon=True)
+        self._watcher.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def status(self) -> Dict[str, Any]:
+        """Phiên bản đang phục vụ, thời gian tải/warm-up và lỗi gần nhất của từng mô hình."""
+        models: Dict[str, Any] = {}
+        for variant in self.loaders:
+            handle = self._handles.get(variant)
+            entry = handle.describe() if handle is not None else {"version": None}
+            if variant in self._errors:
+                entry["error"] = self._errors[variant]
+            models[variant] = entry
+        return {"model_dir": str(self.model_dir), "swaps": self.swaps, "models": models}
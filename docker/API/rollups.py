@@ -0,0 +1,229 @@
+"""Rollup queries answered from small materialized aggregate tables (cubes)."""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+DATE_COLUMN = "date_id"
+WEEK_COLUMN = "week_start"
+MONTH_COLUMN = "month_start"
+TIME_COLUMNS = (DATE_COLUMN, WEEK_COLUMN, MONTH_COLUMN)
+
+DIMENSIONS = ("store_id", "state_id", "item_id", "dept_id", "cat_id")
+ADDITIVE_MEASURES = ("total_units_sold", "total_revenue")
+
+
+class CubeSpec(NamedTuple):
+    """Một bảng tổng hợp: các chiều (khóa nhóm), cột thời gian và các độ đo đếm phân biệt."""
+
+    name: str
+    dimensions: Tuple[str, ...]
+    time_column: Optional[str]
+    distinct: Tuple[Tuple[str, str], ...]  # (tên độ đo, cột được đếm n_unique)
+
+    @property
+    def keys(self) -> List[str]:
+        return ([self.time_column] if self.time_column else []) + list(self.dimensions)
+
+    @property
+    def filename(self) -> str:
+        return f"agg_{self.name}.parquet"
+
+
+# Bảng do NoteBook/Agg_table.py ghi ra; ba bảng đầu là agg_*_level của Agg_table.ipynb
+CUBES: Dict[str, CubeSpec] = {
+    spec.name: spec
+    for spec in (
+        CubeSpec(
+            "daily_level", (), DATE_COLUMN,
+            (("num_items_sold", "item_id"), ("num_stores", "store_id")),
+        ),
+        CubeSpec(
+            "item_level", ("item_id", "dept_id", "cat_id"), None,
+            (("num_stores_sold", "store_id"), ("num_days_sold", DATE_COLUMN)),
+        ),
+        CubeSpec(
+            "store_level", ("store_id", "state_id"), None,
+            (("num_items_sold", "item_id"), ("num_days_sold", DATE_COLUMN)),
+        ),
+        CubeSpec(
+            "item_week", ("item_id", "dept_id", "cat_id"), WEEK_COLUMN,
+            (("num_stores_sold", "store_id"), ("num_days_sold", DATE_COLUMN)),
+        ),
+        CubeSpec(
+            "store_month", ("store_id", "state_id", "dept_id", "cat_id"), MONTH_COLUMN,
+            (("num_items_sold", "item_id"), ("num_days_sold", DATE_COLUMN)),
+        ),
+        CubeSpec(
+            "daily_store_dept", ("store_id", "state_id", "dept_id", "cat_id"), DATE_COLUMN,
+            (("num_items_sold", "item_id"),),
+        ),
+    )
+}
+
+# Các rollup được phục vụ: tên -> khóa nhóm (cột thời gian, nếu có, đứng đầu)
+ROLLUPS: Dict[str, Tuple[str, ...]] = {
+    "daily": (DATE_COLUMN,),
+    "weekly": (WEEK_COLUMN,),
+    "monthly": (MONTH_COLUMN,),
+    "item": ("item_id", "dept_id", "cat_id"),
+    "store": ("store_id", "state_id"),
+    "state": ("state_id",),
+    "dept": ("dept_id", "cat_id"),
+    "cat": ("cat_id",),
+    "item_week": (WEEK_COLUMN, "item_id", "dept_id", "cat_id"),
+    "store_month": (MONTH_COLUMN, "store_id", "state_id"),
+    "store_dept_daily": (DATE_COLUMN, "store_id", "dept_id", "cat_id"),
+}
+
+
+def floor_time(dates: pd.Series, column: str) -> pd.Series:
+    """Đưa ngày về đầu kỳ: thứ Hai của tuần (week_start) hoặc ngày 1 của tháng (month_start)."""
+    if column == WEEK_COLUMN:
+        return dates - pd.to_timedelta(dates.dt.dayofweek, unit="D")
+    if column == MONTH_COLUMN:
+        return dates.dt.to_period("M").dt.to_timestamp()
+    return dates
+
+
+class Plan(NamedTuple):
+    cube: CubeSpec
+    exact_dates: bool
+
+
+class RollupStore:
+    """Giữ các cube trong bộ nhớ (đã sắp theo thời gian, chiều dạng category) và trả lời rollup.
+
+    Mỗi truy vấn chọn cube nhỏ nhất chứa đủ khóa nhóm và cột lọc, cắt khoảng
+    ngày bằng tìm kiếm nhị phân rồi chỉ gộp lại phần còn lại. Khi cube đúng
+    bằng độ chi tiết được hỏi, các dòng được trả thẳng kèm cả độ đo đếm phân biệt.
+    """
+
+    def __init__(self, tables: Dict[str, pd.DataFrame], version: str = "") -> None:
+        self.tables: Dict[str, pd.DataFrame] = {}
+        self._times: Dict[str, np.ndarray] = {}
+        self.version = version
+        for name, frame in tables.items():
+            spec = CUBES[name]
+            if spec.time_column:
+                frame = frame.sort_values(spec.time_column, kind="stable", ignore_index=True)
+                self._times[name] = frame[spec.time_column].to_numpy(dtype="datetime64[ns]")
+            for column in spec.dimensions:
+                frame[column] = frame[column].astype("category")
+            self.tables[name] = frame
+
+    @classmethod
+    def load(cls, directory: Path) -> "RollupStore":
+        """Đọc mọi agg_<cube>.parquet có trong thư mục; FileNotFoundError nếu không có bảng nào."""
+        tables: Dict[str, pd.DataFrame] = {}
+        stamps: List[str] = []
+        for spec in CUBES.values():
+            path = directory / spec.filename
+            if path.is_file():
+                tables[spec.name] = pd.read_parquet(path)
+                stat = path.stat()
+                stamps.append(f"{spec.name}:{stat.st_mtime_ns:x}-{stat.st_size:x}")
+        if not tables:
+            raise FileNotFoundError(
+                f"không có bảng tổng hợp nào trong {directory}; hãy chạy NoteBook/Agg_table.py"
+            )
+        return cls(tables, version=",".join(stamps))
+
+    def describe(self) -> Dict[str, Dict[str, object]]:
+        return {
+            name: {
+                "rows": int(len(frame)),
+                "keys": CUBES[name].keys,
+                "bytes": int(frame.memory_usage(deep=True).sum()),
+            }
+            for name, frame in self.tables.items()
+        }
+
+    def plan(
+        self, keys: Sequence[str], filters: Sequence[str], has_dates: bool
+    ) -> Plan:
+        """Chọn cube: đủ chiều + thời gian, ưu tiên lọc ngày chính xác rồi tới số dòng ít nhất."""
+        time_key = next((key for key in keys if key in TIME_COLUMNS), None)
+        needed = {key for key in keys if key not in TIME_COLUMNS} | set(filters)
+        candidates: List[Tuple[Tuple[int, int], Plan]] = []
+        for name, frame in self.tables.items():
+            spec = CUBES[name]
+            if not needed <= set(spec.dimensions):
+                continue
+            # tuần không nằm gọn trong tháng: kỳ thô hơn chỉ được suy ra từ cube theo ngày
+            if time_key is not None and spec.time_column not in (time_key, DATE_COLUMN):
+                continue
+            if has_dates and spec.time_column is None:
+                continue
+            exact = not has_dates or spec.time_column == DATE_COLUMN
+            candidates.append(((0 if exact else 1, len(frame)), Plan(spec, exact)))
+        if not candidates:
+            raise LookupError(
+                f"không có bảng tổng hợp nào chứa {', '.join(sorted(needed | {time_key} - {None}))}"
+            )
+        return min(candidates, key=lambda item: item[0])[1]
+
+    def query(
+        self,
+        rollup: str,
+        start: Optional[pd.Timestamp] = None,
+        end: Optional[pd.Timestamp] = None,
+        filters: Optional[Dict[str, str]] = None,
+        sort: Optional[str] = None,
+        descending: Optional[bool] = None,
+        limit: Optional[int] = None,
+    ) -> Tuple[pd.DataFrame, Plan]:
+        """Trả về (bảng kết quả, cube đã dùng) cho một rollup trong ROLLUPS."""
+        keys = list(ROLLUPS[rollup])
+        filters = filters or {}
+        plan = self.plan(keys, list(filters), start is not None or end is not None)
+        spec = plan.cube
+        frame = self.tables[spec.name]
+
+        if spec.time_column and (start is not None or end is not None):
+            times = self._times[spec.name]
+            if start is not None and not plan.exact_dates:
+                # cube theo tuần/tháng: giữ các kỳ giao với khoảng ngày (lọc theo đầu kỳ)
+                start = floor_time(pd.Series([start]), spec.time_column).iloc[0]
+            lo = 0 if start is None else int(np.searchsorted(times, start.to_datetime64(), "left"))
+            hi = times.size if end is None else int(
+                np.searchsorted(times, end.to_datetime64(), "right")
+            )
+            frame = frame.iloc[lo:max(lo, hi)]
+        if filters:
+            mask = np.ones(len(frame), dtype=bool)
+            for column, value in filters.items():
+                mask &= (frame[column] == value).to_numpy()
+            frame = frame[mask]
+
+        if set(spec.keys) == set(keys):
+            # đúng độ chi tiết: trả thẳng, giữ cả các độ đo đếm phân biệt
+            result = frame[[*keys, *[col for col in frame.columns if col not in spec.keys]]]
+        else:
+            source = frame
+            time_key = next((key for key in keys if key in TIME_COLUMNS), None)
+            if time_key is not None and time_key != spec.time_column:
+                source = frame.assign(**{time_key: floor_time(frame[spec.time_column], time_key)})
+            result = source.groupby(keys, observed=True, sort=False)[list(ADDITIVE_MEASURES)].sum()
+            result = result.reset_index()
+        result = result.assign(
+            avg_price=result["total_revenue"] / result["total_units_sold"].replace(0, np.nan)
+        )
+
+        if sort is None:
+            sort = keys[0] if keys[0] in TIME_COLUMNS else "total_revenue"
+        if sort not in result.columns:
+            raise ValueError(f"không thể sắp xếp theo {sort}; các cột: {', '.join(result.columns)}")
+        if descending is None:
+            descending = sort not in TIME_COLUMNS and sort not in DIMENSIONS
+        result = result.sort_values(sort, ascending=not descending, kind="stable", ignore_index=True)
+        if limit is not None:
+            result = result.head(limit)
+        for column in keys:
+            if isinstance(result[column].dtype, pd.CategoricalDtype):
+                result[column] = result[column].astype(str)
+        return result, plan
+
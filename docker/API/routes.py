@@ -1,26 +1,80 @@
 """Minimal route definitions for the forecasting API demo."""
 from __future__ import annotations
 
-from typing import Any, Dict, Optional
+import hashlib
+import itertools
+import json
+import tempfile
+import time
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple, Union
 
+import numpy as np
 import pandas as pd
-from fastapi import APIRouter, HTTPException, Query
-
-from Dashboard.services import predictor
+import pyarrow as pa
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import ValidationError
 
+from . import config
 from . import dependencies as deps
-from .schemas import PredictionRequest, PredictionResponse
-from .utils import filter_by_date, frame_to_records, parse_date, records_to_dataframe
+from . import features as feature_pipeline
+from . import metrics
+from .downsample import METHODS as DOWNSAMPLE_METHODS
+from .downsample import downsample
+from .rollups import ROLLUPS, TIME_COLUMNS
+from .batching import BatchQueueFull, BatchTimeout
+from .bulk import (
+    NDJSON_MEDIA_TYPES,
+    PARQUET_MEDIA_TYPES,
+    iter_ndjson_frames,
+    iter_parquet_frames,
+)
+from .cache import hash_frame, hash_records
+from .recursive import recursive_forecast
+from .schemas import (
+    FeatureAppendRequest,
+    ForecastRequest,
+    ForecastResponse,
+    OnlineFeatureRequest,
+    PredictionRequest,
+    PredictionResponse,
+)
+from .utils import (
+    ARROW_STREAM_MEDIA_TYPE,
+    BINARY_MEDIA_TYPES,
+    PARQUET_MEDIA_TYPE,
+    bytes_to_frame,
+    frame_to_bytes,
+    frame_to_records,
+    negotiate_media_type,
+    parse_date,
+    records_to_dataframe,
+)
 
 router = APIRouter()
 
+SUPPORTED_FORMATS = ["application/json", ARROW_STREAM_MEDIA_TYPE, PARQUET_MEDIA_TYPE]
+
+_BINARY_BODY = {"schema": {"type": "string", "format": "binary"}}
+_PREDICT_OPENAPI = {
+    "requestBody": {
+        "required": False,
+        "content": {
+            "application/json": {"schema": PredictionRequest.model_json_schema()},
+            ARROW_STREAM_MEDIA_TYPE: _BINARY_BODY,
+            PARQUET_MEDIA_TYPE: _BINARY_BODY,
+        },
+    }
+}
+
 
 def _build_features_for_inference(df: pd.DataFrame) -> pd.DataFrame:
     """Xây dựng ma trận đặc trưng từ dataframe đầu vào."""
     mapping = deps.get_encoding_mapping()
     try:
-        return predictor.build_feature_matrix_for_inference(df, mapping)
-    except KeyError as exc:
+        return feature_pipeline.build_feature_matrix_for_inference(df, mapping)
+    except (KeyError, ValueError, TypeError) as exc:  # thiếu cột, hoặc giá trị không ép được kiểu (vd. price="abc")
         raise HTTPException(status_code=400, detail=str(exc)) from exc
 
 
@@ -28,8 +82,8 @@ def _build_features_with_target(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.Seri
     """Xây dựng ma trận đặc trưng và chuỗi mục tiêu từ dataframe đầu vào."""
     mapping = deps.get_encoding_mapping()
     try:
-        return predictor.build_feature_matrix(df, mapping)
-    except KeyError as exc:
+        return feature_pipeline.build_feature_matrix(df, mapping)
+    except (KeyError, ValueError, TypeError) as exc:
         raise HTTPException(status_code=400, detail=str(exc)) from exc
 
 
@@ -45,81 +99,855 @@ def _select_dataframe(payload: PredictionRequest) -> pd.DataFrame:
         end = parse_date(payload.end_date)
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc)) from exc
-    df = filter_by_date(deps.get_test_dataframe(), start, end)
-    if payload.limit is not None:
-        df = df.tail(payload.limit)
+    df = deps.get_test_dataset().frame(start, end, limit=payload.limit)
     if df.empty:
         raise HTTPException(status_code=400, detail="No rows available for prediction")
     return df
 
 
+def _request_timer(request: Request, endpoint: str) -> metrics.RequestTimer:
+    """Bộ đo thời gian của request, do RequestMetricsMiddleware tạo; tạo mới nếu route không qua middleware."""
+    timer = getattr(request.state, "timer", None)
+    if timer is None:
+        timer = request.state.timer = metrics.RequestTimer(endpoint)
+    return timer
+
+
+def _finish(
+    request: Request, timer: metrics.RequestTimer, response: Response, rows: Optional[int]
+) -> Response:
+    """Ghi số dòng cho middleware và thêm Server-Timing khi client yêu cầu."""
+    if request.headers.get(config.TIMING_HEADER) == "1":
+        response.headers["Server-Timing"] = timer.server_timing()
+    timer.rows = rows
+    return response
+
+
+async def _read_prediction_input(request: Request) -> Union[PredictionRequest, pd.DataFrame]:
+    """Đọc body /predict: JSON thành PredictionRequest, Arrow/Parquet thành dataframe."""
+    timer = _request_timer(request, "/predict")
+    media_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    body = await request.body()
+    with timer.stage("parse"):
+        if media_type in BINARY_MEDIA_TYPES:
+            try:
+                return bytes_to_frame(body, media_type)
+            except ValueError as exc:
+                raise HTTPException(status_code=400, detail=str(exc)) from exc
+        try:
+            data = json.loads(body) if body else {}
+        except json.JSONDecodeError as exc:
+            raise HTTPException(status_code=400, detail=f"JSON không hợp lệ: {exc.msg}") from exc
+        try:
+            return PredictionRequest(**data)
+        except (TypeError, ValidationError) as exc:
+            errors = exc.errors() if isinstance(exc, ValidationError) else [{"msg": str(exc)}]
+            raise RequestValidationError(errors) from exc
+
+
+def _etag(*parts: Any) -> str:
+    """ETag mạnh từ các thành phần xác định nội dung (phiên bản dữ liệu, tham số, định dạng)."""
+    digest = hashlib.blake2b("\x1f".join(map(str, parts)).encode("utf-8"), digest_size=12)
+    return f'"{digest.hexdigest()}"'
+
+
+def _not_modified(request: Request, etag: str) -> Optional[Response]:
+    """Trả về 304 nếu If-None-Match của client khớp ETag hiện tại."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    if "*" in tags or etag in tags:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    return None
+
+
+def _set_etag(response: Response, etag: str) -> Response:
+    response.headers["ETag"] = etag
+    # client được giữ bản sao nhưng phải xác thực lại (rẻ: 304 không có body)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def _parse_columns(raw: Optional[str], available: List[str]) -> Optional[List[str]]:
+    """Đọc danh sách cột "a,b,c" cho projection; 400 nếu có cột không tồn tại."""
+    if raw is None or not raw.strip():
+        return None
+    columns = list(dict.fromkeys(name.strip() for name in raw.split(",") if name.strip()))
+    unknown = [name for name in columns if name not in available]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Cột không tồn tại: {', '.join(unknown)}")
+    return columns
+
+
+def _get_dataset_and_dates(
+    start_date: Optional[str], end_date: Optional[str]
+) -> Tuple[Any, Optional[pd.Timestamp], Optional[pd.Timestamp]]:
+    try:
+        dataset = deps.get_test_dataset()
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=500, detail=str(exc)) from exc
+    try:
+        return dataset, parse_date(start_date), parse_date(end_date)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+def _binary_response(df: pd.DataFrame, media_type: str, **headers: Any) -> Response:
+    """Trả dataframe dưới dạng Arrow IPC stream hoặc Parquet."""
+    extra = {f"X-{key.title()}": str(value) for key, value in headers.items()}
+    return Response(content=frame_to_bytes(df, media_type), media_type=media_type, headers=extra)
+
+
+def _parse_weights(raw: Optional[str]) -> Optional[Dict[str, float]]:
+    """Đọc trọng số ensemble từ query dạng `lightgbm:0.6,xgboost:0.4`."""
+    if not raw:
+        return None
+    weights: Dict[str, float] = {}
+    try:
+        for part in raw.split(","):
+            name, _, value = part.partition(":")
+            weights[name.strip()] = float(value) if value else 1.0
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=400, detail=f"Trọng số không hợp lệ: {raw} (ví dụ lightgbm:0.6,xgboost:0.4)"
+        ) from exc
+    return weights
+
+
+def _resolve_models(
+    model: Optional[str], weights: Optional[Dict[str, float]]
+) -> Dict[str, float]:
+    """Chuẩn hóa lựa chọn mô hình thành {tên: trọng số} với tổng trọng số bằng 1."""
+    served = deps.served_models()
+    if weights:
+        selection = {name.strip().lower(): float(weight) for name, weight in weights.items()}
+    else:
+        selection = {(model or deps.MODEL_VARIANT).strip().lower(): 1.0}
+    unknown = [name for name in selection if name not in served]
+    if unknown:
+        raise HTTPException(
+            status_code=400, detail=f"Mô hình không được phục vụ: {unknown}; có sẵn: {served}"
+        )
+    total = sum(selection.values())
+    if any(weight < 0 for weight in selection.values()) or total <= 0:
+        raise HTTPException(
+            status_code=400, detail="Trọng số ensemble phải không âm và có tổng lớn hơn 0"
+        )
+    return {name: weight / total for name, weight in selection.items() if weight > 0}
+
+
+def _model_label(selection: Dict[str, float]) -> str:
+    return next(iter(selection)) if len(selection) == 1 else "ensemble"
+
+
+def _prediction_cache_key(
+    source: Union[PredictionRequest, pd.DataFrame],
+    selection: Dict[str, float],
+) -> Optional[Tuple[Any, ...]]:
+    """Khóa cache: phiên bản artifact + mô hình/trọng số + tham số ngày hoặc hash bản ghi."""
+    try:
+        version = deps.get_artifact_version(list(selection))
+    except (FileNotFoundError, ImportError) as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
+    models = tuple(sorted(selection.items()))
+    if isinstance(source, pd.DataFrame):
+        return (version, models, "frame", hash_frame(source))
+    if source.records:
+        return (version, models, "records", hash_records(source.records))
+    try:
+        start = parse_date(source.start_date)
+        end = parse_date(source.end_date)
+    except ValueError:
+        return None
+    return (
+        version,
+        models,
+        "range",
+        start.isoformat() if start is not None else None,
+        end.isoformat() if end is not None else None,
+        source.limit,
+    )
+
+
+def _predict(features: pd.DataFrame, variant: Optional[str] = None) -> Any:
+    """Chạy mô hình trên ma trận đặc trưng, qua micro-batcher nếu được bật."""
+    try:
+        if not config.BATCH_ENABLED:
+            return deps.get_model(variant).predict(features)
+        return deps.get_batcher(variant).submit(features)
+    except (BatchQueueFull, BatchTimeout) as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
+    except (FileNotFoundError, ImportError) as exc:
+        raise HTTPException(
+            status_code=503, detail=f"Mô hình {variant or deps.MODEL_VARIANT} chưa sẵn sàng: {exc}"
+        ) from exc
+
+
+def _timed_predict(features: pd.DataFrame, variant: str) -> Tuple[np.ndarray, float]:
+    started = time.perf_counter()
+    predictions = np.asarray(_predict(features, variant), dtype=np.float64)
+    elapsed = time.perf_counter() - started
+    if metrics.REGISTRY.enabled:
+        metrics.MODEL_SECONDS.observe(elapsed, variant)
+    return predictions, elapsed * 1000.0
+
+
+def _predict_models(
+    features: pd.DataFrame, selection: Dict[str, float]
+) -> Tuple[np.ndarray, Dict[str, float]]:
+    """Chạy song song các mô hình được chọn trên cùng ma trận đặc trưng rồi trộn theo trọng số."""
+    if len(selection) == 1:
+        variant = next(iter(selection))
+        predictions, elapsed = _timed_predict(features, variant)
+        return predictions, {variant: round(elapsed, 3)}
+    executor = deps.get_model_executor()
+    futures = {
+        variant: executor.submit(_timed_predict, features, variant) for variant in selection
+    }
+    blended: Optional[np.ndarray] = None
+    latency: Dict[str, float] = {}
+    for variant, future in futures.items():
+        predictions, elapsed = future.result()
+        latency[variant] = round(elapsed, 3)
+        weighted = predictions * selection[variant]
+        blended = weighted if blended is None else blended + weighted
+    return blended, latency
+
+
+async def _spool_body(request: Request) -> IO[bytes]:
+    """Ghi body request vào file tạm (giữ trong RAM tới BULK_SPOOL_BYTES)."""
+    spool = tempfile.SpooledTemporaryFile(max_size=config.BULK_SPOOL_BYTES)
+    async for chunk in request.stream():
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+
+def _stream_predictions(
+    frames: Iterator[pd.DataFrame],
+    selection: Dict[str, float],
+    timer: metrics.RequestTimer,
+    source: Optional[IO[bytes]] = None,
+) -> Iterator[str]:
+    """Dự đoán từng chunk và trả về mỗi chunk một dòng NDJSON."""
+    total = timer.rows = 0
+    frames = iter(frames)
+    try:
+        for index in itertools.count():
+            with timer.stage("select"):
+                chunk = next(frames, None)
+            if chunk is None:
+                break
+            with timer.stage("features"):
+                features = _build_features_for_inference(chunk)
+            with timer.stage("predict"):
+                predictions, latency = _predict_models(features, selection)
+            with timer.stage("serialize"):
+                line = {
+                    "chunk": index,
+                    "offset": total,
+                    "rows": int(predictions.shape[0]),
+                    "predictions": predictions.tolist(),
+                    "latency_ms": latency,
+                }
+                payload = json.dumps(line) + "\n"
+            total += int(predictions.shape[0])
+            timer.rows = total
+            yield payload
+        yield json.dumps(
+            {"done": True, "rows": total, "model": _model_label(selection), "weights": selection}
+        ) + "\n"
+    except HTTPException as exc:
+        # header 200 đã gửi: mã lỗi chỉ còn ghi được vào metric
+        timer.status = exc.status_code
+        yield json.dumps({"error": exc.detail, "rows": total}) + "\n"
+    except ValueError as exc:
+        timer.status = 400
+        yield json.dumps({"error": str(exc), "rows": total}) + "\n"
+    finally:
+        if source is not None:
+            source.close()
+
 
 # route chính
 @router.get("/")
-def root() -> Dict[str, Any]:
+def root(request: Request, response: Response) -> Any:
+    etag = _etag("root", deps.MODEL_VARIANT, deps.served_models(), SUPPORTED_FORMATS)
+    cached = _not_modified(request, etag)
+    if cached is not None:
+        return cached
+    _set_etag(response, etag)
     return {
         "message": "Welcome to the Retail Demand Forecasting API",
         "docs": "/docs",
         "model": deps.MODEL_VARIANT,
+        "models": deps.served_models(),
+        "formats": SUPPORTED_FORMATS,
     }
 
 # route kiểm tra kết nối
 @router.get("/health")
-def healthcheck() -> Dict[str, Any]:
-    return {"status": "ok"}
+def healthcheck(response: Response) -> Dict[str, Any]:
+    """Chỉ báo "ok" khi dataset, encoding và mô hình đã được nạp + warm-up."""
+    state = deps.readiness()
+    if not state["ready"]:
+        response.status_code = 503
+    return {"status": "ok" if state["ready"] else "starting", **state}
 
 # route tóm tắt dữ liệu
 @router.get("/data/summary")
-def data_summary() -> Dict[str, Any]:
+def data_summary(request: Request, response: Response) -> Any:
     """Trả về tóm tắt dữ liệu test bao gồm số hàng, cột và phạm vi ngày."""
     try:
-        df = deps.get_test_dataframe()
+        dataset = deps.get_test_dataset()
     except FileNotFoundError as exc:
         raise HTTPException(status_code=500, detail=str(exc)) from exc
-    date_min: Optional[pd.Timestamp] = df["date_id"].min() if "date_id" in df.columns else None
-    date_max: Optional[pd.Timestamp] = df["date_id"].max() if "date_id" in df.columns else None
+    etag = _etag("summary", dataset.version, feature_pipeline.FEATURE_COLUMNS)
+    cached = _not_modified(request, etag)
+    if cached is not None:
+        return cached
+    _set_etag(response, etag)
+    date_min: Optional[pd.Timestamp] = dataset.date_min
+    date_max: Optional[pd.Timestamp] = dataset.date_max
+    columns = dataset.column_bytes()
     return {
-        "rows": int(df.shape[0]),
-        "columns": df.columns.tolist(),
-        "date_min": date_min.isoformat() if pd.notna(date_min) else None,
-        "date_max": date_max.isoformat() if pd.notna(date_max) else None,
-        "feature_columns": predictor.FEATURE_COLUMNS,
-        "target_column": predictor.TARGET_COLUMN,
+        "rows": dataset.num_rows,
+        "columns": dataset.columns,
+        "date_min": date_min.isoformat() if date_min is not None else None,
+        "date_max": date_max.isoformat() if date_max is not None else None,
+        "feature_columns": feature_pipeline.FEATURE_COLUMNS,
+        "target_column": feature_pipeline.TARGET_COLUMN,
+        # byte thường trú theo schema gọn (dictionary/int8/int16/float32) của file Arrow
+        "memory": {
+            "total_bytes": sum(info["bytes"] for info in columns.values()),
+            "columns": columns,
+        },
     }
 
 # route lấy mẫu dữ liệu
 @router.get("/data/sample")
 def data_sample(
+    request: Request,
+    response: Response,
     limit: int = Query(100, ge=1, le=1000),
     start_date: Optional[str] = Query(default=None),
     end_date: Optional[str] = Query(default=None),
-) -> Dict[str, Any]:
+    columns: Optional[str] = Query(default=None, description="Danh sách cột cần trả, ví dụ date_id,units_sold"),
+) -> Any:
     """Trả về mẫu dữ liệu test với các bộ lọc tùy chọn."""
+    dataset, start, end = _get_dataset_and_dates(start_date, end_date)
+    selected = _parse_columns(columns, dataset.columns)
+
+    media_type = negotiate_media_type(request.headers.get("accept"))
+    # ETag tính từ phiên bản dataset + tham số nên 304 được trả trước khi đọc dữ liệu
+    etag = _etag(
+        "sample", dataset.version, limit, start, end, selected, media_type or "application/json"
+    )
+    cached = _not_modified(request, etag)
+    if cached is not None:
+        return cached
+    sample_df = dataset.frame(start, end, limit=limit, columns=selected)
+    if media_type is not None:
+        return _set_etag(
+            _binary_response(sample_df, media_type, rows=int(sample_df.shape[0])), etag
+        )
+    _set_etag(response, etag)
+    return {"rows": int(sample_df.shape[0]), "data": frame_to_records(sample_df)}
+
+
+# route duyệt toàn bộ khoảng ngày theo trang (cursor)
+@router.get("/data/rows")
+def data_rows(
+    request: Request,
+    response: Response,
+    page_size: int = Query(config.DATA_PAGE_ROWS, ge=1, le=config.DATA_PAGE_MAX_ROWS),
+    cursor: Optional[str] = Query(default=None, description="next_cursor của trang trước"),
+    start_date: Optional[str] = Query(default=None),
+    end_date: Optional[str] = Query(default=None),
+    columns: Optional[str] = Query(default=None, description="Danh sách cột cần trả, ví dụ date_id,units_sold"),
+) -> Any:
+    """Trả về một trang dữ liệu theo thứ tự ngày, kèm cursor để đọc trang kế tiếp."""
+    dataset, start, end = _get_dataset_and_dates(start_date, end_date)
+    selected = _parse_columns(columns, dataset.columns)
+    media_type = negotiate_media_type(request.headers.get("accept"))
+    etag = _etag(
+        "rows", dataset.version, page_size, cursor, start, end, selected,
+        media_type or "application/json",
+    )
+    cached = _not_modified(request, etag)
+    if cached is not None:
+        return cached
+    try:
+        page_df, next_cursor = dataset.page(start, end, page_size, cursor, selected)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    if media_type is not None:
+        headers = {"rows": int(page_df.shape[0])}
+        if next_cursor is not None:
+            headers["next-cursor"] = next_cursor
+        return _set_etag(_binary_response(page_df, media_type, **headers), etag)
+    _set_etag(response, etag)
+    return {
+        "rows": int(page_df.shape[0]),
+        "columns": list(page_df.columns),
+        "data": frame_to_records(page_df),
+        "next_cursor": next_cursor,
+    }
+
+# route chuỗi thời gian đã giảm mẫu cho biểu đồ
+@router.get("/data/series")
+def data_series(
+    request: Request,
+    response: Response,
+    value: str = Query(feature_pipeline.TARGET_COLUMN, description="Cột số cần vẽ"),
+    agg: str = Query("sum", pattern="^(sum|mean|min|max)$", description="Gộp các dòng cùng ngày"),
+    by: Optional[str] = Query(default=None, description="Tách một chuỗi cho mỗi giá trị của cột này"),
+    store_id: Optional[str] = Query(default=None),
+    item_id: Optional[str] = Query(default=None),
+    dept_id: Optional[str] = Query(default=None),
+    cat_id: Optional[str] = Query(default=None),
+    start_date: Optional[str] = Query(default=None),
+    end_date: Optional[str] = Query(default=None),
+    points: int = Query(500, ge=3, le=config.DATA_SERIES_MAX_POINTS),
+    method: str = Query("lttb", pattern=f"^({'|'.join(DOWNSAMPLE_METHODS)})$"),
+) -> Any:
+    """Gộp theo ngày rồi giảm mỗi chuỗi xuống tối đa `points` điểm (LTTB hoặc trung bình bucket)."""
+    dataset, start, end = _get_dataset_and_dates(start_date, end_date)
+    filters = {
+        name: item
+        for name, item in (
+            ("store_id", store_id), ("item_id", item_id), ("dept_id", dept_id), ("cat_id", cat_id)
+        )
+        if item is not None
+    }
+    needed = [feature_pipeline.DATE_COLUMN, value, *filters] + ([by] if by else [])
+    _parse_columns(",".join(needed), dataset.columns)
+    etag = _etag(
+        "series", dataset.version, value, agg, by, sorted(filters.items()), start, end, points, method
+    )
+    cached = _not_modified(request, etag)
+    if cached is not None:
+        return cached
     try:
-        df = deps.get_test_dataframe()
-    except:
-        print("Loi chuyen doi dataframe")
+        daily = dataset.daily_series(start, end, value, agg=agg, by=by, filters=filters)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    groups = [(None, daily)] if by is None else list(daily.groupby(by, sort=True, observed=True))
+    if len(groups) > config.DATA_SERIES_MAX_GROUPS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{by} có {len(groups)} giá trị (tối đa {config.DATA_SERIES_MAX_GROUPS}); hãy thêm bộ lọc",
+        )
+    series = []
+    for key, group in groups:
+        dates = group[feature_pipeline.DATE_COLUMN].to_numpy(dtype="datetime64[ns]")
+        x, y = downsample(dates, group[value].to_numpy(dtype=np.float64), points, method)
+        series.append(
+            {
+                "key": None if key is None else str(key),
+                "source_points": int(len(group)),
+                "points": int(len(x)),
+                "x": np.datetime_as_string(x, unit="D").tolist(),
+                "y": np.round(y, 6).tolist(),
+            }
+        )
+    _set_etag(response, etag)
+    return {"value": value, "agg": agg, "by": by, "method": method, "series": series}
+
+
+# route liệt kê các rollup và cube đã nạp
+@router.get("/rollups")
+def rollups_index() -> Dict[str, Any]:
+    try:
+        store = deps.get_rollup_store()
+    except FileNotFoundError as exc:  # chưa chạy Agg_table.py: không có gì để thử lại
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    return {
+        "rollups": {name: list(keys) for name, keys in ROLLUPS.items()},
+        "cubes": store.describe(),
+    }
+
+# route tổng hợp từ bảng đã materialize
+@router.get("/rollups/{name}")
+def rollup(
+    request: Request,
+    response: Response,
+    name: str,
+    start_date: Optional[str] = Query(default=None),
+    end_date: Optional[str] = Query(default=None),
+    store_id: Optional[str] = Query(default=None),
+    state_id: Optional[str] = Query(default=None),
+    item_id: Optional[str] = Query(default=None),
+    dept_id: Optional[str] = Query(default=None),
+    cat_id: Optional[str] = Query(default=None),
+    sort: Optional[str] = Query(default=None, description="Cột sắp xếp, mặc định thời gian hoặc total_revenue"),
+    descending: Optional[bool] = Query(default=None),
+    limit: int = Query(1000, ge=1, le=config.ROLLUP_MAX_ROWS),
+) -> Any:
+    """Trả về rollup theo ngày/tuần/tháng/item/store/dept/cat, lọc theo ngày và các chiều."""
+    if name not in ROLLUPS:
+        raise HTTPException(
+            status_code=404, detail=f"Rollup không tồn tại: {name} (có: {', '.join(ROLLUPS)})"
+        )
+    try:
+        store = deps.get_rollup_store()
+    except FileNotFoundError as exc:  # chưa chạy Agg_table.py: không có gì để thử lại
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
     try:
         start = parse_date(start_date)
         end = parse_date(end_date)
-    except:
-        print("Loi ngay thang")
-
-    filtered = filter_by_date(df, start, end)
-    sample_df = filtered.tail(limit)
-    return {"rows": int(sample_df.shape[0]), "data": frame_to_records(sample_df)}
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    filters = {
+        column: value
+        for column, value in (
+            ("store_id", store_id), ("state_id", state_id), ("item_id", item_id),
+            ("dept_id", dept_id), ("cat_id", cat_id),
+        )
+        if value is not None
+    }
+    media_type = negotiate_media_type(request.headers.get("accept"))
+    etag = _etag(
+        "rollup", store.version, name, start, end, sorted(filters.items()), sort, descending,
+        limit, media_type or "application/json",
+    )
+    cached = _not_modified(request, etag)
+    if cached is not None:
+        return cached
+    try:
+        result, plan = store.query(name, start, end, filters, sort, descending, limit)
+    except (LookupError, ValueError) as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    if media_type is not None:
+        return _set_etag(
+            _binary_response(result, media_type, rows=len(result), source=plan.cube.name), etag
+        )
+    for column in TIME_COLUMNS:
+        if column in result.columns:
+            result[column] = result[column].dt.strftime("%Y-%m-%d")
+    _set_etag(response, etag)
+    return {
+        "rollup": name,
+        "source": plan.cube.name,
+        "exact_dates": plan.exact_dates,
+        "rows": int(len(result)),
+        "data": frame_to_records(result),
+    }
 
 
 # route dự đoán
-@router.post("/predict", response_model=PredictionResponse)
-def predict(payload: PredictionRequest) -> PredictionResponse:
-    """Thực hiện dự đoán dựa trên payload đầu vào."""
-    df = _select_dataframe(payload)
-    features = _build_features_for_inference(df)
-    model = deps.get_model()
-    predictions = model.predict(features)
-    return PredictionResponse(
-        rows=int(features.shape[0]),
-        model=deps.MODEL_VARIANT,
-        predictions=predictions.tolist(),
+@router.post("/predict", response_model=PredictionResponse, openapi_extra=_PREDICT_OPENAPI)
+def predict(
+    request: Request,
+    source: Union[PredictionRequest, pd.DataFrame] = Depends(_read_prediction_input),
+    model: Optional[str] = Query(default=None, description="Mô hình cho body Arrow/Parquet"),
+    weights: Optional[str] = Query(
+        default=None, description="Trọng số ensemble, ví dụ lightgbm:0.6,xgboost:0.4"
+    ),
+) -> Any:
+    """Thực hiện dự đoán dựa trên payload JSON hoặc body Arrow/Parquet."""
+    timer = _request_timer(request, "/predict")
+    if isinstance(source, PredictionRequest) and (source.model or source.weights):
+        selection = _resolve_models(source.model, source.weights)
+    else:
+        selection = _resolve_models(model, _parse_weights(weights))
+    cache = deps.get_prediction_cache()
+    predictions = None
+    key = None
+    if config.PREDICTION_CACHE_ENABLED:
+        with timer.stage("cache"):
+            key = _prediction_cache_key(source, selection)
+            predictions = cache.get(key) if key is not None else None
+        if key is not None and metrics.REGISTRY.enabled:
+            metrics.CACHE_REQUESTS.inc("hit" if predictions is not None else "miss")
+    cache_status = "HIT" if predictions is not None else "MISS"
+    latency: Dict[str, float] = {}
+    if predictions is None:
+        with timer.stage("select"):
+            df = source if isinstance(source, pd.DataFrame) else _select_dataframe(source)
+        with timer.stage("features"):
+            features = _build_features_for_inference(df)
+        with timer.stage("predict"):
+            predictions, latency = _predict_models(features, selection)
+        if key is not None:
+            cache.put(key, predictions)
+    rows = int(predictions.shape[0])
+    label = _model_label(selection)
+    media_type = negotiate_media_type(request.headers.get("accept"))
+    with timer.stage("serialize"):
+        if media_type is not None:
+            response = _binary_response(
+                pd.DataFrame({"prediction": predictions}),
+                media_type,
+                rows=rows,
+                model=label,
+                cache=cache_status,
+                **{"latency-ms": ",".join(f"{name}={ms}" for name, ms in latency.items())},
+            )
+        else:
+            body = PredictionResponse(
+                rows=rows,
+                model=label,
+                predictions=predictions.tolist(),
+                weights=selection,
+                latency_ms=latency,
+            ).model_dump_json()
+            response = Response(
+                content=body, media_type="application/json", headers={"X-Cache": cache_status}
+            )
+    return _finish(request, timer, response, rows)
+
+
+# route dự đoán hàng loạt dạng streaming
+@router.post("/predict/bulk")
+async def predict_bulk(
+    request: Request,
+    start_date: Optional[str] = Query(default=None),
+    end_date: Optional[str] = Query(default=None),
+    chunk_size: int = Query(default=config.BULK_CHUNK_ROWS, ge=1, le=100_000),
+    model: Optional[str] = Query(default=None),
+    weights: Optional[str] = Query(
+        default=None, description="Trọng số ensemble, ví dụ lightgbm:0.6,xgboost:0.4"
+    ),
+) -> StreamingResponse:
+    """Dự đoán theo chunk cố định cho file NDJSON/Parquet hoặc khoảng ngày đã lưu."""
+    timer = _request_timer(request, "/predict/bulk")
+    selection = _resolve_models(model, _parse_weights(weights))
+    media_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    source: Optional[IO[bytes]] = None
+    if media_type in NDJSON_MEDIA_TYPES:
+        source = await _spool_body(request)
+        frames = iter_ndjson_frames(source, chunk_size)
+    elif media_type in PARQUET_MEDIA_TYPES:
+        source = await _spool_body(request)
+        try:
+            frames = iter_parquet_frames(source, chunk_size)
+        except Exception as exc:
+            source.close()
+            raise HTTPException(status_code=400, detail=f"Parquet không hợp lệ: {exc}") from exc
+    elif media_type in ("", "application/json"):
+        try:
+            start = parse_date(start_date)
+            end = parse_date(end_date)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+        dataset = deps.get_test_dataset()
+        lo, hi = dataset.bounds(start, end)
+        if hi <= lo:
+            raise HTTPException(status_code=400, detail="No rows available for prediction")
+        frames = dataset.iter_frames(start, end, chunk_size)
+    else:
+        raise HTTPException(
+            status_code=415, detail=f"Content-Type không được hỗ trợ: {media_type}"
+        )
+    return StreamingResponse(
+        _stream_predictions(frames, selection, timer, source), media_type="application/x-ndjson"
     )
+
+
+def _online_feature_frame(payload: OnlineFeatureRequest) -> pd.DataFrame:
+    """Lấy vector đặc trưng đầy đủ từ feature store cho các khóa được gửi lên."""
+    if not payload.records:
+        raise HTTPException(status_code=400, detail="Không có bản ghi được cung cấp")
+    try:
+        rows = deps.get_feature_store().feature_rows(
+            record.model_dump() for record in payload.records
+        )
+    except KeyError as exc:
+        raise HTTPException(status_code=404, detail=str(exc.args[0])) from exc
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return pd.DataFrame.from_records(rows)
+
+
+# route ghi doanh số mới vào feature store online
+@router.post("/features/append")
+def features_append(payload: FeatureAppendRequest) -> Dict[str, Any]:
+    """Thêm doanh số theo ngày để cập nhật trạng thái lag/rolling của từng chuỗi."""
+    if not payload.records:
+        raise HTTPException(status_code=400, detail="Không có bản ghi được cung cấp")
+    status = deps.feature_store_status()
+    if not status["writable"]:
+        raise HTTPException(status_code=409, detail=f"Feature store online chỉ đọc: {status['reason']}")
+    store = deps.get_feature_store()
+    try:
+        appended = store.append(record.model_dump() for record in payload.records)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return {"appended": appended, "series": len(store)}
+
+
+# route lấy vector đặc trưng từ feature store online
+@router.post("/features/online")
+def features_online(payload: OnlineFeatureRequest) -> Dict[str, Any]:
+    """Trả về vector đặc trưng đầy đủ cho ngày kế tiếp của từng chuỗi."""
+    df = _online_feature_frame(payload)
+    return {"rows": int(df.shape[0]), "data": frame_to_records(df)}
+
+
+# route dự đoán chỉ từ khóa chuỗi + giá/sự kiện hôm nay
+@router.post("/predict/online", response_model=PredictionResponse)
+def predict_online(request: Request, payload: OnlineFeatureRequest) -> Response:
+    """Dự đoán với đặc trưng lag/rolling lấy từ feature store thay vì từ client."""
+    timer = _request_timer(request, "/predict/online")
+    selection = _resolve_models(payload.model, payload.weights)
+    with timer.stage("select"):
+        df = _online_feature_frame(payload)
+    with timer.stage("features"):
+        features = _build_features_for_inference(df)
+    with timer.stage("predict"):
+        predictions, latency = _predict_models(features, selection)
+    rows = int(predictions.shape[0])
+    with timer.stage("serialize"):
+        body = PredictionResponse(
+            rows=rows,
+            model=_model_label(selection),
+            predictions=predictions.tolist(),
+            weights=selection,
+            latency_ms=latency,
+        ).model_dump_json()
+        response = Response(content=body, media_type="application/json")
+    return _finish(request, timer, response, rows)
+
+
+# route dự báo nhiều ngày liên tiếp cho nhiều chuỗi (đệ quy trên server)
+@router.post("/forecast", response_model=ForecastResponse)
+def forecast(request: Request, payload: ForecastRequest) -> Response:
+    """Dự báo `horizon` ngày sau ngày cuối của từng chuỗi, đưa dự đoán mỗi ngày vào lag/rolling của ngày sau."""
+    timer = _request_timer(request, "/forecast")
+    if payload.horizon > config.FORECAST_MAX_HORIZON:
+        raise HTTPException(
+            status_code=400, detail=f"horizon tối đa là {config.FORECAST_MAX_HORIZON} ngày"
+        )
+    selection = _resolve_models(payload.model, payload.weights)
+    store = deps.get_feature_store()
+    with timer.stage("select"):
+        if payload.records:
+            keys = [(record.store_id, record.item_id) for record in payload.records]
+        elif payload.store_id is not None:
+            keys = store.series_keys(payload.store_id)
+        else:
+            raise HTTPException(status_code=400, detail="Cần records hoặc store_id")
+        if not keys:
+            raise HTTPException(status_code=404, detail=f"Không có chuỗi nào cho cửa hàng {payload.store_id}")
+        if len(keys) > config.FORECAST_MAX_SERIES:
+            raise HTTPException(
+                status_code=400, detail=f"Tối đa {config.FORECAST_MAX_SERIES} chuỗi mỗi request"
+            )
+        try:
+            batch = store.snapshot(keys)
+            events = {
+                pd.Timestamp(event.date_id).normalize(): (event.event_name, event.event_type)
+                for event in payload.events
+            }
+        except KeyError as exc:
+            raise HTTPException(status_code=404, detail=str(exc.args[0])) from exc
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+        prices = None
+        if payload.records and any(record.price is not None for record in payload.records):
+            prices = np.array(
+                [np.nan if record.price is None else record.price for record in payload.records]
+            )
+            prices = np.where(np.isnan(prices), batch.last_price(), prices)
+
+    latency: Dict[str, float] = {}
+
+    def predict(features: pd.DataFrame) -> np.ndarray:
+        predictions, elapsed = _predict_models(features, selection)
+        for name, ms in elapsed.items():
+            latency[name] = round(latency.get(name, 0.0) + ms, 3)
+        return predictions
+
+    with timer.stage("predict"):
+        dates, predictions = recursive_forecast(
+            batch, payload.horizon, predict, deps.get_encoding_mapping(), prices, events
+        )
+    rows = int(predictions.size)
+    label = _model_label(selection)
+    media_type = negotiate_media_type(request.headers.get("accept"))
+    with timer.stage("serialize"):
+        if media_type is not None:
+            frame = pd.DataFrame(
+                {
+                    "store_id": np.repeat([key[0] for key in batch.keys], payload.horizon),
+                    "item_id": np.repeat([key[1] for key in batch.keys], payload.horizon),
+                    "date_id": dates.ravel().astype("datetime64[ns]"),
+                    "prediction": predictions.ravel(),
+                }
+            )
+            response = _binary_response(frame, media_type, rows=rows, model=label, horizon=payload.horizon)
+        else:
+            body = ForecastResponse(
+                rows=rows,
+                model=label,
+                horizon=payload.horizon,
+                weights=selection,
+                latency_ms=latency,
+                series=[
+                    {
+                        "store_id": key[0],
+                        "item_id": key[1],
+                        "start_date": str(dates[index, 0]),
+                        "predictions": predictions[index].tolist(),
+                    }
+                    for index, key in enumerate(batch.keys)
+                ],
+            ).model_dump_json()
+            response = Response(content=body, media_type="application/json")
+    return _finish(request, timer, response, rows)
+
+
+# route xem phiên bản mô hình đang phục vụ
+@router.get("/models")
+def models_status() -> Dict[str, Any]:
+    """Trả về phiên bản, thời gian tải/warm-up và lỗi gần nhất của từng mô hình."""
+    return deps.get_model_registry().status()
+
+
+# route buộc kiểm tra phiên bản mới ngay (không chờ chu kỳ theo dõi)
+@router.post("/models/reload")
+def models_reload() -> Dict[str, Any]:
+    """Tải + warm-up phiên bản mới nhất trên đĩa rồi thay thế, trả về các mô hình đã đổi.
+
+    Ở server pre-fork các worker khác được báo qua process cha và nạp lại bất đồng bộ.
+    """
+    swapped = deps.reload_models()
+    signalled = deps.broadcast_reload()
+    return {"swapped": swapped, "workers_signalled": signalled, **deps.get_model_registry().status()}
+
+
+# route metrics dạng text cho Prometheus
+@router.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics() -> PlainTextResponse:
+    """Histogram độ trễ theo giai đoạn, số dòng mỗi request, cache hit và phiên bản mô hình."""
+    return PlainTextResponse(
+        metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+# route thống kê micro-batching
+@router.get("/batching/stats")
+def batching_stats() -> Dict[str, Any]:
+    """Trả về thời gian chờ hàng đợi và thời gian tính toán của micro-batcher."""
+    return {
+        "enabled": config.BATCH_ENABLED,
+        "default": deps.MODEL_VARIANT,
+        "models": {variant: deps.get_batcher(variant).stats() for variant in deps.served_models()},
+    }
+
+
+# route thống kê cache dự đoán
+@router.get("/cache/stats")
+def cache_stats() -> Dict[str, Any]:
+    """Trả về bộ đếm hit/miss của cache dự đoán và phiên bản artifact hiện tại."""
+    try:
+        version = deps.get_artifact_version()
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=500, detail=str(exc)) from exc
+    return {
+        "enabled": config.PREDICTION_CACHE_ENABLED,
+        "artifact_version": version,
+        **deps.get_prediction_cache().stats(),
+    }
@@ -6,7 +6,17 @@ from typing import Any, Dict, List, Optional
 from pydantic import BaseModel, Field
 
 
-class PredictionRequest(BaseModel):
+class ModelSelection(BaseModel):
+    model: Optional[str] = Field(
+        default=None, description="Tên mô hình (lightgbm/xgboost), mặc định là MODEL_VARIANT"
+    )
+    weights: Optional[Dict[str, float]] = Field(
+        default=None,
+        description="Trọng số ensemble theo tên mô hình, ví dụ {\"lightgbm\": 0.6, \"xgboost\": 0.4}",
+    )
+
+
+class PredictionRequest(ModelSelection):
     limit: Optional[int] = Field(
         default=200,
         ge=1,
@@ -29,3 +39,91 @@ class PredictionResponse(BaseModel):
     rows: int
     model: str
     predictions: List[float]
+    weights: Dict[str, float] = Field(default_factory=dict)
+    latency_ms: Dict[str, float] = Field(
+        default_factory=dict, description="Thời gian predict của từng mô hình (rỗng khi lấy từ cache)"
+    )
+
+
+class SalesObservation(BaseModel):
+    store_id: str
+    item_id: str
+    date_id: str
+    units_sold: float = Field(ge=0)
+    price: float
+    event_name: Optional[str] = None
+    event_type: Optional[str] = None
+    dept_id: Optional[str] = None
+    cat_id: Optional[str] = None
+
+
+class FeatureAppendRequest(BaseModel):
+    records: List[SalesObservation] = Field(
+        default_factory=list,
+        description="Doanh số theo ngày của từng chuỗi item×store, theo thứ tự ngày tăng dần",
+    )
+
+
+class OnlineFeatureKey(BaseModel):
+    store_id: str
+    item_id: str
+    date_id: Optional[str] = Field(
+        default=None, description="Ngày cần dự đoán, mặc định là ngày sau ngày cuối đã ghi"
+    )
+    price: Optional[float] = Field(
+        default=None, description="Giá hôm nay, mặc định giữ giá của ngày trước"
+    )
+    event_name: Optional[str] = None
+    event_type: Optional[str] = None
+
+
+class OnlineFeatureRequest(ModelSelection):
+    records: List[OnlineFeatureKey] = Field(
+        default_factory=list,
+        description="Khóa chuỗi cùng giá/sự kiện hôm nay",
+    )
+
+
+class ForecastSeries(BaseModel):
+    store_id: str
+    item_id: str
+    price: Optional[float] = Field(
+        default=None, description="Giá trong suốt horizon, mặc định giữ giá của ngày cuối"
+    )
+
+
+class ForecastEvent(BaseModel):
+    date_id: str
+    event_name: str
+    event_type: Optional[str] = None
+
+
+class ForecastRequest(ModelSelection):
+    horizon: int = Field(default=28, ge=1, description="Số ngày cần dự báo sau ngày cuối của mỗi chuỗi")
+    store_id: Optional[str] = Field(
+        default=None, description="Dự báo mọi chuỗi của cửa hàng này (khi không gửi records)"
+    )
+    records: List[ForecastSeries] = Field(
+        default_factory=list, description="Các chuỗi item×store cần dự báo"
+    )
+    events: List[ForecastEvent] = Field(
+        default_factory=list, description="Sự kiện đã biết trong horizon, áp dụng cho mọi chuỗi"
+    )
+
+
+class SeriesForecast(BaseModel):
+    store_id: str
+    item_id: str
+    start_date: str
+    predictions: List[float]
+
+
+class ForecastResponse(BaseModel):
+    rows: int
+    model: str
+    horizon: int
+    weights: Dict[str, float] = Field(default_factory=dict)
+    latency_ms: Dict[str, float] = Field(
+        default_factory=dict, description="Tổng thời gian predict của từng mô hình qua mọi bước"
+    )
+    series: List[SeriesForecast]
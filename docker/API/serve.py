@@ -0,0 +1,208 @@
+"""Pre-forking server: preload artifacts once, then fork uvicorn workers that share them copy-on-write."""
+from __future__ import annotations
+
+import argparse
+import gc
+import logging
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from . import config, metrics
+
+logger = logging.getLogger("docker.API.serve")
+
+# worker chết sớm hơn ngưỡng này sau khi fork bị coi là lỗi khởi động, không fork lại
+RESTART_MIN_SECONDS = 5.0
+
+
+def available_cores() -> int:
+    """Số nhân CPU process được phép dùng (theo affinity/cgroup cpuset nếu có)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def default_workers(cores: int) -> int:
+    """WEB_WORKERS=0: một worker khi feature store online nhận append (trạng thái không chia sẻ), nếu không thì số nhân."""
+    return 1 if config.FEATURE_STORE_ONLINE else cores
+
+
+def threads_per_worker(workers: int, cores: int) -> int:
+    """Luồng predict mỗi worker sao cho tổng số luồng ≈ số nhân (MODEL_THREADS > 0 thì dùng giá trị đó)."""
+    return config.MODEL_THREADS or max(1, cores // max(1, workers))
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    """Mở socket lắng nghe ở process cha; mọi worker cùng accept trên socket này."""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(index: int, sock: socket.socket, threads: int, workers: int, args: argparse.Namespace) -> None:
+    import uvicorn
+
+    from . import dependencies as deps
+    from .app import app
+
+    def _reload(_signum: int, _frame: Optional[object]) -> None:
+        # handler chạy giữa hai bytecode của vòng lặp sự kiện: nạp mô hình ở luồng riêng
+        threading.Thread(target=deps.reload_models, name="models-reload", daemon=True).start()
+
+    # handler của process cha không áp dụng cho worker; uvicorn tự cài handler của nó (SIGINT/SIGTERM)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGHUP, _reload)
+    deps.configure_worker(index, threads, workers)
+    server = uvicorn.Server(
+        uvicorn.Config(app, log_level=args.log_level, access_log=args.access_log, lifespan="on")
+    )
+    server.run(sockets=[sock])
+
+
+def _spawn(index: int, sock: socket.socket, threads: int, workers: int, args: argparse.Namespace) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            _run_worker(index, sock, threads, workers, args)
+        except BaseException:
+            logger.exception("worker %d dừng vì lỗi", index)
+            code = 1
+        finally:
+            # không chạy lại atexit/finalizer của process cha trong worker
+            os._exit(code)
+    return pid
+
+
+def serve(args: argparse.Namespace) -> int:
+    """Nạp trước mọi artifact, fork `workers` worker rồi giám sát (fork lại worker chết)."""
+    from . import dependencies as deps
+    from .app import app  # noqa: F401 - import routes/pydantic ở process cha để worker dùng chung
+
+    cores = available_cores()
+    workers = args.workers or config.WEB_WORKERS or default_workers(cores)
+    if workers > 1 and config.FEATURE_STORE_ONLINE:
+        logger.warning(
+            "%d worker: feature store online chỉ đọc, /features/append trả 409 và /predict/online, /forecast "
+            "dùng lịch sử nạp lúc khởi động; đặt WEB_WORKERS=1 để nhận append, hoặc FEATURE_STORE_ONLINE=0",
+            workers,
+        )
+    threads = threads_per_worker(workers, cores)
+    # process cha chỉ dùng một luồng OpenMP khi nạp/warm-up: thread pool OpenMP tạo trước khi
+    # fork có thể làm treo worker. Số luồng thật được đặt qua tham số mô hình sau khi fork
+    # (deps.configure_worker); LightGBM/XGBoost chỉ được import khi mô hình được unpickle.
+    os.environ["OMP_NUM_THREADS"] = "1"
+    config.MODEL_THREADS = 1
+    # metric của mọi worker được gộp qua thư mục chung (xem metrics.MetricsRegistry)
+    owned_metrics_dir = not config.METRICS_DIR
+    if owned_metrics_dir:
+        config.METRICS_DIR = tempfile.mkdtemp(prefix="forecast-metrics-")
+    metrics_dir = Path(config.METRICS_DIR)
+    metrics_dir.mkdir(parents=True, exist_ok=True)
+    for stale in metrics_dir.glob("*.json"):  # file của lần chạy trước
+        stale.unlink(missing_ok=True)
+
+    started = time.perf_counter()
+    stages = deps.preload()
+    preload_seconds = time.perf_counter() - started
+    errors = deps.readiness()["errors"]
+    # dồn các object đã nạp vào thế hệ vĩnh viễn: GC của worker không ghi vào (và sao chép) trang của chúng
+    gc.collect()
+    gc.freeze()
+    sock = bind_socket(args.host, args.port)
+
+    children: Dict[int, int] = {}
+    spawned_at: Dict[int, float] = {}
+    for index in range(workers):
+        pid = _spawn(index, sock, threads, workers, args)
+        children[pid] = index
+        spawned_at[pid] = time.monotonic()
+    logger.info(
+        "preload %.2fs %s%s; %d worker x %d luồng predict trên %d nhân, lắng nghe %s:%d",
+        preload_seconds,
+        {name: seconds for name, seconds in stages.items()},
+        f" (lỗi: {errors})" if errors else "",
+        workers,
+        threads,
+        cores,
+        args.host,
+        args.port,
+    )
+
+    stopping: List[int] = []
+
+    def _stop(signum: int, _frame: Optional[object]) -> None:
+        stopping.append(signum)
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def _reload(_signum: int, _frame: Optional[object]) -> None:
+        # POST /models/reload ở một worker -> SIGHUP tới đây -> mọi worker kiểm tra MODEL_DIR
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGHUP)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGHUP, _reload)
+
+    exit_code = 0
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index = children.pop(pid, None)
+        if index is None:
+            continue
+        code = os.waitstatus_to_exitcode(status)
+        metrics.retire(metrics_dir, pid)
+        if stopping:
+            continue
+        if time.monotonic() - spawned_at.pop(pid) < RESTART_MIN_SECONDS:
+            logger.error("worker %d (pid %d) thoát ngay sau khi khởi động (%d), dừng server", index, pid, code)
+            exit_code = 1
+            _stop(signal.SIGTERM, None)
+            continue
+        logger.warning("worker %d (pid %d) thoát (%d), fork lại", index, pid, code)
+        pid = _spawn(index, sock, threads, workers, args)
+        children[pid] = index
+        spawned_at[pid] = time.monotonic()
+    sock.close()
+    if owned_metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+    return exit_code
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=0, help="số worker (mặc định WEB_WORKERS, hoặc xem default_workers)")
+    parser.add_argument("--host", default=config.WEB_HOST)
+    parser.add_argument("--port", type=int, default=config.WEB_PORT)
+    parser.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "info"))
+    parser.add_argument("--access-log", action="store_true")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(process)d %(levelname)s %(message)s")
+    raise SystemExit(serve(args))
+
+
+if __name__ == "__main__":
+    main()
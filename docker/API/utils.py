@@ -4,7 +4,14 @@ from __future__ import annotations
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+BINARY_MEDIA_TYPES = (ARROW_STREAM_MEDIA_TYPE, PARQUET_MEDIA_TYPE)
 
 
 def ensure_artifact(path: Path) -> None:
@@ -52,6 +59,13 @@ def frame_to_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
         serialized["date_id"]
     ):
         serialized["date_id"] = serialized["date_id"].dt.strftime("%Y-%m-%d")
+    for column in serialized.columns:
+        dtype = serialized[column].dtype
+        if dtype == np.float32:
+            # float32 -> số thập phân ngắn nhất (0.1 chứ không phải 0.10000000149011612)
+            serialized[column] = serialized[column].astype(str).astype(np.float64)
+        elif isinstance(dtype, pd.CategoricalDtype):
+            serialized[column] = serialized[column].astype(object)
     serialized = serialized.where(pd.notna(serialized), None)
     return serialized.to_dict(orient="records")
 
@@ -64,3 +78,47 @@ def records_to_dataframe(records: List[Dict[str, Any]]) -> pd.DataFrame:
     if "date_id" in df.columns:
         df["date_id"] = pd.to_datetime(df["date_id"], errors="coerce")
     return df
+
+
+def negotiate_media_type(accept: Optional[str]) -> Optional[str]:
+    """Chọn định dạng nhị phân từ header Accept, None nghĩa là dùng JSON."""
+    if not accept:
+        return None
+    for part in accept.split(","):
+        media_type = part.split(";")[0].strip().lower()
+        if media_type in BINARY_MEDIA_TYPES:
+            return media_type
+    return None
+
+
+def frame_to_bytes(df: pd.DataFrame, media_type: str) -> bytes:
+    """Tuần tự hóa dataframe thành Arrow IPC stream hoặc Parquet."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    if media_type == PARQUET_MEDIA_TYPE:
+        pq.write_table(table, sink, compression="snappy")
+    else:
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def bytes_to_frame(body: bytes, media_type: str) -> pd.DataFrame:
+    """Đọc body Arrow IPC stream hoặc Parquet thành dataframe."""
+    if not body:
+        raise ValueError("Không có bản ghi được cung cấp")
+    buffer = pa.py_buffer(body)
+    try:
+        if media_type == PARQUET_MEDIA_TYPE:
+            table = pq.read_table(pa.BufferReader(buffer))
+        else:
+            table = pa.ipc.open_stream(buffer).read_all()
+    except pa.ArrowException as exc:
+        raise ValueError(f"Body {media_type} không hợp lệ: {exc}") from exc
+    # split_blocks tránh gộp các cột cùng kiểu vào một block (thêm một lần copy)
+    df = table.to_pandas(split_blocks=True)
+    if df.empty:
+        raise ValueError("Không có bản ghi được cung cấp")
+    if "date_id" in df.columns:
+        df["date_id"] = pd.to_datetime(df["date_id"], errors="coerce")
+    return df